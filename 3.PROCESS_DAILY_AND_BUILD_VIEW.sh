@@ -102,7 +102,7 @@ echo "[$(date '+%Y-%m-%d %H:%M:%S')] ┌─────────────
 echo "[$(date '+%Y-%m-%d %H:%M:%S')] │ STEP 3: BUILDING SUBSCRIPTION VIEW                      │" >> "$LOGFILE"
 echo "[$(date '+%Y-%m-%d %H:%M:%S')] └─────────────────────────────────────────────────────────┘" >> "$LOGFILE"
 
-if /opt/anaconda3/bin/python "${SCRIPTS_DIR}/04_build_subscription_view.py" >> "$LOGFILE" 2>&1; then
+if /opt/anaconda3/bin/python "${SCRIPTS_DIR}/04_build_subscription_view.py" --incremental >> "$LOGFILE" 2>&1; then
     echo "[$(date '+%Y-%m-%d %H:%M:%S')] ✓ Subscription view build completed successfully" >> "$LOGFILE"
 else
     echo "[$(date '+%Y-%m-%d %H:%M:%S')] ✗ ERROR: Subscription view build failed (exit code: $?)" >> "$LOGFILE"
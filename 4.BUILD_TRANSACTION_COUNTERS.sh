@@ -20,6 +20,8 @@ START_DATE=""
 END_DATE=""
 TARGET_DATE=""
 BACKFILL_FLAG=""
+COMPACT_FLAG=""
+RESTART_FLAG=""
 
 while [[ $# -gt 0 ]]; do
     case $1 in
@@ -31,6 +33,14 @@ while [[ $# -gt 0 ]]; do
             BACKFILL_FLAG="--backfill"
             shift
             ;;
+        --compact)
+            COMPACT_FLAG="--compact"
+            shift
+            ;;
+        --restart)
+            RESTART_FLAG="--restart"
+            shift
+            ;;
         --start-date)
             START_DATE="$2"
             shift 2
@@ -54,7 +64,9 @@ echo "==========================================================================
 echo "[$(date '+%Y-%m-%d %H:%M:%S')] SCRIPT 4: BUILD TRANSACTION COUNTERS - START" >> "$LOGFILE"
 echo "================================================================================" >> "$LOGFILE"
 
-if [ -n "$BACKFILL_FLAG" ]; then
+if [ -n "$COMPACT_FLAG" ]; then
+    echo "[$(date '+%Y-%m-%d %H:%M:%S')] Mode: Compact Counters_CPC store" >> "$LOGFILE"
+elif [ -n "$BACKFILL_FLAG" ]; then
     echo "[$(date '+%Y-%m-%d %H:%M:%S')] Mode: Backfill (process all missing dates)" >> "$LOGFILE"
 elif [ -n "$START_DATE" ] && [ -n "$END_DATE" ]; then
     echo "[$(date '+%Y-%m-%d %H:%M:%S')] Date Range: ${START_DATE} to ${END_DATE}" >> "$LOGFILE"
@@ -67,6 +79,9 @@ fi
 if [ -n "$FORCE_FLAG" ]; then
     echo "[$(date '+%Y-%m-%d %H:%M:%S')] Force recompute: enabled" >> "$LOGFILE"
 fi
+if [ -n "$RESTART_FLAG" ]; then
+    echo "[$(date '+%Y-%m-%d %H:%M:%S')] Checkpoint of interrupted run: discarded" >> "$LOGFILE"
+fi
 echo "" >> "$LOGFILE"
 
 # ============================================================================
@@ -110,7 +125,9 @@ echo "[$(date '+%Y-%m-%d %H:%M:%S')] └─────────────
 
 # Build command arguments
 CMD_ARGS=""
-if [ -n "$BACKFILL_FLAG" ]; then
+if [ -n "$COMPACT_FLAG" ]; then
+    CMD_ARGS="--compact"
+elif [ -n "$BACKFILL_FLAG" ]; then
     CMD_ARGS="--backfill"
 elif [ -n "$START_DATE" ] && [ -n "$END_DATE" ]; then
     CMD_ARGS="--start-date ${START_DATE} --end-date ${END_DATE}"
@@ -122,6 +139,10 @@ if [ -n "$FORCE_FLAG" ]; then
     CMD_ARGS="${CMD_ARGS} ${FORCE_FLAG}"
 fi
 
+if [ -n "$RESTART_FLAG" ]; then
+    CMD_ARGS="${CMD_ARGS} ${RESTART_FLAG}"
+fi
+
 if /opt/anaconda3/bin/python "${SCRIPTS_DIR}/05_build_counters.py" ${CMD_ARGS} >> "$LOGFILE" 2>&1; then
     echo "[$(date '+%Y-%m-%d %H:%M:%S')] ✓ Transaction counters built successfully" >> "$LOGFILE"
 else
@@ -137,15 +158,15 @@ echo "[$(date '+%Y-%m-%d %H:%M:%S')] ┌─────────────
 echo "[$(date '+%Y-%m-%d %H:%M:%S')] │ STEP 3: VALIDATING OUTPUT FILES                         │" >> "$LOGFILE"
 echo "[$(date '+%Y-%m-%d %H:%M:%S')] └─────────────────────────────────────────────────────────┘" >> "$LOGFILE"
 
-COUNTERS_CPC="${SCRIPT_DIR}/Counters/Counters_CPC.parquet"
+COUNTERS_CPC="${SCRIPT_DIR}/Counters/Counters_CPC"
 COUNTERS_SERVICE="${SCRIPT_DIR}/Counters/Counters_Service.csv"
 
-if [ -f "$COUNTERS_CPC" ]; then
-    FILE_SIZE=$(stat -f%z "$COUNTERS_CPC" 2>/dev/null || stat -c%s "$COUNTERS_CPC" 2>/dev/null)
-    FILE_SIZE_KB=$((FILE_SIZE / 1024))
-    echo "[$(date '+%Y-%m-%d %H:%M:%S')] ✓ Counters_CPC.parquet (${FILE_SIZE_KB} KB)" >> "$LOGFILE"
+if [ -d "$COUNTERS_CPC" ]; then
+    FILE_COUNT=$(find "$COUNTERS_CPC" -name "*.parquet" 2>/dev/null | wc -l | tr -d ' ')
+    MONTH_COUNT=$(find "$COUNTERS_CPC" -maxdepth 1 -type d -name "year_month=*" 2>/dev/null | wc -l | tr -d ' ')
+    echo "[$(date '+%Y-%m-%d %H:%M:%S')] ✓ Counters_CPC/ (${MONTH_COUNT} months, ${FILE_COUNT} files)" >> "$LOGFILE"
 else
-    echo "[$(date '+%Y-%m-%d %H:%M:%S')] ✗ ERROR: Counters_CPC.parquet not created" >> "$LOGFILE"
+    echo "[$(date '+%Y-%m-%d %H:%M:%S')] ✗ ERROR: Counters_CPC/ not created" >> "$LOGFILE"
     exit 1
 fi
 
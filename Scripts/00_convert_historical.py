@@ -2,12 +2,24 @@ import polars as pl
 from pathlib import Path
 from datetime import datetime
 import sys
+import tempfile
 import pyarrow.parquet as pq
-import shutil
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from utils.parquet_utils import PartitionTransaction, recover_pending_commits, dataset_row_count
+from utils.change_utils import mark_full_rebuild
+from utils.lookup_utils import build_lookup
+from utils.catalog_utils import refresh_catalog
+from utils.csv_utils import scan_historical_csv
+from utils.schema_utils import FILE_TYPES, UNIQUE_COLS, arrow_schema, sort_columns
 
 def convert_historical_csvs():
     """
-    Convert all historical CSV files to partitioned Parquet format
+    Convert all historical CSV files to partitioned Parquet format.
+
+    Each CSV is streamed into a typed Parquet chunk, then every year_month
+    partition is deduplicated and written on its own, so peak memory is
+    bounded by one month of one type rather than the full history.
     """
     
     project_root = Path(__file__).parent.parent
@@ -31,108 +43,13 @@ def convert_historical_csvs():
     # The instruction provided a duplicate line for parquet_path, keeping the one that uses project_root.
     # parquet_path = Path('/Users/josemanco/CVAS/CVAS_BEYOND_DATA/Parquet_Data/transactions')
     
-    # Define file types and their patterns
-    file_types = {
-        'act': 'act_atlas',
-        'reno': 'reno_atlas',
-        'dct': 'dct_atlas',
-        'cnr': 'cnr_atlas',
-        'rfnd': 'rfnd_atlas',
-        'ppd': 'ppd_atlas'
-    }
-    
-    # Schema definitions for each file type
-    schemas = {
-        'act': {
-            'tmuserid': pl.Utf8,
-            'msisdn': pl.Utf8,
-            'cpc': pl.Int64,
-            'trans_type_id': pl.Int64,
-            'channel_id': pl.Int64,
-            'channel_act': pl.Utf8,
-            'trans_date': pl.Utf8,
-            'act_date': pl.Utf8,
-            'reno_date': pl.Utf8,
-            'camp_name': pl.Utf8,
-            'tef_prov': pl.Int64,
-            'campana_medium': pl.Utf8,
-            'campana_id': pl.Utf8,
-            'subscription_id': pl.Int64,
-            'rev': pl.Float64
-        },
-        'reno': {
-            'tmuserid': pl.Utf8,
-            'msisdn': pl.Utf8,
-            'cpc': pl.Int64,
-            'trans_type_id': pl.Int64,
-            'channel_id': pl.Int64,
-            'channel_act': pl.Utf8,
-            'trans_date': pl.Utf8,
-            'act_date': pl.Utf8,
-            'reno_date': pl.Utf8,
-            'camp_name': pl.Utf8,
-            'tef_prov': pl.Int64,
-            'campana_medium': pl.Utf8,
-            'campana_id': pl.Utf8,
-            'subscription_id': pl.Int64,
-            'rev': pl.Float64
-        },
-        'dct': {
-            'tmuserid': pl.Utf8,
-            'msisdn': pl.Utf8,
-            'cpc': pl.Int64,
-            'trans_type_id': pl.Int64,
-            'channel_dct': pl.Utf8,
-            'trans_date': pl.Utf8,
-            'act_date': pl.Utf8,
-            'reno_date': pl.Utf8,
-            'camp_name': pl.Utf8,
-            'tef_prov': pl.Int64,
-            'campana_medium': pl.Utf8,
-            'campana_id': pl.Utf8,
-            'subscription_id': pl.Int64
-        },
-        'cnr': {
-            'cancel_date': pl.Utf8,
-            'sbn_id': pl.Int64,
-            'tmuserid': pl.Utf8,
-            'cpc': pl.Int64,
-            'mode': pl.Utf8
-        },
-        'rfnd': {
-            'tmuserid': pl.Utf8,
-            'cpc': pl.Int64,
-            'refnd_date': pl.Utf8,
-            'rfnd_amount': pl.Float64,
-            'rfnd_cnt': pl.Int64,
-            'sbnid': pl.Int64,
-            'instant_rfnd': pl.Utf8
-        },
-        'ppd': {
-            'tmuserid': pl.Utf8,
-            'msisdn': pl.Utf8,
-            'cpc': pl.Int64,
-            'trans_type_id': pl.Int64,
-            'channel_id': pl.Int64,
-            'trans_date': pl.Utf8,
-            'act_date': pl.Utf8,
-            'reno_date': pl.Utf8,
-            'camp_name': pl.Utf8,
-            'tef_prov': pl.Int64,
-            'campana_medium': pl.Utf8,
-            'campana_id': pl.Utf8,
-            'subscription_id': pl.Int64,
-            'rev': pl.Float64
-        }
-    }
-    
     print("=" * 60)
     print("HISTORICAL DATA CONVERSION TO PARQUET")
     print("=" * 60)
     print(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
     
     # Process each file type
-    for file_key, file_pattern in file_types.items():
+    for file_key, file_pattern in FILE_TYPES.items():
         print(f"\n{'='*60}")
         print(f"Processing: {file_key.upper()} files")
         print(f"{'='*60}")
@@ -146,131 +63,108 @@ def convert_historical_csvs():
         
         print(f"Found {len(csv_files)} file(s)")
         
-        all_data = []
+        unique_cols = UNIQUE_COLS[file_key]
+        output_path = parquet_path / file_key
         
-        for csv_file in csv_files:
-            print(f"  Reading: {csv_file.name}...", end=' ')
+        for txn_name, action in recover_pending_commits(output_path):
+            print(f"⚠️  Recovered interrupted commit {file_key}/{txn_name}: {action}")
+        
+        # Scratch space for the typed per-file chunks; lives next to the
+        # type directories so dataset scans never pick it up.
+        parquet_path.mkdir(parents=True, exist_ok=True)
+        # The whole type is rewritten, so the subscription view cannot be
+        # updated incrementally from it
+        mark_full_rebuild(parquet_path)
+        with tempfile.TemporaryDirectory(prefix=f'_convert_{file_key}_', dir=parquet_path) as staging:
+            staging_path = Path(staging)
+            chunk_files = []
+            total_rows = 0
             
-            try:
-                # Read CSV with schema
-                df = pl.read_csv(
-                    csv_file,
-                    schema=schemas[file_key],
-                    null_values=['', 'NULL', 'null'],
-                    ignore_errors=False
-                )
+            # Pass 1: stream each CSV into a typed Parquet chunk (bounded memory)
+            for idx, csv_file in enumerate(csv_files):
+                print(f"  Converting: {csv_file.name}...", end=' ')
+                chunk_file = staging_path / f'{idx:05d}.parquet'
                 
-                # Parse date columns with flexible format handling
-                date_cols = [col for col in df.columns if 'date' in col.lower()]
-                for date_col in date_cols:
-                    # Try parsing with datetime format first, then date-only format
-                    df = df.with_columns([
-                        pl.when(pl.col(date_col).str.contains(' '))
-                        .then(
-                            pl.col(date_col).str.strptime(
-                                pl.Datetime,
-                                format='%Y-%m-%d %H:%M:%S',
-                                strict=False
-                            )
+                try:
+                    lf = scan_historical_csv(csv_file, file_key)
+                    lf.sink_parquet(chunk_file, compression='snappy')
+                    rows = pq.read_metadata(chunk_file).num_rows
+                    chunk_files.append(chunk_file)
+                    total_rows += rows
+                    print(f"✓ ({rows:,} rows)")
+                except Exception as e:
+                    print(f"✗ ERROR: {str(e)}")
+                    if chunk_file.exists():
+                        chunk_file.unlink()
+                    continue
+            
+            if not chunk_files:
+                print(f"⚠️  No data loaded for {file_key}")
+                continue
+            
+            print(f"\n  Total rows across {len(chunk_files)} file(s): {total_rows:,}")
+            
+            # Pass 2: dedup and write one partition at a time. Chunks are scanned
+            # in file order, so keep='last' still lets later files win.
+            chunks = pl.scan_parquet(chunk_files)
+            partitions = (
+                chunks.select('year_month').unique().collect()['year_month']
+                .sort(nulls_last=True).to_list()
+            )
+            
+            print(f"  Writing {len(partitions)} partition(s) to: {output_path}")
+            written_rows = 0
+            
+            try:
+                with PartitionTransaction(
+                    output_path, replace_all=True,
+                    schema=arrow_schema(file_key), sort_by=sort_columns(file_key)
+                ) as txn:
+                    for year_month in partitions:
+                        if year_month is None:
+                            partition_filter = pl.col('year_month').is_null()
+                        else:
+                            partition_filter = pl.col('year_month') == year_month
+                        
+                        df_partition = (
+                            chunks.filter(partition_filter)
+                            .drop('year_month')
+                            .collect()
+                            .unique(subset=unique_cols, keep='last', maintain_order=True)
                         )
-                        .otherwise(
-                            pl.col(date_col).str.strptime(
-                                pl.Datetime,
-                                format='%Y-%m-%d',
-                                strict=False
-                            )
-                        ).alias(date_col)
-                    ])
+                        txn.stage(year_month, df_partition)
+                        written_rows += len(df_partition)
                 
-                # Add partition column (year-month from trans_date or first date column)
-                if 'trans_date' in df.columns:
-                    df = df.with_columns([
-                        pl.col('trans_date').dt.strftime('%Y-%m').alias('year_month')
-                    ])
-                elif 'cancel_date' in df.columns:
-                    df = df.with_columns([
-                        pl.col('cancel_date').dt.strftime('%Y-%m').alias('year_month')
-                    ])
-                elif 'refnd_date' in df.columns:
-                    df = df.with_columns([
-                        pl.col('refnd_date').dt.strftime('%Y-%m').alias('year_month')
-                    ])
+                print(f"  ✓ Removed {total_rows - written_rows:,} duplicates")
                 
-                all_data.append(df)
-                print(f"✓ ({len(df):,} rows)")
+                # Get file size
+                total_size = sum(f.stat().st_size for f in output_path.rglob('*.parquet'))
+                size_mb = total_size / (1024 * 1024)
+                print(f"  ✓ Wrote {size_mb:.2f} MB")
+                
+                # Verify data from footer metadata (no re-read of the data pages)
+                print(f"  Verifying...", end=' ')
+                verified_rows = dataset_row_count(output_path)
+                assert verified_rows == written_rows, "Row count mismatch!"
+                print(f"✓ Verified {verified_rows:,} rows")
+                
+                print(f"  Cataloguing dates...", end=' ')
+                coverage = refresh_catalog(parquet_path, file_key)
+                print(f"✓ {sum(len(dates) for dates in coverage.values()):,} dates")
                 
             except Exception as e:
-                print(f"✗ ERROR: {str(e)}")
+                print(f"✗ ERROR during write: {str(e)}")
+                import traceback
+                traceback.print_exc()
                 continue
-        
-        if not all_data:
-            print(f"⚠️  No data loaded for {file_key}")
-            continue
-        
-        # Concatenate all dataframes
-        print(f"\n  Concatenating {len(all_data)} file(s)...", end=' ')
-        combined_df = pl.concat(all_data)
-        print(f"✓ Total rows: {len(combined_df):,}")
-        
-        # Remove duplicates
-        print(f"  Removing duplicates...", end=' ')
-        original_count = len(combined_df)
-        
-        # Define unique keys for each file type
-        if file_key in ['act', 'reno', 'dct', 'ppd']:
-            unique_cols = ['subscription_id', 'trans_date', 'trans_type_id']
-        elif file_key == 'cnr':
-            unique_cols = ['sbn_id', 'cancel_date']
-        elif file_key == 'rfnd':
-            unique_cols = ['sbnid', 'refnd_date']
-        
-        combined_df = combined_df.unique(subset=unique_cols, keep='last')
-        duplicates_removed = original_count - len(combined_df)
-        print(f"✓ Removed {duplicates_removed:,} duplicates")
-
-        # Write to partitioned Parquet using PyArrow
-        output_path = parquet_path / file_key
-        print(f"  Writing to Parquet: {output_path}...", end=' ')
-
-        try:
-            # Remove existing output directory to avoid duplicates
-            if output_path.exists():
-                shutil.rmtree(output_path)
-
-            # Convert to Arrow table
-            arrow_table = combined_df.to_arrow()
-            
-            if 'year_month' in combined_df.columns:
-                # Write partitioned dataset
-                pq.write_to_dataset(
-                    arrow_table,
-                    root_path=str(output_path),
-                    partition_cols=['year_month'],
-                    compression='snappy'
-                )
-            else:
-                # Write single file
-                output_path.mkdir(parents=True, exist_ok=True)
-                output_file = output_path / f'{file_key}.parquet'
-                pq.write_table(arrow_table, str(output_file), compression='snappy')
-            
-            # Get file size
-            total_size = sum(f.stat().st_size for f in output_path.rglob('*.parquet'))
-            size_mb = total_size / (1024 * 1024)
-            
-            print(f"✓ {size_mb:.2f} MB")
-            
-            # Verify data
-            print(f"  Verifying...", end=' ')
-            verify_df = pl.scan_parquet(str(output_path / '**/*.parquet')).collect()
-            assert len(verify_df) == len(combined_df), "Row count mismatch!"
-            print(f"✓ Verified {len(verify_df):,} rows")
-            
-        except Exception as e:
-            print(f"✗ ERROR during write: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            continue
+    
+    # The user lookup index is rebuilt over whatever the store now holds
+    print("\nBuilding lookup index...", end=' ')
+    try:
+        counts = build_lookup(parquet_path)
+        print(f"✓ {', '.join(f'{key}: {n:,}' for key, n in counts.items())} entries")
+    except Exception as e:
+        print(f"✗ ERROR: {str(e)}")
     
     print("\n" + "=" * 60)
     print("CONVERSION COMPLETE")
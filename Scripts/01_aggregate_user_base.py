@@ -1,24 +1,69 @@
 #!/usr/bin/env python3
 """
 Aggregate NBS Base data to calculate daily user base metrics.
-Generates three output files:
-1. user_base_by_service.csv - Daily user base by service_name and tme_category
-2. user_base_by_category.csv - Daily user base by tme_category only
-3. user_base_by_cpc.csv - Daily user base by cpc only
+Generates three outputs, each a Parquet dataset partitioned by year_month
+(User_Base/<name>/) plus a pipe CSV export (User_Base/<name>.csv):
+1. user_base_by_service - Daily user base by service_name and tme_category
+2. user_base_by_category - Daily user base by tme_category only
+3. user_base_by_cpc - Daily user base by cpc only
 """
 
-import csv
 import os
+import json
+import shutil
+import hashlib
+import argparse
+import polars as pl
 from pathlib import Path
-from collections import defaultdict
 from datetime import datetime
 
+from utils.parquet_utils import write_atomic_parquet, recover_pending_commits
+from utils.user_base_utils import (
+    USER_BASE_KEYS,
+    USER_BASE_PARTITION_COL,
+    user_base_path,
+    write_user_base,
+    scan_user_base,
+    user_base_size_mb,
+)
+
 # Configuration
 PROJECT_ROOT = Path(__file__).parent.parent
-NBS_BASE_DIR = PROJECT_ROOT / "User_Base" / "NBS_BASE"
-SERVICE_OUTPUT = PROJECT_ROOT / "User_Base" / "user_base_by_service.csv"
-CATEGORY_OUTPUT = PROJECT_ROOT / "User_Base" / "user_base_by_category.csv"
-CPC_OUTPUT = PROJECT_ROOT / "User_Base" / "user_base_by_cpc.csv"
+USER_BASE_DIR = PROJECT_ROOT / "User_Base"
+NBS_BASE_DIR = USER_BASE_DIR / "NBS_BASE"
+SERVICE_DATASET = user_base_path(USER_BASE_DIR, 'user_base_by_service')
+CATEGORY_DATASET = user_base_path(USER_BASE_DIR, 'user_base_by_category')
+CPC_DATASET = user_base_path(USER_BASE_DIR, 'user_base_by_cpc')
+
+# Pipe CSV exports, still read by tools outside this repo
+SERVICE_OUTPUT = USER_BASE_DIR / "user_base_by_service.csv"
+CATEGORY_OUTPUT = USER_BASE_DIR / "user_base_by_category.csv"
+CPC_OUTPUT = USER_BASE_DIR / "user_base_by_cpc.csv"
+
+# Per-snapshot aggregates, so a daily run only parses new or changed files
+CACHE_DIR = USER_BASE_DIR / "_nbs_cache"
+
+# Services left out of every aggregation (case-insensitive substring match)
+EXCLUDED_KEYWORDS = ['nubico', 'challenge arena', 'movistar apple music', 'juegos onmo']
+
+# Category grouping rules (keys lowercase); other categories keep their casing
+CATEGORY_MAPPING = {
+    'education': 'Edu_Ima',
+    'images': 'Edu_Ima',
+    'news': 'News_Sport',
+    'sports': 'News_Sport'
+}
+
+# Tried in order for snapshots that are not valid UTF-8
+ENCODINGS = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']
+
+SNAPSHOT_SCHEMA = {
+    'date': pl.Date,
+    'service_name': pl.Utf8,
+    'tme_category': pl.Utf8,
+    'count': pl.Int64,
+    'cpc': pl.Int64
+}
 
 def extract_date_from_filename(filename):
     """Extract date from filename format: YYYYMMDD_NBS_Base.csv and convert to YYYY-MM-DD"""
@@ -26,189 +71,282 @@ def extract_date_from_filename(filename):
     # Convert YYYYMMDD to YYYY-MM-DD
     return f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:8]}"
 
-def should_exclude_service(service_name):
-    """Check if service should be excluded based on service name."""
-    service_lower = service_name.lower()
-    excluded_keywords = ['nubico', 'challenge arena', 'movistar apple music', 'juegos onmo']
-    return any(keyword in service_lower for keyword in excluded_keywords)
+def excluded_service_expr():
+    """True for rows whose service should be excluded based on service name."""
+    return pl.col('service_name').str.to_lowercase().str.contains_any(EXCLUDED_KEYWORDS)
 
 
-def map_category(category):
+def map_category_expr():
     """Map categories according to grouping rules (case-insensitive)."""
-    # Normalize to title case for consistent mapping
-    category_normalized = category.strip()
-
-    category_mapping = {
-        'education': 'Edu_Ima',
-        'images': 'Edu_Ima',
-        'news': 'News_Sport',
-        'sports': 'News_Sport'
-    }
-
-    # Check lowercase version for mapping
-    mapped = category_mapping.get(category_normalized.lower())
-
-    # If mapped, return the mapped value; otherwise return original with proper title case
-    if mapped:
-        return mapped
-
-    # Return original category (preserve original casing for unmapped categories)
-    return category_normalized
-
-def process_files():
-    """Process all CSV files and aggregate data."""
-
-    service_data = defaultdict(int)
-    category_data = defaultdict(int)
-    cpc_data = defaultdict(int)
-
-    nbs_path = Path(NBS_BASE_DIR)
-    csv_files = sorted(nbs_path.glob("*.csv"))
-
-    total_files = len(csv_files)
-    print(f"Found {total_files} CSV files to process\n")
-
-    for idx, csv_file in enumerate(csv_files, 1):
-        filename = csv_file.name
-        date = extract_date_from_filename(filename)
-
-        if idx % 100 == 0 or idx == total_files:
-            print(f"Processing {idx}/{total_files}: {filename}")
-
+    return (
+        pl.col('tme_category').str.to_lowercase()
+        .replace_strict(CATEGORY_MAPPING, default=pl.col('tme_category'))
+        .alias('tme_category')
+    )
+
+
+def snapshot_date(filename):
+    """Snapshot date of a YYYYMMDD_NBS_Base.csv file, as a date."""
+    return datetime.strptime(extract_date_from_filename(filename), '%Y-%m-%d').date()
+
+
+def prepare_rows(lf, date_expr):
+    """
+    Typed, filtered and mapped snapshot rows. All columns are read as
+    strings, so parsing matches the old int(float(count)) / int(cpc).
+
+    date is kept as a Date rather than a string: grouping on it is much
+    cheaper, and the CSV writer formats it back as YYYY-MM-DD.
+    """
+    return (
+        lf.with_columns([
+            date_expr.alias('date'),
+            pl.col('service_name').str.strip_chars(),
+            pl.col('tme_category').str.strip_chars(),
+            pl.col('count').str.strip_chars().cast(pl.Float64).cast(pl.Int64),
+            pl.col('cpc').str.strip_chars().cast(pl.Int64)
+        ])
+        .filter(~excluded_service_expr())
+        .with_columns(map_category_expr())
+    )
+
+
+def read_snapshot(csv_file):
+    """
+    Eager read of one snapshot, trying each encoding in turn.
+    """
+    for encoding in ENCODINGS:
         try:
-            encodings = ['utf-8', 'latin-1', 'iso-8859-1', 'cp1252']
-            file_opened = False
-
-            for encoding in encodings:
-                try:
-                    with open(csv_file, 'r', encoding=encoding) as f:
-                        reader = csv.DictReader(f)
-
-                        for row in reader:
-                            service_name = row['service_name'].strip()
-
-                            if should_exclude_service(service_name):
-                                continue
-
-                            tme_category = row['tme_category'].strip()
-                            count_val = int(float(row['count']))
-                            cpc = int(row['cpc'])
-
-                            mapped_category = map_category(tme_category)
-
-                            service_key = (date, service_name, mapped_category)
-                            service_data[service_key] += count_val
-
-                            category_key = (date, mapped_category)
-                            category_data[category_key] += count_val
-
-                            cpc_key = (date, cpc)
-                            cpc_data[cpc_key] += count_val
-
-                    file_opened = True
-                    break
-
-                except UnicodeDecodeError:
-                    if encoding == encodings[-1]:
-                        raise
-                    continue
+            df = pl.read_csv(
+                csv_file,
+                infer_schema=False,
+                missing_utf8_is_empty_string=True,
+                encoding='utf8' if encoding == 'utf-8' else encoding
+            )
+            rows = prepare_rows(df.lazy(), pl.lit(snapshot_date(csv_file.name)))
+            return rows.select(list(SNAPSHOT_SCHEMA)).collect()
+        except pl.exceptions.ComputeError as e:
+            if 'utf-8' not in str(e) or encoding == ENCODINGS[-1]:
+                raise
+            continue
 
-            if not file_opened:
-                print(f"WARNING: Could not open {filename} with any encoding")
 
+def load_snapshots(csv_files):
+    """
+    Load the given snapshots into one frame of (date, service_name,
+    tme_category, count, cpc, file) rows.
+
+    All snapshots go through a single lazy scan, so Polars reads and parses
+    them in parallel and applies the exclusion and category rules as column
+    expressions. The scan decodes lossily; snapshots that came back with
+    replacement characters are re-read on their own with the encoding
+    fallback. If the scan fails outright (a malformed snapshot), every file
+    is read on its own and the ones that still fail are reported and skipped.
+
+    Returns:
+        Tuple of (rows, set of files that could not be read)
+    """
+    if not csv_files:
+        return pl.DataFrame(schema={**SNAPSHOT_SCHEMA, 'file': pl.Utf8}), set()
+
+    try:
+        file_dates = pl.LazyFrame({
+            'file': [str(csv_file) for csv_file in csv_files],
+            'date': [snapshot_date(csv_file.name) for csv_file in csv_files]
+        })
+        lf = pl.scan_csv(
+            csv_files,
+            infer_schema=False,
+            missing_utf8_is_empty_string=True,
+            encoding='utf8-lossy',
+            include_file_paths='file'
+        ).join(file_dates, on='file', how='left')
+        rows = prepare_rows(lf, pl.col('date')).select(list(SNAPSHOT_SCHEMA) + ['file']).collect()
+    except Exception as e:
+        print(f"Parallel scan failed ({e}), reading files one by one")
+        rows = None
+
+    if rows is not None:
+        lossy = set(
+            rows.filter(
+                pl.col('service_name').str.contains('\ufffd', literal=True)
+                | pl.col('tme_category').str.contains('\ufffd', literal=True)
+            )['file'].unique().to_list()
+        )
+        if not lossy:
+            return rows, set()
+        print(f"Re-reading {len(lossy)} file(s) that are not valid UTF-8")
+        frames = [rows.filter(~pl.col('file').is_in(list(lossy)))]
+        retry_files = [csv_file for csv_file in csv_files if str(csv_file) in lossy]
+    else:
+        frames = []
+        retry_files = csv_files
+
+    failed = set()
+    for idx, csv_file in enumerate(retry_files, 1):
+        if idx % 100 == 0 or idx == len(retry_files):
+            print(f"Processing {idx}/{len(retry_files)}: {csv_file.name}")
+        try:
+            frames.append(read_snapshot(csv_file).with_columns(pl.lit(str(csv_file)).alias('file')))
         except Exception as e:
-            print(f"ERROR processing {filename}: {e}")
+            print(f"ERROR processing {csv_file.name}: {e}")
+            failed.add(str(csv_file))
             continue
 
-    return service_data, category_data, cpc_data
-
-
-def write_service_output(service_data, output_file):
-    """Write service aggregation to CSV file."""
-    print(f"\nWriting service aggregation to {output_file}...")
-
-    with open(output_file, 'w', encoding='utf-8') as f:
-        # Write header
-        f.write("date|service_name|tme_category|User_Base\n")
-
-        # Sort by date, service_name, tme_category
-        sorted_data = sorted(service_data.items())
-
-        for (date, service_name, tme_category), user_base in sorted_data:
-            f.write(f"{date}|{service_name}|{tme_category}|{user_base}\n")
-
-    print(f"✓ Written {len(service_data)} records")
-
-def write_category_output(category_data, output_file):
-    """Write category aggregation to CSV file."""
-    print(f"\nWriting category aggregation to {output_file}...")
-
-    with open(output_file, 'w', encoding='utf-8') as f:
-        # Write header
-        f.write("date|tme_category|User_Base\n")
-
-        # Sort by date, tme_category
-        sorted_data = sorted(category_data.items())
-
-        for (date, tme_category), user_base in sorted_data:
-            f.write(f"{date}|{tme_category}|{user_base}\n")
-
-    print(f"✓ Written {len(category_data)} records")
-
-def write_cpc_output(cpc_data, output_file):
-    """Write CPC aggregation to CSV file."""
-    print(f"\nWriting CPC aggregation to {output_file}...")
-
-    with open(output_file, 'w', encoding='utf-8') as f:
-        # Write header
-        f.write("date|cpc|User_Base\n")
-
-        # Sort by date, cpc
-        sorted_data = sorted(cpc_data.items())
-
-        for (date, cpc), user_base in sorted_data:
-            f.write(f"{date}|{cpc}|{user_base}\n")
-
-def show_summary(service_output, category_output, cpc_output):
+    if not frames:
+        return pl.DataFrame(schema={**SNAPSHOT_SCHEMA, 'file': pl.Utf8}), failed
+    return pl.concat(frames, rechunk=True), failed
+
+
+def process_files(nbs_dir=NBS_BASE_DIR):
+    """
+    Load every snapshot into one frame of (date, service_name, tme_category,
+    count, cpc) rows, without the cache.
+    """
+    csv_files = sorted(Path(nbs_dir).glob("*.csv"))
+    print(f"Found {len(csv_files)} CSV files to process\n")
+
+    rows, _ = load_snapshots(csv_files)
+    return rows.drop('file')
+
+
+def rules_fingerprint():
+    """
+    Short hash of the exclusion and category rules. Cached rows already have
+    the rules applied, so each set of rules gets its own cache directory.
+    """
+    rules = json.dumps([EXCLUDED_KEYWORDS, CATEGORY_MAPPING], sort_keys=True)
+    return hashlib.sha1(rules.encode()).hexdigest()[:12]
+
+
+def cache_file_name(csv_file):
+    """
+    Cache entry of a snapshot, keyed by its name, size and mtime: a snapshot
+    that is re-downloaded or edited gets a new name and is parsed again.
+    """
+    stat = csv_file.stat()
+    return f"{csv_file.stem}.{stat.st_size}-{stat.st_mtime_ns}.parquet"
+
+
+def load_cached_rows(nbs_dir=NBS_BASE_DIR, cache_dir=CACHE_DIR):
+    """
+    Rows of every snapshot, parsing only the snapshots that are new or changed
+    since the last run.
+
+    Each parsed snapshot is stored as one small Parquet file of its prepared
+    rows under cache_dir/<rules fingerprint>/. The rows are not grouped any
+    further: a snapshot is already close to one line per service, category
+    and cpc, so grouping would cost more than it saves.
+
+    Cache entries of snapshots that were removed or changed, and of older
+    rules, are deleted. Snapshots that fail to parse are not cached, so they
+    are retried on the next run.
+    """
+    csv_files = sorted(Path(nbs_dir).glob("*.csv"))
+    rules_dir = Path(cache_dir) / rules_fingerprint()
+    rules_dir.mkdir(parents=True, exist_ok=True)
+
+    cached = {csv_file: rules_dir / cache_file_name(csv_file) for csv_file in csv_files}
+    to_parse = [csv_file for csv_file, path in cached.items() if not path.exists()]
+
+    print(f"Found {len(csv_files)} CSV files: {len(csv_files) - len(to_parse)} cached, {len(to_parse)} to parse\n")
+
+    if to_parse:
+        rows, failed = load_snapshots(to_parse)
+        by_file = rows.partition_by('file', as_dict=True, include_key=False)
+        empty = pl.DataFrame(schema=SNAPSHOT_SCHEMA)
+        for csv_file in to_parse:
+            if str(csv_file) not in failed:
+                write_atomic_parquet(by_file.get((str(csv_file),), empty), cached[csv_file])
+
+    live = set(cached.values())
+    for path in rules_dir.glob('*.parquet'):
+        if path not in live:
+            path.unlink(missing_ok=True)
+    for other in Path(cache_dir).iterdir():
+        if other.is_dir() and other != rules_dir:
+            shutil.rmtree(other, ignore_errors=True)
+
+    files = [path for path in cached.values() if path.exists()]
+    if not files:
+        return pl.DataFrame(schema=SNAPSHOT_SCHEMA)
+    return pl.read_parquet(files, rechunk=True)
+
+
+def aggregate(rows, keys):
+    """Sum of count per keys, sorted by keys."""
+    return (
+        rows.group_by(keys)
+        .agg(pl.col('count').sum().alias('User_Base'))
+        .sort(keys)
+    )
+
+
+def write_pipe_csv(df, output_file):
+    """Pipe-separated, unquoted, as the downstream consumers expect."""
+    df.write_csv(output_file, separator='|', quote_style='never')
+
+
+def write_output(rows, name, dataset_path, csv_file=None):
+    """
+    Aggregate rows by the keys of one output and write it as a month
+    partitioned Parquet dataset, plus the pipe CSV export if csv_file is given.
+    """
+    data = aggregate(rows, USER_BASE_KEYS[name])
+    for txn_name, action in recover_pending_commits(dataset_path):
+        print(f"  ⚠️  Recovered interrupted commit {name}/{txn_name}: {action}")
+    months = write_user_base(data, dataset_path)
+    if csv_file is not None:
+        write_pipe_csv(data, csv_file)
+        print(f"  CSV export: {csv_file}")
+
+    print(f"✓ Written {len(data)} records ({len(months)} months)")
+
+
+def write_service_output(rows, dataset_path, csv_file=None):
+    """Write service aggregation."""
+    print(f"\nWriting service aggregation to {dataset_path}...")
+    write_output(rows, 'user_base_by_service', dataset_path, csv_file)
+
+def write_category_output(rows, dataset_path, csv_file=None):
+    """Write category aggregation."""
+    print(f"\nWriting category aggregation to {dataset_path}...")
+    write_output(rows, 'user_base_by_category', dataset_path, csv_file)
+
+def write_cpc_output(rows, dataset_path, csv_file=None):
+    """Write CPC aggregation."""
+    print(f"\nWriting CPC aggregation to {dataset_path}...")
+    write_output(rows, 'user_base_by_cpc', dataset_path, csv_file)
+
+def print_rows(df):
+    """Print a frame in the pipe-separated layout of the CSV export."""
+    print(df.write_csv(separator='|', quote_style='never').rstrip())
+
+def show_summary(service_dataset, category_dataset, cpc_dataset):
     """Display summary statistics and samples."""
     print("\n" + "="*60)
     print("PROCESSING COMPLETE")
     print("="*60)
 
-    service_size = os.path.getsize(service_output) / (1024 * 1024)
-    category_size = os.path.getsize(category_output) / (1024 * 1024)
-    cpc_size = os.path.getsize(cpc_output) / (1024 * 1024)
-
-    print(f"\nOutput Files:")
-    print(f"  {service_output}: {service_size:.2f} MB")
-    print(f"  {category_output}: {category_size:.2f} MB")
-    print(f"  {cpc_output}: {cpc_size:.2f} MB")
-
-    print(f"\n--- Sample from {service_output} (first 10 rows) ---")
-    with open(service_output, 'r') as f:
-        for i, line in enumerate(f):
-            if i < 11:
-                print(line.rstrip())
-
-    print(f"\n--- Sample from {category_output} (first 10 rows) ---")
-    with open(category_output, 'r') as f:
-        for i, line in enumerate(f):
-            if i < 11:
-                print(line.rstrip())
-
-    print(f"\n--- Sample from {cpc_output} (first 10 rows) ---")
-    with open(cpc_output, 'r') as f:
-        for i, line in enumerate(f):
-            if i < 11:
-                print(line.rstrip())
-
-    print(f"\n--- Latest date from {category_output} ---")
-    with open(category_output, 'r') as f:
-        lines = f.readlines()
-        for line in lines[-15:]:
-            print(line.rstrip())
-
-def main():
+    print(f"\nOutput Datasets:")
+    for dataset in [service_dataset, category_dataset, cpc_dataset]:
+        print(f"  {dataset}: {user_base_size_mb(dataset):.2f} MB")
+
+    for dataset in [service_dataset, category_dataset, cpc_dataset]:
+        print(f"\n--- Sample from {dataset} (first 10 rows) ---")
+        print_rows(scan_user_base(dataset).drop(USER_BASE_PARTITION_COL).head(10).collect())
+
+    print(f"\n--- Latest date from {category_dataset} ---")
+    lf = scan_user_base(category_dataset)
+    latest = lf.select(pl.col('date').max()).collect().item()
+    print_rows(
+        lf.filter(pl.col(USER_BASE_PARTITION_COL) == latest.strftime('%Y-%m'))
+        .filter(pl.col('date') == latest)
+        .drop(USER_BASE_PARTITION_COL)
+        .collect()
+    )
+
+def main(rebuild_cache=False, export_csv=True):
     """Main execution function."""
     start_time = datetime.now()
 
@@ -221,13 +359,17 @@ def main():
         print(f"ERROR: Directory '{NBS_BASE_DIR}' not found!")
         return
 
-    service_data, category_data, cpc_data = process_files()
+    if rebuild_cache and CACHE_DIR.exists():
+        print(f"Clearing snapshot cache {CACHE_DIR}")
+        shutil.rmtree(CACHE_DIR)
+
+    rows = load_cached_rows()
 
-    write_service_output(service_data, SERVICE_OUTPUT)
-    write_category_output(category_data, CATEGORY_OUTPUT)
-    write_cpc_output(cpc_data, CPC_OUTPUT)
+    write_service_output(rows, SERVICE_DATASET, SERVICE_OUTPUT if export_csv else None)
+    write_category_output(rows, CATEGORY_DATASET, CATEGORY_OUTPUT if export_csv else None)
+    write_cpc_output(rows, CPC_DATASET, CPC_OUTPUT if export_csv else None)
 
-    show_summary(SERVICE_OUTPUT, CATEGORY_OUTPUT, CPC_OUTPUT)
+    show_summary(SERVICE_DATASET, CATEGORY_DATASET, CPC_DATASET)
 
     end_time = datetime.now()
     duration = (end_time - start_time).total_seconds()
@@ -235,4 +377,11 @@ def main():
     print("="*60)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Aggregate NBS Base snapshots into daily user base metrics')
+    parser.add_argument('--rebuild-cache', action='store_true',
+                        help='Discard the per-snapshot cache and parse every snapshot again')
+    parser.add_argument('--no-csv', action='store_true',
+                        help='Only write the Parquet datasets, not the pipe CSV exports')
+    args = parser.parse_args()
+
+    main(rebuild_cache=args.rebuild_cache, export_csv=not args.no_csv)
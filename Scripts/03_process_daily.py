@@ -1,15 +1,167 @@
 import polars as pl
-import pyarrow.parquet as pq
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import contextlib
+import io
+import multiprocessing
+import os
 import sys
+import time
 
-def process_daily_data(date_str: str):
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from utils.parquet_utils import upsert_partitions, recover_pending_commits
+from utils.change_utils import record_changed_ids
+from utils.lookup_utils import record_lookup_entries, lookup_exists, build_lookup, compact_lookup
+from utils.catalog_utils import refresh_catalog
+from utils.schema_utils import FILE_TYPES, SCHEMAS, UNIQUE_COLS, arrow_schema, date_columns, partition_expr, sort_columns
+
+
+def process_file_type(file_key: str, daily_path: Path, parquet_path: Path, file_date: str) -> dict:
+    """
+    Read, parse, deduplicate and write the daily file of one transaction type.
+
+    Args:
+        file_key: Transaction type (act, reno, dct, cnr, rfnd, ppd)
+        daily_path: Directory holding the daily CSV files
+        parquet_path: Base path to Parquet_Data/transactions
+        file_date: Date as YYYYMMDD, used to match dated file names
+
+    Returns:
+        Dict with 'file_key', 'status' (ok/skipped/error), 'rows' and 'partitions'
     """
-    Process daily CSV files and append to Parquet storage
+    file_pattern = FILE_TYPES[file_key]
+    stats = {'file_key': file_key, 'status': 'error', 'rows': 0, 'partitions': []}
+    
+    print(f"\nProcessing: {file_key.upper()}")
+    print("-" * 60)
+    
+    # Find daily file - try multiple naming patterns
+    daily_files = list(daily_path.glob(f'{file_pattern}*day*.csv'))
+
+    if not daily_files:
+        # Try with date in filename
+        daily_files = list(daily_path.glob(f'{file_pattern}*{file_date}*.csv'))
+
+    if not daily_files:
+        # Try just the pattern
+        daily_files = list(daily_path.glob(f'{file_pattern}*.csv'))
+        if len(daily_files) > 1:
+            print(f"⚠️  Multiple files found, skipping {file_key}")
+            stats['status'] = 'skipped'
+            return stats
+
+    if not daily_files:
+        print(f"⚠️  No daily file found for {file_key}")
+        stats['status'] = 'skipped'
+        return stats
+
+    daily_file = daily_files[0]
+    print(f"  File: {daily_file.name}")
+
+    try:
+        # Read daily CSV
+        print(f"  Reading CSV...", end=' ')
+        df_daily = pl.read_csv(
+            daily_file,
+            schema=SCHEMAS[file_key],
+            null_values=['', 'NULL', 'null'],
+            ignore_errors=True
+        )
+        print(f"✓ {len(df_daily):,} rows")
+
+        if len(df_daily) == 0:
+            print(f"  ⚠️  Empty file, skipping")
+            stats['status'] = 'skipped'
+            return stats
+
+        # Parse date columns (handle both '%Y-%m-%d %H:%M:%S' and '%Y-%m-%d' formats)
+        date_cols = date_columns(file_key)
+        for date_col in date_cols:
+            df_daily = df_daily.with_columns([
+                pl.col(date_col).str.strptime(
+                    pl.Datetime,
+                    format='%Y-%m-%d %H:%M:%S',
+                    strict=False
+                ).fill_null(
+                    pl.col(date_col).str.strptime(
+                        pl.Datetime,
+                        format='%Y-%m-%d',
+                        strict=False
+                    )
+                ).alias(date_col)
+            ])
+            # Warn if any dates still null after both formats
+            null_count = df_daily[date_col].null_count()
+            if null_count > 0:
+                print(f"  ⚠️  WARNING: {null_count} null values in '{date_col}' after parsing (will go to __HIVE_DEFAULT_PARTITION__)")
+
+        # Add partition column
+        df_daily = df_daily.with_columns([partition_expr(file_key)])
+
+        # Record touched subscriptions first, for the incremental subscription view
+        record_changed_ids(parquet_path, file_key, df_daily)
+        record_lookup_entries(parquet_path, file_key, df_daily)
+
+        # Deduplicate against, and rewrite, only the partitions touched by this file
+        print(f"  Merging into touched partitions...", end=' ')
+        upsert_stats = upsert_partitions(
+            df_daily,
+            parquet_path / file_key,
+            UNIQUE_COLS[file_key],
+            schema=arrow_schema(file_key),
+            sort_by=sort_columns(file_key)
+        )
+        partitions = ', '.join(str(p) for p in upsert_stats['partitions'])
+        print(f"✓ {len(upsert_stats['partitions'])} partition(s): {partitions}")
+        print(f"  Existing rows in touched partitions: {upsert_stats['existing_rows']:,}")
+        print(f"  ✓ Removed {upsert_stats['duplicates']:,} duplicates")
+        print(f"  ✓ Wrote {upsert_stats['written_rows']:,} rows")
+
+        # Re-read the dates of the rewritten partitions into the date catalog
+        try:
+            refresh_catalog(parquet_path, file_key)
+        except Exception as e:
+            print(f"  ⚠️  Date catalog not updated: {str(e)}")
+        
+        stats['status'] = 'ok'
+        stats['rows'] = len(df_daily)
+        stats['partitions'] = upsert_stats['partitions']
+
+    except Exception as e:
+        print(f"✗ ERROR: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        stats['status'] = 'error'
+    
+    return stats
+
+
+def _process_file_type_buffered(file_key: str, daily_path: Path, parquet_path: Path, file_date: str) -> tuple[dict, str]:
+    """
+    Worker entry point: run process_file_type with its output captured, so the
+    log of each type stays in one block instead of interleaving with others.
+    """
+    buffer = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer):
+        stats = process_file_type(file_key, daily_path, parquet_path, file_date)
+    stats['elapsed'] = time.perf_counter() - start
+    return stats, buffer.getvalue()
+
+
+def process_daily_data(date_str: str, workers: int = 1):
+    """
+    Process daily CSV files and append to Parquet storage.
+
+    Only the year_month partitions hit by the daily files are read,
+    deduplicated and rewritten; the rest of the history is left untouched.
+    The six types write to disjoint directories, so with workers > 1 they run
+    in a process pool; at most `workers` types are in memory at once.
     
     Args:
         date_str: Date in format 'YYYY-MM-DD' (e.g., '2025-11-10')
+        workers: Number of transaction types processed concurrently
     """
     
     # Get project root ensuring it works regardless of CWD
@@ -19,254 +171,72 @@ def process_daily_data(date_str: str):
     
     # Convert date format for file matching
     file_date = date_str.replace('-', '')  # '2025-11-10' -> '20251110'
-    year_month = date_str[:7]  # '2025-11-10' -> '2025-11'
-    
-    file_types = {
-        'act': 'act_atlas',
-        'reno': 'reno_atlas',
-        'dct': 'dct_atlas',
-        'cnr': 'cnr_atlas',
-        'rfnd': 'rfnd_atlas',
-        'ppd': 'ppd_atlas'
-    }
-    
-    # Schema definitions (same as historical conversion)
-    schemas = {
-        'act': {
-            'tmuserid': pl.Utf8,
-            'msisdn': pl.Utf8,
-            'cpc': pl.Int64,
-            'trans_type_id': pl.Int64,
-            'channel_id': pl.Int64,
-            'channel_act': pl.Utf8,
-            'trans_date': pl.Utf8,
-            'act_date': pl.Utf8,
-            'reno_date': pl.Utf8,
-            'camp_name': pl.Utf8,
-            'tef_prov': pl.Int64,
-            'campana_medium': pl.Utf8,
-            'campana_id': pl.Utf8,
-            'subscription_id': pl.Int64,
-            'rev': pl.Float64
-        },
-        'reno': {
-            'tmuserid': pl.Utf8,
-            'msisdn': pl.Utf8,
-            'cpc': pl.Int64,
-            'trans_type_id': pl.Int64,
-            'channel_id': pl.Int64,
-            'channel_act': pl.Utf8,
-            'trans_date': pl.Utf8,
-            'act_date': pl.Utf8,
-            'reno_date': pl.Utf8,
-            'camp_name': pl.Utf8,
-            'tef_prov': pl.Int64,
-            'campana_medium': pl.Utf8,
-            'campana_id': pl.Utf8,
-            'subscription_id': pl.Int64,
-            'rev': pl.Float64
-        },
-        'dct': {
-            'tmuserid': pl.Utf8,
-            'msisdn': pl.Utf8,
-            'cpc': pl.Int64,
-            'trans_type_id': pl.Int64,
-            'channel_dct': pl.Utf8,
-            'trans_date': pl.Utf8,
-            'act_date': pl.Utf8,
-            'reno_date': pl.Utf8,
-            'camp_name': pl.Utf8,
-            'tef_prov': pl.Int64,
-            'campana_medium': pl.Utf8,
-            'campana_id': pl.Utf8,
-            'subscription_id': pl.Int64
-        },
-        'cnr': {
-            'cancel_date': pl.Utf8,
-            'sbn_id': pl.Int64,
-            'tmuserid': pl.Utf8,
-            'cpc': pl.Int64,
-            'mode': pl.Utf8
-        },
-        'rfnd': {
-            'tmuserid': pl.Utf8,
-            'cpc': pl.Int64,
-            'refnd_date': pl.Utf8,
-            'rfnd_amount': pl.Float64,
-            'rfnd_cnt': pl.Int64,
-            'sbnid': pl.Int64,
-            'instant_rfnd': pl.Utf8
-        },
-        'ppd': {
-            'tmuserid': pl.Utf8,
-            'msisdn': pl.Utf8,
-            'cpc': pl.Int64,
-            'trans_type_id': pl.Int64,
-            'channel_id': pl.Int64,
-            'trans_date': pl.Utf8,
-            'act_date': pl.Utf8,
-            'reno_date': pl.Utf8,
-            'camp_name': pl.Utf8,
-            'tef_prov': pl.Int64,
-            'campana_medium': pl.Utf8,
-            'campana_id': pl.Utf8,
-            'subscription_id': pl.Int64,
-            'rev': pl.Float64
-        }
-    }
+    workers = max(1, min(workers, len(FILE_TYPES)))
     
     print("=" * 60)
     print(f"DAILY DATA PROCESSING: {date_str}")
     print("=" * 60)
-    print(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    print(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Workers: {workers}\n")
     
-    for file_key, file_pattern in file_types.items():
-        print(f"\nProcessing: {file_key.upper()}")
-        print("-" * 60)
-        
-        # Find daily file - try multiple naming patterns
-        daily_files = list(daily_path.glob(f'{file_pattern}*day*.csv'))
-        
-        if not daily_files:
-            # Try with date in filename
-            daily_files = list(daily_path.glob(f'{file_pattern}*{file_date}*.csv'))
-        
-        if not daily_files:
-            # Try just the pattern
-            daily_files = list(daily_path.glob(f'{file_pattern}*.csv'))
-            if len(daily_files) > 1:
-                print(f"⚠️  Multiple files found, skipping {file_key}")
-                continue
-        
-        if not daily_files:
-            print(f"⚠️  No daily file found for {file_key}")
-            continue
-        
-        daily_file = daily_files[0]
-        print(f"  File: {daily_file.name}")
-        
+    # Finish or roll back partition commits left behind by an interrupted run
+    for file_key in FILE_TYPES:
+        for txn_name, action in recover_pending_commits(parquet_path / file_key):
+            print(f"⚠️  Recovered interrupted commit {file_key}/{txn_name}: {action}")
+    
+    wall_start = time.perf_counter()
+    results = []
+    
+    if workers == 1:
+        for file_key in FILE_TYPES:
+            start = time.perf_counter()
+            stats = process_file_type(file_key, daily_path, parquet_path, file_date)
+            stats['elapsed'] = time.perf_counter() - start
+            results.append(stats)
+    else:
+        # Share the cores between workers instead of every worker's Polars
+        # pool claiming all of them. Spawned children read this at import time.
+        previous_threads = os.environ.get('POLARS_MAX_THREADS')
+        os.environ['POLARS_MAX_THREADS'] = str(max(1, (os.cpu_count() or 1) // workers))
         try:
-            # Read daily CSV
-            print(f"  Reading CSV...", end=' ')
-            df_daily = pl.read_csv(
-                daily_file,
-                schema=schemas[file_key],
-                null_values=['', 'NULL', 'null'],
-                ignore_errors=True
-            )
-            print(f"✓ {len(df_daily):,} rows")
-            
-            if len(df_daily) == 0:
-                print(f"  ⚠️  Empty file, skipping")
-                continue
-            
-            # Parse date columns (handle both '%Y-%m-%d %H:%M:%S' and '%Y-%m-%d' formats)
-            date_cols = [col for col in df_daily.columns if 'date' in col.lower()]
-            for date_col in date_cols:
-                df_daily = df_daily.with_columns([
-                    pl.col(date_col).str.strptime(
-                        pl.Datetime,
-                        format='%Y-%m-%d %H:%M:%S',
-                        strict=False
-                    ).fill_null(
-                        pl.col(date_col).str.strptime(
-                            pl.Datetime,
-                            format='%Y-%m-%d',
-                            strict=False
-                        )
-                    ).alias(date_col)
-                ])
-                # Warn if any dates still null after both formats
-                null_count = df_daily[date_col].null_count()
-                if null_count > 0:
-                    print(f"  ⚠️  WARNING: {null_count} null values in '{date_col}' after parsing (will go to __HIVE_DEFAULT_PARTITION__)")
-            
-            # Add partition column
-            if 'trans_date' in df_daily.columns:
-                df_daily = df_daily.with_columns([
-                    pl.col('trans_date').dt.strftime('%Y-%m').alias('year_month')
-                ])
-            elif 'cancel_date' in df_daily.columns:
-                df_daily = df_daily.with_columns([
-                    pl.col('cancel_date').dt.strftime('%Y-%m').alias('year_month')
-                ])
-            elif 'refnd_date' in df_daily.columns:
-                df_daily = df_daily.with_columns([
-                    pl.col('refnd_date').dt.strftime('%Y-%m').alias('year_month')
-                ])
-            
-            # Read existing Parquet data (INCLUDING partition columns)
-            print(f"  Reading existing Parquet...", end=' ')
-            existing_path = parquet_path / file_key
-            
-            if list(existing_path.rglob('*.parquet')):
-                # Use hive_partitioning=True to include partition columns as data columns
-                df_existing = pl.scan_parquet(
-                    str(existing_path / '**/*.parquet'),
-                    hive_partitioning=True
-                ).collect()
-                print(f"✓ {len(df_existing):,} rows")
-                
-                # Ensure column order matches
-                common_cols = [col for col in df_daily.columns if col in df_existing.columns]
-                df_existing = df_existing.select(df_daily.columns)
-                
-                # Combine
-                print(f"  Combining data...", end=' ')
-                df_combined = pl.concat([df_existing, df_daily])
-                print(f"✓ {len(df_combined):,} rows")
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                futures = [
+                    executor.submit(_process_file_type_buffered, file_key, daily_path, parquet_path, file_date)
+                    for file_key in FILE_TYPES
+                ]
+                for future in as_completed(futures):
+                    stats, log = future.result()
+                    print(log, end='')
+                    results.append(stats)
+        finally:
+            if previous_threads is None:
+                os.environ.pop('POLARS_MAX_THREADS', None)
             else:
-                print(f"✓ No existing data")
-                df_combined = df_daily
-            
-            # Deduplicate
-            print(f"  Deduplicating...", end=' ')
-            original_count = len(df_combined)
-            
-            if file_key in ['act', 'reno', 'dct', 'ppd']:
-                unique_cols = ['subscription_id', 'trans_date', 'trans_type_id']
-            elif file_key == 'cnr':
-                unique_cols = ['sbn_id', 'cancel_date']
-            elif file_key == 'rfnd':
-                unique_cols = ['sbnid', 'refnd_date']
-            
-            df_combined = df_combined.unique(subset=unique_cols, keep='last')
-            duplicates = original_count - len(df_combined)
-            print(f"✓ Removed {duplicates:,} duplicates")
-            
-            # Delete old parquet files
-            print(f"  Removing old Parquet files...", end=' ')
-            for old_file in existing_path.rglob('*.parquet'):
-                old_file.unlink()
-            # Also remove partition directories if empty
-            for partition_dir in existing_path.glob('year_month=*'):
-                if partition_dir.is_dir() and not list(partition_dir.iterdir()):
-                    partition_dir.rmdir()
-            print(f"✓")
-            
-            # Write back to Parquet using PyArrow
-            print(f"  Writing updated Parquet...", end=' ')
-            arrow_table = df_combined.to_arrow()
-            
-            if 'year_month' in df_combined.columns:
-                pq.write_to_dataset(
-                    arrow_table,
-                    root_path=str(existing_path),
-                    partition_cols=['year_month'],
-                    compression='snappy'
-                )
-            else:
-                existing_path.mkdir(parents=True, exist_ok=True)
-                output_file = existing_path / f'{file_key}.parquet'
-                pq.write_table(arrow_table, str(output_file), compression='snappy')
-            
-            print(f"✓ Complete")
-            
-        except Exception as e:
-            print(f"✗ ERROR: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            continue
+                os.environ['POLARS_MAX_THREADS'] = previous_threads
+    
+    # Keep the user lookup index to a sorted base file plus a few deltas;
+    # the first run over an existing store builds it from scratch
+    try:
+        if not lookup_exists(parquet_path):
+            print("\nBuilding lookup index...", end=' ')
+            counts = build_lookup(parquet_path)
+            print(f"✓ {', '.join(f'{key}: {n:,}' for key, n in counts.items())} entries")
+        else:
+            compacted = compact_lookup(parquet_path)
+            if compacted:
+                print(f"\n✓ Compacted lookup index: {', '.join(compacted)}")
+    except Exception as e:
+        print(f"⚠️  Lookup index not updated: {str(e)}")
+    
+    wall_elapsed = time.perf_counter() - wall_start
+    
+    print("\n" + "=" * 60)
+    print("PER-TYPE TIMINGS")
+    print("=" * 60)
+    for stats in sorted(results, key=lambda s: list(FILE_TYPES).index(s['file_key'])):
+        print(f"  {stats['file_key'].upper():<5} {stats['status']:<8} {stats['elapsed']:>8.1f}s  {stats['rows']:>12,} rows")
+    print(f"  Wall clock: {wall_elapsed:.1f}s")
     
     print("\n" + "=" * 60)
     print("DAILY PROCESSING COMPLETE")
@@ -274,15 +244,23 @@ def process_daily_data(date_str: str):
     print(f"End time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python 02_process_daily.py YYYY-MM-DD")
-        print("Example: python 02_process_daily.py 2025-11-10")
-        sys.exit(1)
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description='Process daily CSV files into the partitioned Parquet store'
+    )
+    parser.add_argument('date', help='Date to process (YYYY-MM-DD), e.g. 2025-11-10')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Transaction types processed in parallel (default: 1, max: 6)'
+    )
     
-    date_str = sys.argv[1]
+    args = parser.parse_args()
     
     try:
-        process_daily_data(date_str)
+        process_daily_data(args.date, workers=args.workers)
     except Exception as e:
         print(f"\n❌ FATAL ERROR: {str(e)}")
         import traceback
@@ -1,33 +1,200 @@
-import duckdb
 from pathlib import Path
 from datetime import datetime
+import sys
 
-def build_subscription_view():
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from utils.change_utils import VIEW_SOURCE_TYPES, pending_changes, load_changed_ids, clear_changes
+from utils.duckdb_utils import DEFAULT_DB_NAME, connect, create_transaction_views
+from utils.parquet_utils import HIVE_NULL_PARTITION, PartitionTransaction, recover_pending_commits
+from utils.schema_utils import ID_COLS
+from utils.subscription_utils import (
+    LEGACY_FILE_NAME,
+    VIEW_PARTITION_COL,
+    subscriptions_path,
+    subscriptions_exist,
+    duckdb_source,
+    subscriptions_size_mb
+)
+
+SQL_FILES = {
+    False: 'build_subscription_view.sql',
+    True: 'build_subscription_view_single_pass.sql'
+}
+
+
+def create_source_views(con, parquet_path: Path, changed_only: bool = False):
+    """
+    Create the <type>_source views read by build_subscription_view.sql.
+
+    With changed_only, each view is restricted to the subscriptions listed in
+    the changed_ids table. Every CTE of the query is per subscription, so
+    running it over those rows recomputes exactly their view rows. The views
+    are temporary, so a database file never keeps a filtered one.
+
+    year_month of the Hive default partition is mapped to NULL, as
+    duckdb_source does for activation_month, so recomputed and kept rows of
+    an incremental build agree on it.
+    """
+    for tx_type in VIEW_SOURCE_TYPES:
+        source = (
+            f"(SELECT * REPLACE (NULLIF(year_month, '{HIVE_NULL_PARTITION}') AS year_month) "
+            f"FROM read_parquet('{parquet_path}/{tx_type}/**/*.parquet', hive_partitioning=true))"
+        )
+        if changed_only:
+            con.execute(f"""
+                CREATE OR REPLACE TEMP VIEW {tx_type}_source AS
+                SELECT t.*
+                FROM {source} t
+                SEMI JOIN changed_ids c ON t.{ID_COLS[tx_type]} IS NOT DISTINCT FROM c.subscription_id
+            """)
+        else:
+            con.execute(f"CREATE OR REPLACE TEMP VIEW {tx_type}_source AS SELECT * FROM {source}")
+
+
+def merge_changed_subscriptions(con, view_path: Path):
+    """
+    Replace the rows of the changed subscriptions in the existing view.
+
+    Unchanged rows are kept as they are, except lifetime_days of Active
+    subscriptions, which is measured up to CURRENT_DATE and so moves every day.
+    """
+    con.execute("CREATE OR REPLACE TEMP TABLE changed_subscriptions AS SELECT * FROM subscriptions")
+    # changed_subscriptions goes first: BY NAME keeps its column order, the
+    # existing dataset reads activation_month last from the partition path
+    con.execute(f"""
+        CREATE OR REPLACE TABLE subscriptions AS
+        SELECT * FROM changed_subscriptions
+
+        UNION ALL BY NAME
+
+        SELECT * REPLACE (
+            CASE
+                WHEN subscription_status = 'Active' THEN
+                    DATE_DIFF('day', activation_date, CURRENT_DATE)
+                ELSE lifetime_days
+            END AS lifetime_days
+        )
+        FROM {duckdb_source(view_path)} s
+        ANTI JOIN changed_ids c ON s.subscription_id IS NOT DISTINCT FROM c.subscription_id
+    """)
+    con.execute("DROP TABLE changed_subscriptions")
+
+
+def export_subscriptions(con, view_path: Path) -> int:
+    """
+    Write the subscriptions table as a Hive dataset partitioned by
+    activation_month, rows sorted by subscription_id within each partition.
+
+    The partitions are published by one PartitionTransaction (replacing the
+    whole dataset); an interrupted export is completed or rolled back by
+    recover_pending_commits().
+
+    Returns:
+        Number of partitions written
+    """
+    months = [
+        row[0] for row in con.execute(
+            f"SELECT DISTINCT {VIEW_PARTITION_COL} FROM subscriptions ORDER BY 1 NULLS LAST"
+        ).fetchall()
+    ]
+
+    with PartitionTransaction(
+        view_path, VIEW_PARTITION_COL, replace_all=True, sort_by=['subscription_id']
+    ) as txn:
+        for month in months:
+            df_month = con.execute(
+                f"""
+                SELECT * EXCLUDE ({VIEW_PARTITION_COL})
+                FROM subscriptions
+                WHERE {VIEW_PARTITION_COL} IS NOT DISTINCT FROM ?
+                """,
+                [month]
+            ).pl()
+            txn.stage(month, df_month)
+
+    return len(months)
+
+
+def build_subscription_view(
+    incremental: bool = False,
+    db_path: Path | None = None,
+    threads: int | None = None,
+    memory_limit: str | None = None,
+    temp_directory: Path | None = None,
+    single_pass: bool = False
+):
     """
     Build aggregated subscription view combining all transaction types
     Handles: Upgrades, Missing Activations, CPC changes
     Tracks all CPCs as a list
+
+    Args:
+        incremental: Recompute only the subscriptions recorded in the change
+                     journal by 03_process_daily.py / 05_backfill_missing_dates.py
+                     and merge them into the existing output. Falls back to a
+                     full build when there is no output yet or the store was
+                     rewritten by 00_convert_historical.py.
+        db_path: Optional DuckDB database file. It keeps the subscriptions
+                 table and transactions_<type> views between runs, for tools
+                 that attach to it instead of scanning Parquet.
+        threads: DuckDB worker threads
+        memory_limit: DuckDB memory limit (e.g. '8GB')
+        temp_directory: Spill directory (default: next to the database file,
+                        or Parquet_Data/aggregated/_duckdb_tmp)
+        single_pass: Use the single GROUP BY formulation of the query
+                     (sql/build_subscription_view_single_pass.sql)
     """
     
     project_root = Path(__file__).parent.parent
     parquet_path = project_root / 'Parquet_Data' / 'transactions'
     output_path = project_root / 'Parquet_Data' / 'aggregated'
     output_path.mkdir(parents=True, exist_ok=True)
+    view_path = subscriptions_path(project_root)
     
     print("=" * 60)
     print("BUILDING SUBSCRIPTION VIEW")
     print("=" * 60)
     print(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
     
-    con = duckdb.connect()
+    for txn_name, action in recover_pending_commits(view_path):
+        print(f"  ⚠️  Recovered interrupted export {txn_name}: {action}")
+    
+    # Snapshot the journal before reading any data: ids recorded by an ingest
+    # running from here on are kept for the next build
+    changes = pending_changes(parquet_path)
+    if incremental and changes['full_rebuild']:
+        print("  ⚠️  Transaction store was rebuilt, running a full build")
+        incremental = False
+    elif incremental and not subscriptions_exist(view_path):
+        print("  ⚠️  No existing subscription view, running a full build")
+        incremental = False
+    print(f"  Mode: {'incremental' if incremental else 'full'}")
+    
+    if temp_directory is None and db_path is None:
+        temp_directory = output_path / '_duckdb_tmp'
+    con = connect(db_path, threads=threads, memory_limit=memory_limit, temp_directory=temp_directory)
+    if db_path is not None:
+        print(f"  Database: {db_path}")
+        views = create_transaction_views(con, parquet_path)
+        print(f"  Transaction views: {', '.join(views)}")
+    
+    if incremental:
+        changed_ids = load_changed_ids(changes)
+        print(f"  Changed subscriptions: {len(changed_ids):,}")
+        con.register('changed_ids_arrow', changed_ids.to_arrow())
+        con.execute("CREATE OR REPLACE TEMP TABLE changed_ids AS SELECT * FROM changed_ids_arrow")
+        con.unregister('changed_ids_arrow')
+    
+    create_source_views(con, parquet_path, changed_only=incremental)
     
     # Load SQL query from external file
-    sql_file = project_root / 'sql' / 'build_subscription_view.sql'
+    sql_file = project_root / 'sql' / SQL_FILES[single_pass]
     print(f"  Loading SQL from: {sql_file.name}")
     query = sql_file.read_text()
     
-    # Replace placeholder with actual parquet path
-    query = query.replace('{parquet_path}', str(parquet_path))
+    # One transaction, so a database file keeps its previous subscriptions
+    # table if anything below fails
+    con.execute("BEGIN TRANSACTION")
     
     print("  Executing query...", end=' ')
     start = datetime.now()
@@ -35,22 +202,29 @@ def build_subscription_view():
     elapsed = (datetime.now() - start).total_seconds()
     print(f"✓ ({elapsed:.2f}s)")
     
+    if incremental:
+        recomputed = con.execute("SELECT COUNT(*) FROM subscriptions").fetchone()[0]
+        print(f"  Recomputed subscriptions: {recomputed:,}")
+        print("  Merging into existing view...", end=' ')
+        merge_changed_subscriptions(con, view_path)
+        print("✓")
+    
+    con.execute("COMMIT")
+    
     # Get row count
     result = con.execute("SELECT COUNT(*) FROM subscriptions").fetchone()
     row_count = result[0]
     print(f"  Total subscriptions: {row_count:,}")
     
-    # Export to Parquet
+    # Export to Parquet, one partition per activation month
     print("\n  Exporting to Parquet...", end=' ')
-    output_file = output_path / 'subscriptions.parquet'
-    con.execute(f"""
-        COPY subscriptions 
-        TO '{output_file}' 
-        (FORMAT PARQUET, COMPRESSION SNAPPY)
-    """)
+    partitions = export_subscriptions(con, view_path)
+    clear_changes(parquet_path, changes)
     
-    file_size = output_file.stat().st_size / (1024 * 1024)
-    print(f"✓ {file_size:.2f} MB")
+    # The single-file output of earlier versions would now be stale
+    (output_path / LEGACY_FILE_NAME).unlink(missing_ok=True)
+    
+    print(f"✓ {partitions} partition(s), {subscriptions_size_mb(view_path):.2f} MB")
     
     # Show sample statistics
     print("\n" + "=" * 60)
@@ -184,7 +358,41 @@ def build_subscription_view():
     print("SUBSCRIPTION VIEW COMPLETE")
     print("=" * 60)
     print(f"End time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"\nOutput: {output_file}")
+    print(f"\nOutput: {view_path}")
 
 if __name__ == "__main__":
-    build_subscription_view()
+    import argparse
+    
+    parser = argparse.ArgumentParser(
+        description='Build the aggregated subscription view from the Parquet store'
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Recompute only subscriptions touched since the last build and merge them into the existing view'
+    )
+    
+    parser.add_argument(
+        '--db-path',
+        nargs='?',
+        const=str(Path(__file__).resolve().parent.parent / 'Parquet_Data' / DEFAULT_DB_NAME),
+        help=f'Keep the view in a DuckDB database file (default when given without a value: Parquet_Data/{DEFAULT_DB_NAME})'
+    )
+    parser.add_argument('--threads', type=int, help='DuckDB worker threads (default: all cores)')
+    parser.add_argument('--memory-limit', help="DuckDB memory limit, e.g. '8GB' (default: 80%% of RAM)")
+    parser.add_argument('--temp-dir', help='DuckDB spill directory')
+    parser.add_argument(
+        '--single-pass',
+        action='store_true',
+        help='Use the single-pass query (one GROUP BY instead of window sorts)'
+    )
+    
+    args = parser.parse_args()
+    build_subscription_view(
+        incremental=args.incremental,
+        db_path=Path(args.db_path) if args.db_path else None,
+        threads=args.threads,
+        memory_limit=args.memory_limit,
+        temp_directory=Path(args.temp_dir) if args.temp_dir else None,
+        single_pass=args.single_pass
+    )
@@ -1,104 +1,37 @@
 import polars as pl
-import pyarrow.parquet as pq
 from pathlib import Path
 from datetime import datetime, timedelta
 import sys
 
-def get_date_range_from_parquet(parquet_path: Path, file_key: str):
-    existing_path = parquet_path / file_key
-    
-    if not list(existing_path.rglob('*.parquet')):
-        return None, None
-    
-    df = pl.scan_parquet(
-        str(existing_path / '**/*.parquet'),
-        hive_partitioning=True
-    ).collect()
-    
-    if len(df) == 0:
-        return None, None
-    
-    if 'trans_date' in df.columns:
-        date_col = 'trans_date'
-    elif 'cancel_date' in df.columns:
-        date_col = 'cancel_date'
-    elif 'refnd_date' in df.columns:
-        date_col = 'refnd_date'
-    else:
-        return None, None
-    
-    min_date = df[date_col].dt.date().min()
-    max_date = df[date_col].dt.date().max()
-
-    return min_date, max_date
-
-def get_all_dates_in_parquet(parquet_path: Path, file_key: str):
-    existing_path = parquet_path / file_key
-    
-    if not list(existing_path.rglob('*.parquet')):
-        return set()
-    
-    df = pl.scan_parquet(
-        str(existing_path / '**/*.parquet'),
-        hive_partitioning=True
-    ).collect()
-    
-    if len(df) == 0:
-        return set()
-    
-    if 'trans_date' in df.columns:
-        date_col = 'trans_date'
-    elif 'cancel_date' in df.columns:
-        date_col = 'cancel_date'
-    elif 'refnd_date' in df.columns:
-        date_col = 'refnd_date'
-    else:
-        return set()
-    
-    dates = df.select(pl.col(date_col).dt.date()).unique()[date_col].to_list()
-    return set(dates)
-
-def get_date_range_from_csv(historical_path: Path, file_pattern: str, schema: dict):
-    csv_files = list(historical_path.glob(f'{file_pattern}*.csv'))
-
-    if not csv_files:
-        return None, None
-
-    all_dates = []
-
-    for csv_file in csv_files:
-        try:
-            df = pl.read_csv(
-                csv_file,
-                schema=schema,
-                null_values=['', 'NULL', 'null'],
-                ignore_errors=True
-            )
-
-            date_cols = [col for col in df.columns if 'date' in col.lower()]
-            if not date_cols:
-                continue
-
-            date_col = date_cols[0]
-
-            df = df.with_columns([
-                pl.col(date_col).str.strptime(
-                    pl.Date,
-                    format='%Y-%m-%d',
-                    strict=False
-                ).alias(date_col)
-            ])
-
-            dates = df.select(pl.col(date_col)).unique()[date_col].to_list()
-            all_dates.extend(dates)
-        except Exception as e:
-            print(f"  ⚠️  Error reading {csv_file.name}: {e}")
-            continue
-
-    if not all_dates:
-        return None, None
-
-    return min(all_dates), max(all_dates)
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from utils.parquet_utils import upsert_partitions, recover_pending_commits
+from utils.change_utils import record_changed_ids
+from utils.lookup_utils import record_lookup_entries
+from utils.catalog_utils import statistics_date_range, covered_dates, refresh_catalog
+from utils.csv_utils import scan_historical_csv, update_manifest, csv_date_range, files_for_dates
+from utils.schema_utils import FILE_TYPES, DATE_COLS, UNIQUE_COLS, arrow_schema, sort_columns
+
+def get_date_range_from_parquet(parquet_path: Path, file_key: str, dry_run: bool = False):
+    """
+    Min/max date of a type from the Parquet footer statistics, falling back to
+    the date catalog for files written without statistics. In a dry run the
+    catalog is read but not updated.
+    """
+    try:
+        return statistics_date_range(parquet_path, file_key)
+    except ValueError:
+        dates = covered_dates(parquet_path, file_key, persist=not dry_run)
+        if not dates:
+            return None, None
+        return min(dates), max(dates)
+
+def get_all_dates_in_parquet(parquet_path: Path, file_key: str, dry_run: bool = False):
+    """
+    Distinct dates of a type from the per-partition date sidecars; only
+    partitions written since their sidecar are read (date column only). In a
+    dry run stale sidecars are not rewritten.
+    """
+    return covered_dates(parquet_path, file_key, persist=not dry_run)
 
 def find_missing_dates(start_date, end_date, existing_dates):
     missing = []
@@ -121,99 +54,6 @@ def backfill_missing_dates(historical_path: str = None, dry_run: bool = False):
     
     parquet_path = project_root / 'Parquet_Data' / 'transactions'
     
-    file_types = {
-        'act': 'act_atlas',
-        'reno': 'reno_atlas',
-        'dct': 'dct_atlas',
-        'cnr': 'cnr_atlas',
-        'rfnd': 'rfnd_atlas',
-        'ppd': 'ppd_atlas'
-    }
-    
-    schemas = {
-        'act': {
-            'tmuserid': pl.Utf8,
-            'msisdn': pl.Utf8,
-            'cpc': pl.Int64,
-            'trans_type_id': pl.Int64,
-            'channel_id': pl.Int64,
-            'channel_act': pl.Utf8,
-            'trans_date': pl.Utf8,
-            'act_date': pl.Utf8,
-            'reno_date': pl.Utf8,
-            'camp_name': pl.Utf8,
-            'tef_prov': pl.Int64,
-            'campana_medium': pl.Utf8,
-            'campana_id': pl.Utf8,
-            'subscription_id': pl.Int64,
-            'rev': pl.Float64
-        },
-        'reno': {
-            'tmuserid': pl.Utf8,
-            'msisdn': pl.Utf8,
-            'cpc': pl.Int64,
-            'trans_type_id': pl.Int64,
-            'channel_id': pl.Int64,
-            'channel_act': pl.Utf8,
-            'trans_date': pl.Utf8,
-            'act_date': pl.Utf8,
-            'reno_date': pl.Utf8,
-            'camp_name': pl.Utf8,
-            'tef_prov': pl.Int64,
-            'campana_medium': pl.Utf8,
-            'campana_id': pl.Utf8,
-            'subscription_id': pl.Int64,
-            'rev': pl.Float64
-        },
-        'dct': {
-            'tmuserid': pl.Utf8,
-            'msisdn': pl.Utf8,
-            'cpc': pl.Int64,
-            'trans_type_id': pl.Int64,
-            'channel_dct': pl.Utf8,
-            'trans_date': pl.Utf8,
-            'act_date': pl.Utf8,
-            'reno_date': pl.Utf8,
-            'camp_name': pl.Utf8,
-            'tef_prov': pl.Int64,
-            'campana_medium': pl.Utf8,
-            'campana_id': pl.Utf8,
-            'subscription_id': pl.Int64
-        },
-        'cnr': {
-            'cancel_date': pl.Utf8,
-            'sbn_id': pl.Int64,
-            'tmuserid': pl.Utf8,
-            'cpc': pl.Int64,
-            'mode': pl.Utf8
-        },
-        'rfnd': {
-            'tmuserid': pl.Utf8,
-            'cpc': pl.Int64,
-            'refnd_date': pl.Utf8,
-            'rfnd_amount': pl.Float64,
-            'rfnd_cnt': pl.Int64,
-            'sbnid': pl.Int64,
-            'instant_rfnd': pl.Utf8
-        },
-        'ppd': {
-            'tmuserid': pl.Utf8,
-            'msisdn': pl.Utf8,
-            'cpc': pl.Int64,
-            'trans_type_id': pl.Int64,
-            'channel_id': pl.Int64,
-            'trans_date': pl.Utf8,
-            'act_date': pl.Utf8,
-            'reno_date': pl.Utf8,
-            'camp_name': pl.Utf8,
-            'tef_prov': pl.Int64,
-            'campana_medium': pl.Utf8,
-            'campana_id': pl.Utf8,
-            'subscription_id': pl.Int64,
-            'rev': pl.Float64
-        }
-    }
-    
     print("=" * 80)
     print("BACKFILL MISSING DATES - GAP DETECTION AND REPAIR")
     print("=" * 80)
@@ -226,13 +66,18 @@ def backfill_missing_dates(historical_path: str = None, dry_run: bool = False):
     
     total_missing_dates = 0
     
-    for file_key, file_pattern in file_types.items():
+    if not dry_run:
+        for file_key in FILE_TYPES:
+            for txn_name, action in recover_pending_commits(parquet_path / file_key):
+                print(f"⚠️  Recovered interrupted commit {file_key}/{txn_name}: {action}")
+    
+    for file_key, file_pattern in FILE_TYPES.items():
         print(f"\n{'=' * 80}")
         print(f"Analyzing: {file_key.upper()}")
         print('=' * 80)
         
         print(f"\n1. Checking Parquet data...")
-        parquet_min, parquet_max = get_date_range_from_parquet(parquet_path, file_key)
+        parquet_min, parquet_max = get_date_range_from_parquet(parquet_path, file_key, dry_run)
         
         if parquet_min is None:
             print(f"  ⚠️  No existing Parquet data found")
@@ -241,11 +86,15 @@ def backfill_missing_dates(historical_path: str = None, dry_run: bool = False):
         
         print(f"  ✓ Parquet date range: {parquet_min} to {parquet_max}")
 
-        existing_dates = get_all_dates_in_parquet(parquet_path, file_key)
+        existing_dates = get_all_dates_in_parquet(parquet_path, file_key, dry_run)
         print(f"  ✓ Found {len(existing_dates)} unique dates in Parquet")
 
         print(f"\n2. Checking CSV source data...")
-        csv_min, csv_max = get_date_range_from_csv(historical_path, file_pattern, schemas[file_key])
+        # Per-file date coverage comes from the manifest; only new or
+        # changed CSVs are read to update it (not saved in a dry run)
+        csv_files = sorted(historical_path.glob(f'{file_pattern}*.csv'))
+        csv_entries = update_manifest(parquet_path, file_key, csv_files, persist=not dry_run)
+        csv_min, csv_max = csv_date_range(csv_entries)
 
         if csv_min is None:
             print(f"  ⚠️  No CSV files found matching pattern: {file_pattern}*.csv")
@@ -293,123 +142,60 @@ def backfill_missing_dates(historical_path: str = None, dry_run: bool = False):
 
         print(f"\n4. Backfilling missing dates...")
         
-        print(f"\n4. Backfilling missing dates...")
-        
-        csv_files = list(historical_path.glob(f'{file_pattern}*.csv'))
+        csv_files = files_for_dates(csv_entries, missing_dates)
         
         if not csv_files:
-            print(f"  ✗ No CSV files found")
+            print(f"  ⚠️  No data found in CSV for missing dates")
             continue
         
-        all_dfs = []
+        print(f"  Reading {len(csv_files)} of {csv_entries['path'].n_unique()} CSV file(s), the ones holding missing dates")
+        
+        # Only rows of the missing dates are collected from each CSV
+        primary_date_col = DATE_COLS[file_key]
+        missing_filter = pl.col(primary_date_col).dt.date().is_in(missing_dates)
+        
+        missing_dfs = []
         for csv_file in csv_files:
             try:
-                df = pl.read_csv(
-                    csv_file,
-                    schema=schemas[file_key],
-                    null_values=['', 'NULL', 'null'],
-                    ignore_errors=True
+                missing_dfs.append(
+                    scan_historical_csv(csv_file, file_key, ignore_errors=True)
+                    .filter(missing_filter)
+                    .collect()
                 )
-                all_dfs.append(df)
             except Exception as e:
                 print(f"  ⚠️  Error reading {csv_file.name}: {e}")
                 continue
         
-        if not all_dfs:
+        if not missing_dfs:
             print(f"  ✗ Could not read any CSV files")
             continue
         
-        df_csv = pl.concat(all_dfs)
-        print(f"  ✓ Loaded {len(df_csv):,} rows from CSV")
-        
-        date_cols = [col for col in df_csv.columns if 'date' in col.lower()]
-        for date_col in date_cols:
-            df_csv = df_csv.with_columns([
-                pl.col(date_col).str.strptime(
-                    pl.Datetime,
-                    format='%Y-%m-%d %H:%M:%S',
-                    strict=False
-                ).fill_null(
-                    pl.col(date_col).str.strptime(
-                        pl.Datetime,
-                        format='%Y-%m-%d',
-                        strict=False
-                    )
-                ).alias(date_col)
-            ])
-        
-        if 'trans_date' in df_csv.columns:
-            primary_date_col = 'trans_date'
-        elif 'cancel_date' in df_csv.columns:
-            primary_date_col = 'cancel_date'
-        elif 'refnd_date' in df_csv.columns:
-            primary_date_col = 'refnd_date'
-        else:
-            print(f"  ✗ Could not identify primary date column")
-            continue
-        
-        df_missing = df_csv.filter(
-            pl.col(primary_date_col).dt.date().is_in(missing_dates)
-        )
-        
-        print(f"  ✓ Filtered to {len(df_missing):,} rows for missing dates")
+        df_missing = pl.concat(missing_dfs)
+        print(f"  ✓ Read {len(df_missing):,} rows for missing dates from {len(missing_dfs)} CSV file(s)")
         
         if len(df_missing) == 0:
             print(f"  ⚠️  No data found in CSV for missing dates")
             continue
         
-        df_missing = df_missing.with_columns([
-            pl.col(primary_date_col).dt.strftime('%Y-%m').alias('year_month')
-        ])
+        record_changed_ids(parquet_path, file_key, df_missing)
+        record_lookup_entries(parquet_path, file_key, df_missing)
         
-        print(f"  Reading existing Parquet data...")
+        # Deduplicate against, and rewrite, only the partitions of the missing dates
+        print(f"  Merging into affected partitions (staged, swapped in on commit)...")
         existing_path = parquet_path / file_key
-        df_existing = pl.scan_parquet(
-            str(existing_path / '**/*.parquet'),
-            hive_partitioning=True
-        ).collect()
-        
-        print(f"  ✓ Loaded {len(df_existing):,} existing rows")
-        
-        df_existing = df_existing.select(df_missing.columns)
-        
-        print(f"  Combining data...")
-        df_combined = pl.concat([df_existing, df_missing])
-        print(f"  ✓ Combined to {len(df_combined):,} rows")
-        
-        print(f"  Deduplicating...")
-        original_count = len(df_combined)
-        
-        if file_key in ['act', 'reno', 'dct', 'ppd']:
-            unique_cols = ['subscription_id', 'trans_date', 'trans_type_id']
-        elif file_key == 'cnr':
-            unique_cols = ['sbn_id', 'cancel_date']
-        elif file_key == 'rfnd':
-            unique_cols = ['sbnid', 'refnd_date']
-        
-        df_combined = df_combined.unique(subset=unique_cols, keep='last')
-        duplicates = original_count - len(df_combined)
-        print(f"  ✓ Removed {duplicates:,} duplicates")
-        
-        print(f"  Removing old Parquet files...")
-        for old_file in existing_path.rglob('*.parquet'):
-            old_file.unlink()
-        for partition_dir in existing_path.glob('year_month=*'):
-            if partition_dir.is_dir() and not list(partition_dir.iterdir()):
-                partition_dir.rmdir()
-        print(f"  ✓ Cleaned up old files")
-        
-        print(f"  Writing updated Parquet...")
-        arrow_table = df_combined.to_arrow()
-        
-        pq.write_to_dataset(
-            arrow_table,
-            root_path=str(existing_path),
-            partition_cols=['year_month'],
-            compression='snappy'
+        upsert_stats = upsert_partitions(
+            df_missing,
+            existing_path,
+            UNIQUE_COLS[file_key],
+            schema=arrow_schema(file_key),
+            sort_by=sort_columns(file_key)
         )
-        
-        print(f"  ✓ Wrote {len(df_combined):,} rows to Parquet")
+        partitions = ', '.join(str(p) for p in upsert_stats['partitions'])
+        print(f"  ✓ {len(upsert_stats['partitions'])} partition(s): {partitions}")
+        print(f"  Existing rows in affected partitions: {upsert_stats['existing_rows']:,}")
+        print(f"  ✓ Removed {upsert_stats['duplicates']:,} duplicates")
+        print(f"  ✓ Wrote {upsert_stats['written_rows']:,} rows to Parquet")
+        refresh_catalog(parquet_path, file_key)
         print(f"\n  ✅ Successfully backfilled {len(missing_dates)} dates for {file_key}")
     
     print("\n" + "=" * 80)
@@ -3,7 +3,7 @@
 Build Transaction Counters
 
 Generates two outputs:
-1. Counters_CPC.parquet - Historical counters by CPC and date
+1. Counters_CPC/ - Historical counters by CPC and date (partitioned by month)
 2. Counters_Service.csv - Aggregated counters by Service Name
 
 Usage:
@@ -19,8 +19,14 @@ Usage:
     # Process date range
     python 05_build_counters.py --start-date 2024-01-01 --end-date 2024-01-31
 
+    # Recompute instead of resuming an interrupted run
+    python 05_build_counters.py --backfill --restart
+
     # Force recompute existing dates
     python 05_build_counters.py YYYY-MM-DD --force
+
+    # Fold per-date counter files into one file per month
+    python 05_build_counters.py --compact
 """
 
 import polars as pl
@@ -32,162 +38,208 @@ import platform
 
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 from utils.counter_utils import (
-    load_transactions_for_date,
+    scan_transactions,
     load_mastercpc,
     load_counters_cpc,
-    write_atomic_parquet,
+    write_counters_dates,
+    compact_counters,
+    migrate_legacy_counters,
     write_atomic_csv,
     discover_all_transaction_dates,
     get_missing_dates,
     load_excluded_users,
+    checkpoint_path,
+    write_checkpoint,
+    load_checkpoint,
 )
+from utils.schema_utils import DATE_COLS
 
 TX_TYPES = ['act', 'reno', 'dct', 'cnr', 'ppd', 'rfnd']
 
 
-def compute_daily_cpc_counts(parquet_base: Path, target_date: str, excluded_msisdns: set[str] | None = None, excluded_tmuserids: set[str] | None = None) -> pl.DataFrame:
+# Veltkamp splitter for doubles (2**27 + 1)
+_SPLITTER = 134217729.0
+
+
+def _times_100(x: pl.Expr) -> tuple[pl.Expr, pl.Expr]:
     """
-    Compute transaction counts, revenue, and refund amounts by CPC for a single date.
+    x * 100 as a double plus its exact rounding error (Dekker's two-product;
+    100 splits exactly into 100 + 0).
     """
-    counts_dict = {'date': [], 'cpc': []}
-    for tx in TX_TYPES:
-        counts_dict[f'{tx}_count'] = []
+    product = x * 100.0
+    scaled = x * _SPLITTER
+    x_hi = scaled - (scaled - x)
+    x_lo = x - x_hi
+    return product, (x_hi * 100.0 - product) + x_lo * 100.0
 
-    all_cpcs = set()
-    tx_counts = {}
-    tx_revenue = {}
-    tx_rfnd_amounts = {}
-    tx_act_free = {}
-    tx_act_pay = {}
-    tx_upg = {}
-    tx_upg_dct = {}
 
-    for tx_type in TX_TYPES:
-        df = load_transactions_for_date(parquet_base, target_date, tx_type, excluded_msisdns, excluded_tmuserids)
-        if df.is_empty():
-            tx_counts[tx_type] = {}
-            tx_revenue[tx_type] = {}
-            tx_rfnd_amounts[tx_type] = {}
-            tx_act_free[tx_type] = {}
-            tx_act_pay[tx_type] = {}
-            tx_upg[tx_type] = {}
-            tx_upg_dct[tx_type] = {}
-            continue
+def _round_cents(x: pl.Expr) -> pl.Expr:
+    """
+    Round to 2 decimals exactly as the built-in round() does on the binary
+    value, as a Polars expression. Polars' round(2) rounds the inexact x * 100
+    and can land a cent off on sums such as 3.605 + 2.5 (= 6.10500000000000043).
+    Here the exact error of x * 100 decides values next to a half cent, and
+    exact halves go to even. Polars divides columns by a scalar through the
+    reciprocal, so the quotient is then corrected by its exact remainder to
+    the nearest double, as round() returns.
+    """
+    product, error = _times_100(x)
+    low = product.floor()
+    frac = product - low
+    up = (frac > 0.5) | ((frac == 0.5) & ((error > 0) | ((error == 0) & (low % 2 == 1))))
+    cents = pl.when(up).then(low + 1.0).otherwise(low)
 
-        if tx_type == 'act' and 'channel_act' in df.columns:
-            non_upgrade_df = df.filter(pl.col('channel_act') != 'UPGRADE')
-            counts = non_upgrade_df.group_by('cpc').agg(pl.len().alias('count'))
-            tx_counts[tx_type] = {row['cpc']: row['count'] for row in counts.iter_rows(named=True)}
-
-            upg_counts = df.filter(pl.col('channel_act') == 'UPGRADE').group_by('cpc').agg(pl.len().alias('count'))
-            tx_upg[tx_type] = {row['cpc']: row['count'] for row in upg_counts.iter_rows(named=True)}
-        elif tx_type == 'dct' and 'channel_dct' in df.columns:
-            non_upgrade_df = df.filter(pl.col('channel_dct') != 'UPGRADE')
-            counts = non_upgrade_df.group_by('cpc').agg(pl.len().alias('count'))
-            tx_counts[tx_type] = {row['cpc']: row['count'] for row in counts.iter_rows(named=True)}
-
-            upg_dct_counts = df.filter(pl.col('channel_dct') == 'UPGRADE').group_by('cpc').agg(pl.len().alias('count'))
-            tx_upg_dct[tx_type] = {row['cpc']: row['count'] for row in upg_dct_counts.iter_rows(named=True)}
-            tx_upg[tx_type] = {}
-        elif tx_type == 'rfnd' and 'rfnd_cnt' in df.columns:
-            counts = df.group_by('cpc').agg(pl.col('rfnd_cnt').sum().alias('count'))
-            tx_counts[tx_type] = {row['cpc']: row['count'] for row in counts.iter_rows(named=True)}
-            tx_upg[tx_type] = {}
-        else:
-            counts = df.group_by('cpc').agg(pl.len().alias('count'))
-            tx_counts[tx_type] = {row['cpc']: row['count'] for row in counts.iter_rows(named=True)}
-            tx_upg[tx_type] = {}
+    quotient = cents / 100.0
+    back, back_error = _times_100(quotient)
+    return quotient + ((cents - back) - back_error) / 100.0
 
-        if tx_type == 'act' and 'rev' in df.columns:
-            if 'channel_act' in df.columns:
-                non_upgrade_df = df.filter(pl.col('channel_act') != 'UPGRADE')
-            else:
-                non_upgrade_df = df
 
-            free_counts = non_upgrade_df.filter(pl.col('rev') == 0).group_by('cpc').agg(pl.len().alias('count'))
-            tx_act_free[tx_type] = {row['cpc']: row['count'] for row in free_counts.iter_rows(named=True)}
+def _cpc_aggregations(tx_type: str, columns: list[str]) -> list[pl.Expr]:
+    """
+    Conditional aggregations of one transaction type, evaluated per CPC.
 
-            pay_counts = non_upgrade_df.filter(pl.col('rev') > 0).group_by('cpc').agg(pl.len().alias('count'))
-            tx_act_pay[tx_type] = {row['cpc']: row['count'] for row in pay_counts.iter_rows(named=True)}
-        else:
-            tx_act_free[tx_type] = {}
-            tx_act_pay[tx_type] = {}
-
-        if tx_type == 'dct' and 'channel_dct' in df.columns and tx_type not in tx_upg_dct:
-            upg_dct_counts = df.filter(pl.col('channel_dct') == 'UPGRADE').group_by('cpc').agg(pl.len().alias('count'))
-            tx_upg_dct[tx_type] = {row['cpc']: row['count'] for row in upg_dct_counts.iter_rows(named=True)}
-        elif tx_type != 'dct':
-            tx_upg_dct[tx_type] = {}
-
-        if 'rev' in df.columns:
-            revenue = df.group_by('cpc').agg(pl.col('rev').sum().alias('revenue'))
-            tx_revenue[tx_type] = {row['cpc']: row['revenue'] for row in revenue.iter_rows(named=True)}
-        else:
-            tx_revenue[tx_type] = {}
+    Every output column is prefixed with the type, plus an `in_<type>` flag
+    telling whether the CPC contributes to the day's CPC list (CPCs seen only
+    through upgrade deactivations, for instance, do not).
+    """
+    count_col = f'{tx_type}_count'
+    in_col = f'in_{tx_type}'
+
+    if tx_type == 'act' and 'channel_act' in columns:
+        not_upgrade = pl.col('channel_act') != 'UPGRADE'
+        aggs = [
+            not_upgrade.sum().alias(count_col),
+            (pl.col('channel_act') == 'UPGRADE').sum().alias('act_upg_count'),
+        ]
+        in_day = (not_upgrade.sum() > 0) | ((pl.col('channel_act') == 'UPGRADE').sum() > 0)
+    elif tx_type == 'dct' and 'channel_dct' in columns:
+        not_upgrade = pl.col('channel_dct') != 'UPGRADE'
+        aggs = [
+            not_upgrade.sum().alias(count_col),
+            (pl.col('channel_dct') == 'UPGRADE').sum().alias('dct_upg_dct_count'),
+        ]
+        in_day = not_upgrade.sum() > 0
+    elif tx_type == 'rfnd' and 'rfnd_cnt' in columns:
+        not_upgrade = pl.lit(True)
+        aggs = [pl.col('rfnd_cnt').sum().alias(count_col)]
+        in_day = pl.lit(True)
+    else:
+        not_upgrade = pl.lit(True)
+        aggs = [pl.len().alias(count_col)]
+        in_day = pl.lit(True)
 
-        if 'rfnd_amount' in df.columns:
-            rfnd_amt = df.group_by('cpc').agg(pl.col('rfnd_amount').sum().alias('rfnd_amount'))
-            tx_rfnd_amounts[tx_type] = {row['cpc']: row['rfnd_amount'] for row in rfnd_amt.iter_rows(named=True)}
-        else:
-            tx_rfnd_amounts[tx_type] = {}
+    if tx_type == 'act' and 'rev' in columns:
+        aggs += [
+            (not_upgrade & (pl.col('rev') == 0)).sum().alias('act_act_free'),
+            (not_upgrade & (pl.col('rev') > 0)).sum().alias('act_act_pay'),
+        ]
 
-        all_cpcs.update(tx_counts[tx_type].keys())
-        if tx_type == 'act':
-            all_cpcs.update(tx_upg[tx_type].keys())
+    if 'rev' in columns:
+        aggs.append(pl.col('rev').sum().alias(f'{tx_type}_rev'))
 
-    if not all_cpcs:
-        return pl.DataFrame(schema={
-            'date': pl.Date,
-            'cpc': pl.Int64,
-            'act_count': pl.Int64,
-            'act_free': pl.Int64,
-            'act_pay': pl.Int64,
-            'upg_count': pl.Int64,
-            'reno_count': pl.Int64,
-            'dct_count': pl.Int64,
-            'upg_dct_count': pl.Int64,
-            'cnr_count': pl.Int64,
-            'ppd_count': pl.Int64,
-            'rfnd_count': pl.Int64,
-            'rfnd_amount': pl.Float64,
-            'rev': pl.Float64,
-        })
+    if 'rfnd_amount' in columns:
+        aggs.append(pl.col('rfnd_amount').sum().alias(f'{tx_type}_rfnd_amount'))
 
-    rows = []
-    for cpc in sorted(c for c in all_cpcs if c is not None):
-        row = {
-            'date': datetime.strptime(target_date, '%Y-%m-%d').date(),
-            'cpc': cpc,
-        }
-        for tx_type in TX_TYPES:
-            row[f'{tx_type}_count'] = tx_counts[tx_type].get(cpc, 0)
+    aggs.append(in_day.alias(in_col))
+    return aggs
 
-        row['act_free'] = tx_act_free.get('act', {}).get(cpc, 0)
-        row['act_pay'] = tx_act_pay.get('act', {}).get(cpc, 0)
-        row['upg_count'] = tx_upg.get('act', {}).get(cpc, 0)
-        row['upg_dct_count'] = tx_upg_dct.get('dct', {}).get(cpc, 0)
 
-        total_rfnd = sum(tx_rfnd_amounts[tx_type].get(cpc, 0.0) for tx_type in TX_TYPES)
-        row['rfnd_amount'] = round(total_rfnd, 2)
+def compute_cpc_counts(parquet_base: Path, dates: list[str], excluded_msisdns: set[str] | None = None, excluded_tmuserids: set[str] | None = None) -> pl.DataFrame:
+    """
+    Compute transaction counts, revenue, and refund amounts by date and CPC for a set of dates.
 
-        total_rev = sum(tx_revenue[tx_type].get(cpc, 0.0) for tx_type in TX_TYPES)
-        row['rev'] = round(total_rev, 2)
+    Each year_month partition is scanned once for all requested days; each
+    type is reduced to one row per (date, CPC) with conditional aggregations,
+    and the per-type results are combined with a single outer join.
+    """
+    per_type = []
+    for tx_type in TX_TYPES:
+        lf = scan_transactions(parquet_base, tx_type, dates, excluded_msisdns, excluded_tmuserids)
+        if lf is None:
+            continue
+        day = pl.col(DATE_COLS[tx_type]).dt.date().alias('date')
+        per_type.append(lf.group_by([day, 'cpc']).agg(_cpc_aggregations(tx_type, lf.collect_schema().names())))
+
+    empty = pl.DataFrame(schema={
+        'date': pl.Date,
+        'cpc': pl.Int64,
+        'act_count': pl.Int64,
+        'act_free': pl.Int64,
+        'act_pay': pl.Int64,
+        'upg_count': pl.Int64,
+        'reno_count': pl.Int64,
+        'dct_count': pl.Int64,
+        'upg_dct_count': pl.Int64,
+        'cnr_count': pl.Int64,
+        'ppd_count': pl.Int64,
+        'rfnd_count': pl.Int64,
+        'rfnd_amount': pl.Float64,
+        'rev': pl.Float64,
+    })
+
+    if not per_type:
+        return empty
+
+    combined = per_type[0]
+    for lf in per_type[1:]:
+        combined = combined.join(lf, on=['date', 'cpc'], how='full', coalesce=True)
+
+    present = set(combined.collect_schema().names())
+
+    def counter(name: str) -> pl.Expr:
+        if name not in present:
+            return pl.lit(0, dtype=pl.Int64)
+        return pl.col(name).fill_null(0).cast(pl.Int64)
+
+    def amount(suffix: str) -> pl.Expr:
+        cols = [f'{tx}_{suffix}' for tx in TX_TYPES if f'{tx}_{suffix}' in present]
+        if not cols:
+            return pl.lit(0.0)
+        return _round_cents(pl.sum_horizontal(cols).cast(pl.Float64))
+
+    in_cols = [f'in_{tx}' for tx in TX_TYPES if f'in_{tx}' in present]
+
+    result = (
+        combined
+        .filter(pl.col('cpc').is_not_null() & pl.any_horizontal(in_cols))
+        .select(
+            pl.col('date'),
+            pl.col('cpc').cast(pl.Int64),
+            *[counter(f'{tx}_count').alias(f'{tx}_count') for tx in TX_TYPES],
+            counter('act_act_free').alias('act_free'),
+            counter('act_act_pay').alias('act_pay'),
+            counter('act_upg_count').alias('upg_count'),
+            counter('dct_upg_dct_count').alias('upg_dct_count'),
+            amount('rfnd_amount').alias('rfnd_amount'),
+            amount('rev').alias('rev'),
+        )
+        .sort(['date', 'cpc'])
+        .collect()
+    )
+
+    return result if not result.is_empty() else empty
 
-        rows.append(row)
 
-    return pl.DataFrame(rows)
+def compute_daily_cpc_counts(parquet_base: Path, target_date: str, excluded_msisdns: set[str] | None = None, excluded_tmuserids: set[str] | None = None) -> pl.DataFrame:
+    """
+    Compute transaction counts, revenue, and refund amounts by CPC for a single date.
+    """
+    return compute_cpc_counts(parquet_base, [target_date], excluded_msisdns, excluded_tmuserids)
 
 
-def merge_counters(existing: pl.DataFrame, new: pl.DataFrame, target_date: str) -> pl.DataFrame:
+def merge_counters(existing: pl.DataFrame, new: pl.DataFrame, target_date: str | list[str]) -> pl.DataFrame:
     """
     Merge new daily counts into existing historical counters.
-    Replaces data for target_date (idempotent).
+    Replaces data for target_date, or for every date of a list (idempotent).
     """
+    expected_cols = ['date', 'cpc', 'act_count', 'act_free', 'act_pay', 'upg_count', 'reno_count', 'dct_count', 'upg_dct_count', 'cnr_count', 'ppd_count', 'rfnd_count', 'rfnd_amount', 'rev', 'last_updated']
+
     if existing.is_empty():
-        return new.with_columns(pl.lit(datetime.now()).alias('last_updated'))
+        return new.with_columns(pl.lit(datetime.now()).alias('last_updated')).select(expected_cols)
 
-    date_val = datetime.strptime(target_date, '%Y-%m-%d').date()
-    filtered = existing.filter(pl.col('date') != date_val)
+    target_dates = [target_date] if isinstance(target_date, str) else target_date
+    date_vals = [datetime.strptime(d, '%Y-%m-%d').date() for d in target_dates]
+    filtered = existing.filter(~pl.col('date').is_in(date_vals))
 
     if new.is_empty():
         return filtered
@@ -220,7 +272,6 @@ def merge_counters(existing: pl.DataFrame, new: pl.DataFrame, target_date: str)
 
     new_with_ts = new.with_columns(pl.lit(datetime.now()).alias('last_updated'))
 
-    expected_cols = ['date', 'cpc', 'act_count', 'act_free', 'act_pay', 'upg_count', 'reno_count', 'dct_count', 'upg_dct_count', 'cnr_count', 'ppd_count', 'rfnd_count', 'rfnd_amount', 'rev', 'last_updated']
     filtered = filtered.select(expected_cols)
     new_with_ts = new_with_ts.select(expected_cols)
 
@@ -323,43 +374,164 @@ def aggregate_by_service(
 
 
 
-def process_date(
-    target_date: str,
-    project_root: Path,
-    force: bool = False,
-    excluded_msisdns: set[str] | None = None,
-    excluded_tmuserids: set[str] | None = None
-) -> dict:
+class CounterRun:
     """
-    Process counters for a single date.
+    State shared by every date of one counters run.
 
-    Returns dict with processing stats.
+    MASTERCPC, the Users_No_Limits.csv exclusions and the existing
+    Counters_CPC store are each loaded once, on first use, and stay in
+    memory for the whole date loop. Counts of processed dates are merged
+    into the in-memory counters; write() then publishes the new dates'
+    counter files and Counters_Service.csv once, at the end of the run.
+
+    checkpoint() saves the dates computed so far, and resume() takes them
+    over in the next run if this one is interrupted before write().
     """
-    parquet_base = project_root / 'Parquet_Data' / 'transactions'
-    counters_dir = project_root / 'Counters'
-    counters_cpc_path = counters_dir / 'Counters_CPC.parquet'
-    counters_service_path = counters_dir / 'Counters_Service.csv'
-    mastercpc_path = project_root / 'MASTERCPC.csv'
 
+    def __init__(self, project_root: Path):
+        self.parquet_base = project_root / 'Parquet_Data' / 'transactions'
+        self.counters_cpc_path = project_root / 'Counters' / 'Counters_CPC'
+        self.counters_service_path = project_root / 'Counters' / 'Counters_Service.csv'
+        self.mastercpc_path = project_root / 'MASTERCPC.csv'
+        self.excluded_users_path = project_root / 'Users_No_Limits.csv'
+        self.checkpoint_path = checkpoint_path(self.counters_cpc_path)
+
+        self.new_dates: list[str] = []
+        self._excluded_users = None
+        self._cpc_map = None
+        self._counters = None
+        self._processed = None
+
+    @property
+    def excluded_users(self) -> tuple[set[str], set[str]]:
+        """(msisdns, tmuserids) excluded from every count."""
+        if self._excluded_users is None:
+            self._excluded_users = load_excluded_users(self.excluded_users_path)
+        return self._excluded_users
+
+    @property
+    def cpc_map(self) -> pl.DataFrame:
+        if self._cpc_map is None:
+            print(f"  Loading MASTERCPC mapping...", end=' ')
+            self._cpc_map = load_mastercpc(self.mastercpc_path)
+            print(f"✓ {len(self._cpc_map):,} CPC mappings")
+        return self._cpc_map
+
+    @property
+    def counters(self) -> pl.DataFrame:
+        """Counters_CPC as stored, plus every date added in this run."""
+        return self.load_counters()
+
+    def load_counters(self) -> pl.DataFrame:
+        if self._counters is None:
+            print(f"  Loading historical counters...", end=' ')
+            self._counters = load_counters_cpc(self.counters_cpc_path)
+            n_dates = self._counters['date'].n_unique() if not self._counters.is_empty() else 0
+            print(f"✓ {len(self._counters):,} rows, {n_dates} dates")
+        return self._counters
+
+    def is_processed(self, target_date: str) -> bool:
+        if self._processed is None:
+            counters = self.counters
+            self._processed = set(counters['date'].unique().to_list()) if not counters.is_empty() else set()
+        return datetime.strptime(target_date, '%Y-%m-%d').date() in self._processed
+
+    def compute(self, dates: list[str]) -> pl.DataFrame:
+        excluded_msisdns, excluded_tmuserids = self.excluded_users
+        return compute_cpc_counts(self.parquet_base, dates, excluded_msisdns, excluded_tmuserids)
+
+    def add(self, counts: pl.DataFrame, dates: list[str]) -> None:
+        """
+        Replace the given dates in the in-memory counters with counts.
+        """
+        self._counters = merge_counters(self.counters, counts, dates)
+        self._processed = None
+        self.new_dates.extend(d for d in dates if d not in self.new_dates)
+
+    def _new_counters(self) -> pl.DataFrame:
+        date_vals = [datetime.strptime(d, '%Y-%m-%d').date() for d in self.new_dates]
+        return self.counters.filter(pl.col('date').is_in(date_vals))
+
+    def checkpoint(self) -> None:
+        """
+        Save the counts of the dates added so far.
+        """
+        if self.new_dates:
+            write_checkpoint(self.checkpoint_path, self._new_counters(), self.new_dates)
+
+    def resume(self, dates: list[str]) -> list[str]:
+        """
+        Add the dates checkpointed by an interrupted run, as they were
+        computed, if they are among `dates`.
+
+        Returns:
+            Dates still to be processed
+        """
+        counts, done = load_checkpoint(self.checkpoint_path)
+        resumed = [d for d in dates if d in set(done)]
+        if not resumed:
+            return dates
+
+        print(f"  Resuming interrupted run: {len(resumed)} date(s) taken from checkpoint")
+        resumed_vals = [datetime.strptime(d, '%Y-%m-%d').date() for d in resumed]
+        self.add(counts.filter(pl.col('date').is_in(resumed_vals)), resumed)
+        return [d for d in dates if d not in resumed]
+
+    def write(self) -> list[int]:
+        """
+        Write the counter files of the dates added in this run and rebuild
+        Counters_Service.csv from the full counters.
+
+        Returns:
+            Unmapped CPCs
+        """
+        if not self.new_dates:
+            return []
+
+        cpc_map = self.cpc_map
+        print(f"  Joining service metadata...", end=' ')
+        service_counters, unmapped = aggregate_by_service(self.counters, cpc_map)
+        print(f"✓ {len(service_counters):,} rows")
+
+        if unmapped:
+            print(f"\n  ⚠️  WARNING: {len(unmapped)} unmapped CPCs found:")
+            print(f"     {unmapped[:20]}{'...' if len(unmapped) > 20 else ''}")
+
+        dates = sorted(self.new_dates)
+        print(f"  Writing Counters_CPC ({len(dates)} date(s))...", end=' ')
+        write_counters_dates(self.counters_cpc_path, self._new_counters(), dates)
+        print(f"✓")
+
+        print(f"  Writing Counters_Service.csv...", end=' ')
+        write_atomic_csv(service_counters, self.counters_service_path)
+        file_size = self.counters_service_path.stat().st_size / 1024
+        print(f"✓ ({file_size:.1f} KB)")
+
+        self.checkpoint_path.unlink(missing_ok=True)
+        self.new_dates = []
+        return unmapped
+
+
+def process_date(target_date: str, run: CounterRun, force: bool = False) -> dict:
+    """
+    Compute counters for a single date into the run (written by run.write()).
+
+    Returns dict with processing stats.
+    """
     stats = {
         'date': target_date,
         'cpcs_processed': 0,
-        'unmapped_cpcs': [],
         'tx_counts': {}
     }
 
-    print(f"  Loading historical counters...", end=' ')
-    existing = load_counters_cpc(counters_cpc_path)
-    print(f"✓ {len(existing):,} rows, {existing['date'].n_unique() if not existing.is_empty() else 0} dates")
+    run.load_counters()
 
-    date_val = datetime.strptime(target_date, '%Y-%m-%d').date()
-    if not force and not existing.is_empty():
-        if date_val in existing['date'].unique().to_list():
-            print(f"  ⚠️  Date {target_date} already processed. Use --force to recompute.")
-            return stats
+    if not force and run.is_processed(target_date):
+        print(f"  ⚠️  Date {target_date} already processed. Use --force to recompute.")
+        return stats
 
     print(f"  Computing daily counts for {target_date}...")
-    daily_counts = compute_daily_cpc_counts(parquet_base, target_date, excluded_msisdns, excluded_tmuserids)
+    daily_counts = run.compute([target_date])
     
     if daily_counts.is_empty():
         print(f"  ⚠️  No transactions found for {target_date}")
@@ -375,35 +547,64 @@ def process_date(
     print(f"    CPCs: {stats['cpcs_processed']:,}")
     
     print(f"  Merging counters...", end=' ')
-    merged = merge_counters(existing, daily_counts, target_date)
-    print(f"✓ {merged['date'].n_unique()} dates total")
-    
-    print(f"  Loading MASTERCPC mapping...", end=' ')
-    cpc_map = load_mastercpc(mastercpc_path)
-    print(f"✓ {len(cpc_map):,} CPC mappings")
-    
-    print(f"  Joining service metadata...", end=' ')
-    service_counters, unmapped = aggregate_by_service(merged, cpc_map)
-    stats['unmapped_cpcs'] = unmapped
-    print(f"✓ {len(service_counters):,} rows")
-    
-    if unmapped:
-        print(f"\n  ⚠️  WARNING: {len(unmapped)} unmapped CPCs found:")
-        print(f"     {unmapped[:20]}{'...' if len(unmapped) > 20 else ''}")
-    
-    print(f"  Writing Counters_CPC.parquet...", end=' ')
-    write_atomic_parquet(merged, counters_cpc_path)
-    file_size = counters_cpc_path.stat().st_size / 1024
-    print(f"✓ ({file_size:.1f} KB)")
-    
-    print(f"  Writing Counters_Service.csv...", end=' ')
-    write_atomic_csv(service_counters, counters_service_path)
-    file_size = counters_service_path.stat().st_size / 1024
-    print(f"✓ ({file_size:.1f} KB)")
+    run.add(daily_counts, [target_date])
+    print(f"✓ {run.counters['date'].n_unique()} dates total")
     
     return stats
 
 
+def process_date_range(dates: list[str], run: CounterRun, force: bool = False) -> dict:
+    """
+    Compute counters for many dates at once into the run (written by
+    run.write()).
+
+    Every transaction partition is scanned once for all dates instead of
+    once per date.
+
+    Returns dict with processing stats.
+    """
+    stats = {
+        'dates': [],
+        'cpcs_processed': 0,
+        'tx_counts': {}
+    }
+
+    run.load_counters()
+
+    if not force:
+        skipped = [d for d in dates if run.is_processed(d)]
+        if skipped:
+            print(f"  ⚠️  {len(skipped)} date(s) already processed, skipping. Use --force to recompute.")
+        dates = [d for d in dates if d not in skipped]
+
+    if not dates:
+        return stats
+
+    stats['dates'] = dates
+
+    print(f"  Computing counts for {len(dates)} date(s) ({dates[0]} to {dates[-1]})...")
+    range_counts = run.compute(dates)
+
+    if range_counts.is_empty():
+        print(f"  ⚠️  No transactions found in range")
+        return stats
+
+    stats['cpcs_processed'] = len(range_counts)
+    for tx in TX_TYPES:
+        stats['tx_counts'][tx] = range_counts[f'{tx}_count'].sum()
+
+    tx_summary = ' '.join([f"{tx}={stats['tx_counts'].get(tx, 0):,}" for tx in TX_TYPES])
+    print(f"    Transactions: {tx_summary}")
+    print(f"    Dates with data: {range_counts['date'].n_unique():,}")
+    print(f"    Date/CPC rows: {stats['cpcs_processed']:,}")
+
+    print(f"  Merging counters...", end=' ')
+    run.add(range_counts, dates)
+    print(f"✓ {run.counters['date'].n_unique()} dates total")
+
+    return stats
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Build Transaction Counters',
@@ -415,15 +616,30 @@ def main():
     parser.add_argument('--start-date', help='Start date for range processing')
     parser.add_argument('--end-date', help='End date for range processing')
     parser.add_argument('--force', action='store_true', help='Force recompute even if date exists')
+    parser.add_argument('--restart', action='store_true',
+                       help='Discard the checkpoint of an interrupted run instead of resuming it (implied by --force)')
+    parser.add_argument('--compact', action='store_true',
+                       help='Fold per-date Counters_CPC files into one file per month and exit')
 
     args = parser.parse_args()
 
     project_root = Path(__file__).resolve().parent.parent
     parquet_base = project_root / 'Parquet_Data' / 'transactions'
-    counters_cpc_path = project_root / 'Counters' / 'Counters_CPC.parquet'
+    counters_cpc_path = project_root / 'Counters' / 'Counters_CPC'
+
+    if migrate_legacy_counters(project_root / 'Counters' / 'Counters_CPC.parquet', counters_cpc_path):
+        print(f"Migrated Counters_CPC.parquet to partitioned store: {counters_cpc_path}")
 
-    excluded_msisdns_path = project_root / 'Users_No_Limits.csv'
-    excluded_msisdns, excluded_tmuserids = load_excluded_users(excluded_msisdns_path)
+    if args.compact:
+        print("=" * 60)
+        print("COMPACTING COUNTERS_CPC")
+        print("=" * 60)
+        stats = compact_counters(counters_cpc_path)
+        print(f"✓ Folded {stats['files']:,} per-date file(s) into {stats['months']:,} month(s)")
+        return
+
+    run = CounterRun(project_root)
+    excluded_msisdns, excluded_tmuserids = run.excluded_users
 
     if excluded_msisdns:
         print(f"Loaded {len(excluded_msisdns):,} MSISDNs and {len(excluded_tmuserids):,} TMUSERIDs to exclude from Users_No_Limits.csv")
@@ -495,19 +711,55 @@ def main():
     all_unmapped = set()
     total_cpcs = 0
 
-    for i, date in enumerate(dates, 1):
-        print(f"\n[{i}/{len(dates)}] Processing: {date}")
+    # A forced recompute must not republish counts checkpointed before it
+    if args.restart or args.force:
+        run.checkpoint_path.unlink(missing_ok=True)
+    pending = run.resume(dates)
+
+    if mode in ('backfill', 'date_range') and len(pending) > 1:
+        # One batch per month: each month partition is scanned once, and the
+        # run is checkpointed after each batch so a crash resumes from there
+        batches = {}
+        for date in pending:
+            batches.setdefault(date[:7], []).append(date)
+
+        for i, batch in enumerate(batches.values(), 1):
+            print(f"\n[{i}/{len(batches)}] Processing range: {batch[0]} to {batch[-1]}")
+            print("-" * 60)
+
+            try:
+                stats = process_date_range(batch, run, args.force)
+                total_cpcs += stats['cpcs_processed']
+                run.checkpoint()
+            except Exception as e:
+                print(f"  ✗ ERROR: {str(e)}")
+                import traceback
+                traceback.print_exc()
+                continue
+    else:
+        for i, date in enumerate(pending, 1):
+            print(f"\n[{i}/{len(pending)}] Processing: {date}")
+            print("-" * 60)
+
+            try:
+                stats = process_date(date, run, args.force)
+                total_cpcs += stats['cpcs_processed']
+            except Exception as e:
+                print(f"  ✗ ERROR: {str(e)}")
+                import traceback
+                traceback.print_exc()
+                continue
+
+    # Outputs are written once, for every date computed above
+    if run.new_dates:
+        print(f"\nWriting outputs")
         print("-" * 60)
-
         try:
-            stats = process_date(date, project_root, args.force, excluded_msisdns, excluded_tmuserids)
-            total_cpcs += stats['cpcs_processed']
-            all_unmapped.update(stats.get('unmapped_cpcs', []))
+            all_unmapped.update(run.write())
         except Exception as e:
             print(f"  ✗ ERROR: {str(e)}")
             import traceback
             traceback.print_exc()
-            continue
 
     print("\n" + "=" * 60)
     print("BUILD COMPLETE")
@@ -4,9 +4,12 @@ import polars as pl
 import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.subscription_utils import subscriptions_path, subscriptions_exist, scan_subscriptions
+
 WORKSPACE_ROOT = Path(__file__).parent.parent.parent
 MASTERCPC_FILE = WORKSPACE_ROOT / "MASTERCPC.csv"
-PARQUET_FILE = WORKSPACE_ROOT / "Parquet_Data" / "aggregated" / "subscriptions.parquet"
+SUBSCRIPTIONS_PATH = subscriptions_path(WORKSPACE_ROOT)
 
 
 def load_service_cpcs(service_name):
@@ -37,8 +40,8 @@ def load_service_cpcs(service_name):
 
 
 def calculate_lt_ltv(service_name, activation_month):
-    if not PARQUET_FILE.exists():
-        print(f"❌ Error: Parquet file not found at: {PARQUET_FILE}")
+    if not subscriptions_exist(SUBSCRIPTIONS_PATH):
+        print(f"❌ Error: Subscription view not found at: {SUBSCRIPTIONS_PATH}")
         return
     
     cpc_list = load_service_cpcs(service_name)
@@ -50,12 +53,11 @@ def calculate_lt_ltv(service_name, activation_month):
     print(f"   Activation Month: {activation_month}")
     print("-" * 80)
     
-    df = pl.read_parquet(PARQUET_FILE)
-    
-    filtered_df = df.filter(
+    # Only the activation_month partition is read
+    filtered_df = scan_subscriptions(SUBSCRIPTIONS_PATH).filter(
         (pl.col("activation_month") == activation_month) &
         (pl.col("cpc_list").list.eval(pl.element().is_in(cpc_list)).list.any())
-    )
+    ).select("lifetime_days", "total_revenue_with_upgrade").collect()
     
     if filtered_df.height == 0:
         print(f"\n⚠️  No subscriptions found for service '{service_name}' in activation month '{activation_month}'")
@@ -4,6 +4,10 @@ import pandas as pd
 from pathlib import Path
 from datetime import datetime, timedelta
 import time
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.subscription_utils import subscriptions_exist, scan_subscriptions, duckdb_source, subscriptions_size_mb
 
 def check_subscriptions_parquet_data():
     """
@@ -16,17 +20,19 @@ def check_subscriptions_parquet_data():
     4. Query Performance Test
     """
     
-    parquet_file = Path('/Users/josemanco/CVAS/CVAS_BEYOND_DATA/Parquet_Data/aggregated/subscriptions.parquet')
+    view_path = Path('/Users/josemanco/CVAS/CVAS_BEYOND_DATA/Parquet_Data/aggregated/subscriptions')
     
     print("=" * 80)
     print("SUBSCRIPTIONS DATA VALIDATION AND PERFORMANCE REPORT")
     print("=" * 80)
     print(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
     
-    if not parquet_file.exists():
-        print(f"❌ File not found: {parquet_file}")
+    if not subscriptions_exist(view_path):
+        print(f"❌ File not found: {view_path}")
         return
     
+    source = duckdb_source(view_path)
+    
     # =========================================================================
     # 1. DAILY DATA COMPLETENESS CHECK
     # =========================================================================
@@ -37,7 +43,7 @@ def check_subscriptions_parquet_data():
     yesterday = (datetime.now() - timedelta(days=1)).date()
 
     try:
-        df = pl.read_parquet(str(parquet_file))
+        df = scan_subscriptions(view_path).collect()
 
         # First, get the earliest renewal date to use as reference for activation validation
         renewal_df = df.filter(pl.col('last_renewal_date').is_not_null()).select(pl.col('last_renewal_date').cast(pl.Date).alias('date'))
@@ -125,7 +131,7 @@ def check_subscriptions_parquet_data():
         SUM(activation_revenue) as activation_revenue,
         COUNT(DISTINCT tmuserid) as unique_users,
         COUNT(DISTINCT cpc_list[1]) as unique_cpcs
-    FROM '{parquet_file}'
+    FROM {source}
     WHERE activation_date >= CURRENT_DATE - INTERVAL '12 months'
     GROUP BY month
     ORDER BY month DESC
@@ -147,7 +153,7 @@ def check_subscriptions_parquet_data():
         SUM(renewal_count) as total_renewals,
         SUM(renewal_revenue) as renewal_revenue,
         AVG(renewal_count) as avg_renewals_per_subscription
-    FROM '{parquet_file}'
+    FROM {source}
     WHERE last_renewal_date >= CURRENT_DATE - INTERVAL '12 months'
         AND last_renewal_date IS NOT NULL
     GROUP BY month
@@ -169,7 +175,7 @@ def check_subscriptions_parquet_data():
         COUNT(*) as deactivations,
         COUNT(DISTINCT deactivation_mode) as unique_modes,
         AVG(lifetime_days) as avg_lifetime_days
-    FROM '{parquet_file}'
+    FROM {source}
     WHERE deactivation_date >= CURRENT_DATE - INTERVAL '12 months'
         AND deactivation_date IS NOT NULL
     GROUP BY month
@@ -191,7 +197,7 @@ def check_subscriptions_parquet_data():
         COUNT(*) as cancellations,
         COUNT(DISTINCT cancellation_mode) as unique_modes,
         AVG(lifetime_days) as avg_lifetime_days
-    FROM '{parquet_file}'
+    FROM {source}
     WHERE cancellation_date >= CURRENT_DATE - INTERVAL '12 months'
         AND cancellation_date IS NOT NULL
     GROUP BY month
@@ -214,7 +220,7 @@ def check_subscriptions_parquet_data():
         SUM(refund_count) as total_refunds,
         SUM(total_refunded) as total_refunded_amount,
         AVG(total_refunded) as avg_refund_per_subscription
-    FROM '{parquet_file}'
+    FROM {source}
     WHERE last_refund_date >= CURRENT_DATE - INTERVAL '12 months'
         AND last_refund_date IS NOT NULL
     GROUP BY month
@@ -238,8 +244,8 @@ def check_subscriptions_parquet_data():
     print("-" * 60)
     
     try:
-        df = pl.read_parquet(str(parquet_file))
-        file_size = parquet_file.stat().st_size / (1024 * 1024)
+        df = scan_subscriptions(view_path).collect()
+        file_size = subscriptions_size_mb(view_path)
         
         print(f"Total subscriptions: {len(df):,}")
         print(f"File size: {file_size:.2f} MB")
@@ -256,7 +262,7 @@ def check_subscriptions_parquet_data():
         subscription_status,
         COUNT(*) as count,
         ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (), 2) as percentage
-    FROM '{parquet_file}'
+    FROM {source}
     GROUP BY subscription_status
     ORDER BY count DESC
     """
@@ -276,7 +282,7 @@ def check_subscriptions_parquet_data():
         MIN(activation_date) as min_date,
         MAX(activation_date) as max_date,
         COUNT(*) as records
-    FROM '{parquet_file}'
+    FROM {source}
     WHERE activation_date IS NOT NULL
     UNION ALL
     SELECT
@@ -284,7 +290,7 @@ def check_subscriptions_parquet_data():
         MIN(last_renewal_date) as min_date,
         MAX(last_renewal_date) as max_date,
         COUNT(*) as records
-    FROM '{parquet_file}'
+    FROM {source}
     WHERE last_renewal_date IS NOT NULL
     UNION ALL
     SELECT
@@ -292,7 +298,7 @@ def check_subscriptions_parquet_data():
         MIN(deactivation_date) as min_date,
         MAX(deactivation_date) as max_date,
         COUNT(*) as records
-    FROM '{parquet_file}'
+    FROM {source}
     WHERE deactivation_date IS NOT NULL
     UNION ALL
     SELECT
@@ -300,7 +306,7 @@ def check_subscriptions_parquet_data():
         MIN(cancellation_date) as min_date,
         MAX(cancellation_date) as max_date,
         COUNT(*) as records
-    FROM '{parquet_file}'
+    FROM {source}
     WHERE cancellation_date IS NOT NULL
     """
     
@@ -323,7 +329,7 @@ def check_subscriptions_parquet_data():
         SUM(CASE WHEN has_upgraded THEN 1 ELSE 0 END) as upgraded_subscriptions,
         SUM(CASE WHEN renewal_count > 0 THEN 1 ELSE 0 END) as subscriptions_with_renewals,
         SUM(CASE WHEN refund_count > 0 THEN 1 ELSE 0 END) as subscriptions_with_refunds
-    FROM '{parquet_file}'
+    FROM {source}
     """
     
     try:
@@ -345,7 +351,7 @@ def check_subscriptions_parquet_data():
         AVG(activation_revenue) as avg_activation_revenue,
         AVG(renewal_revenue) as avg_renewal_revenue,
         AVG(total_revenue) as avg_total_revenue
-    FROM '{parquet_file}'
+    FROM {source}
     """
     
     try:
@@ -370,8 +376,7 @@ def check_subscriptions_parquet_data():
     ]
     
     try:
-        df = pl.read_parquet(str(parquet_file))
-        actual_columns = set(df.columns)
+        actual_columns = set(scan_subscriptions(view_path).collect_schema().names())
         expected_set = set(expected_columns)
         
         missing = expected_set - actual_columns
@@ -398,7 +403,7 @@ def check_subscriptions_parquet_data():
     queries = {
         "4.1 Count active subscriptions": f"""
             SELECT COUNT(*) as active_subscriptions
-            FROM '{parquet_file}'
+            FROM {source}
             WHERE subscription_status = 'Active'
         """,
         
@@ -407,7 +412,7 @@ def check_subscriptions_parquet_data():
                 first_cpc,
                 COUNT(*) as subscription_count,
                 SUM(total_revenue) as total_revenue
-            FROM '{parquet_file}'
+            FROM {source}
             GROUP BY first_cpc
             ORDER BY subscription_count DESC
             LIMIT 10
@@ -419,7 +424,7 @@ def check_subscriptions_parquet_data():
                 COUNT(*) as count,
                 AVG(lifetime_days) as avg_lifetime_days,
                 AVG(total_revenue) as avg_revenue
-            FROM '{parquet_file}'
+            FROM {source}
             GROUP BY subscription_status
             ORDER BY count DESC
         """,
@@ -429,7 +434,7 @@ def check_subscriptions_parquet_data():
                 CAST(activation_date AS DATE) as date,
                 COUNT(*) as activations,
                 SUM(activation_revenue) as revenue
-            FROM '{parquet_file}'
+            FROM {source}
             WHERE activation_date >= CURRENT_DATE - INTERVAL '7 days'
             GROUP BY date
             ORDER BY date DESC
@@ -444,7 +449,7 @@ def check_subscriptions_parquet_data():
                 renewal_revenue,
                 lifetime_days,
                 subscription_status
-            FROM '{parquet_file}'
+            FROM {source}
             WHERE renewal_count > 0
             ORDER BY renewal_count DESC
             LIMIT 10
@@ -4,8 +4,12 @@ import pyarrow.parquet as pq
 import pandas as pd
 from pathlib import Path
 from datetime import datetime, timedelta
+import sys
 import time
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.schema_utils import FILE_TYPES, SCHEMAS, DATE_COLS, UNIQUE_COLS, PARTITION_COL
+
 def check_transactions_parquet_data():
     """
     Comprehensive validation and performance testing for transaction parquet data.
@@ -17,7 +21,7 @@ def check_transactions_parquet_data():
     """
 
     parquet_path = Path('/Users/josemanco/CVAS/CVAS_BEYOND_DATA/Parquet_Data/transactions')
-    file_types = ['act', 'reno', 'dct', 'cnr', 'rfnd', 'ppd']
+    file_types = list(FILE_TYPES)
 
     print("=" * 80)
     print("TRANSACTION DATA VALIDATION AND PERFORMANCE REPORT")
@@ -134,16 +138,8 @@ def check_transactions_parquet_data():
     for file_type in file_types:
         path = parquet_path / file_type
         if list(path.rglob('*.parquet')):
-            df = pl.scan_parquet(str(path / '**/*.parquet'), hive_partitioning=True).collect()
-
-            if 'trans_date' in df.columns:
-                date_col = 'trans_date'
-            elif 'cancel_date' in df.columns:
-                date_col = 'cancel_date'
-            elif 'refnd_date' in df.columns:
-                date_col = 'refnd_date'
-            else:
-                continue
+            date_col = DATE_COLS[file_type]
+            df = pl.scan_parquet(str(path / '**/*.parquet'), hive_partitioning=True).select(date_col).collect()
 
             min_date = df.select(pl.col(date_col).min()).item()
             max_date = df.select(pl.col(date_col).max()).item()
@@ -165,21 +161,12 @@ def check_transactions_parquet_data():
     print("\n\n2.4 DUPLICATE CHECK")
     print("-" * 60)
 
-    duplicate_checks = {
-        'act': ['subscription_id', 'trans_date', 'trans_type_id'],
-        'reno': ['subscription_id', 'trans_date', 'trans_type_id'],
-        'dct': ['subscription_id', 'trans_date', 'trans_type_id'],
-        'cnr': ['sbn_id', 'cancel_date'],
-        'rfnd': ['sbnid', 'refnd_date'],
-        'ppd': ['subscription_id', 'trans_date', 'trans_type_id']
-    }
-
     for file_type in file_types:
         path = parquet_path / file_type
         if list(path.rglob('*.parquet')):
             df = pl.scan_parquet(str(path / '**/*.parquet'), hive_partitioning=True).collect()
 
-            unique_cols = duplicate_checks.get(file_type, [])
+            unique_cols = UNIQUE_COLS[file_type]
             if unique_cols and all(col in df.columns for col in unique_cols):
                 original_count = len(df)
                 unique_count = df.select(unique_cols).unique().height
@@ -194,30 +181,12 @@ def check_transactions_parquet_data():
     print("\n\n2.5 SCHEMA VALIDATION")
     print("-" * 60)
 
-    expected_schemas = {
-        'act': ['tmuserid', 'msisdn', 'cpc', 'trans_type_id', 'channel_id', 'channel_act',
-                'trans_date', 'act_date', 'reno_date', 'camp_name', 'tef_prov',
-                'campana_medium', 'campana_id', 'subscription_id', 'rev', 'year_month'],
-        'reno': ['tmuserid', 'msisdn', 'cpc', 'trans_type_id', 'channel_id', 'channel_act',
-                 'trans_date', 'act_date', 'reno_date', 'camp_name', 'tef_prov',
-                 'campana_medium', 'campana_id', 'subscription_id', 'rev', 'year_month'],
-        'dct': ['tmuserid', 'msisdn', 'cpc', 'trans_type_id', 'channel_dct',
-                'trans_date', 'act_date', 'reno_date', 'camp_name', 'tef_prov',
-                'campana_medium', 'campana_id', 'subscription_id', 'year_month'],
-        'cnr': ['cancel_date', 'sbn_id', 'tmuserid', 'cpc', 'mode', 'year_month'],
-        'rfnd': ['tmuserid', 'cpc', 'refnd_date', 'rfnd_amount', 'rfnd_cnt',
-                 'sbnid', 'instant_rfnd', 'year_month'],
-        'ppd': ['tmuserid', 'msisdn', 'cpc', 'trans_type_id', 'channel_id',
-                'trans_date', 'act_date', 'reno_date', 'camp_name', 'tef_prov',
-                'campana_medium', 'campana_id', 'subscription_id', 'rev', 'year_month']
-    }
-
     for file_type in file_types:
         path = parquet_path / file_type
         if list(path.rglob('*.parquet')):
             df = pl.scan_parquet(str(path / '**/*.parquet'), hive_partitioning=True).collect()
 
-            expected = set(expected_schemas.get(file_type, []))
+            expected = set(SCHEMAS[file_type]) | {PARTITION_COL}
             actual = set(df.columns)
 
             missing = expected - actual
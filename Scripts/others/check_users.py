@@ -5,15 +5,18 @@ Query subscriptions by subscription_id, tmuserid, or msisdn
 Provides summarized data per subscription followed by complete raw output
 """
 
-import duckdb
 import polars as pl
 import sys
 import os
 from pathlib import Path
 from datetime import datetime
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.subscription_utils import subscriptions_path, subscriptions_exist, SubscriptionQuerySession
+
 SCRIPT_DIR = Path(__file__).parent.parent.parent
-PARQUET_FILE = SCRIPT_DIR / "Parquet_Data" / "aggregated" / "subscriptions.parquet"
+SUBSCRIPTIONS_PATH = subscriptions_path(SCRIPT_DIR)
+PARQUET_PATH = SCRIPT_DIR / 'Parquet_Data' / 'transactions'
 
 
 def display_menu():
@@ -45,14 +48,7 @@ def get_query_value(query_type):
     return input(prompts[query_type]).strip()
 
 
-def query_subscriptions(query_type, query_value):
-    if not PARQUET_FILE.exists():
-        print(f"\n❌ Error: Parquet file not found at: {PARQUET_FILE}")
-        print(f"   Please ensure the file exists at the expected location.")
-        return
-
-    con = duckdb.connect()
-
+def query_subscriptions(session, query_type, query_value):
     field_map = {
         '1': 'subscription_id',
         '2': 'tmuserid',
@@ -71,41 +67,31 @@ def query_subscriptions(query_type, query_value):
     print(f'Query Time: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
     print('=' * 100)
 
-    query = f"""
-    SELECT *
-    FROM '{PARQUET_FILE}'
-    WHERE {field_name} = '{query_value}'
-    ORDER BY activation_date DESC
-    """
-
     try:
-        result = con.execute(query).pl()
+        results = session.query(field_name, query_value)
     except Exception as e:
         print(f"\n❌ Error executing query: {e}")
-        con.close()
         return
 
+    result = results['subscriptions']
     if len(result) == 0:
         print(f"\n❌ No subscriptions found for {field_display[query_type]}: {query_value}")
-        con.close()
         return
 
     print(f"\n✓ Found {len(result)} subscription(s)\n")
 
-    print_summary_per_subscription(result, con, field_name, query_value)
+    print_summary_per_subscription(result)
     
-    print_aggregated_summary(result, con, field_name, query_value)
+    print_aggregated_summary(results)
     
     print_raw_output(result)
     
-    con.close()
-    
     print('\n' + '=' * 100)
     print('END OF REPORT')
     print('=' * 100)
 
 
-def print_summary_per_subscription(result, con, field_name, query_value):
+def print_summary_per_subscription(result):
     print('\n' + '=' * 100)
     print('SECTION 1: SUMMARY PER SUBSCRIPTION')
     print('=' * 100)
@@ -187,38 +173,13 @@ def print_summary_per_subscription(result, con, field_name, query_value):
             print(f'      Last Refund Date:   {row["last_refund_date"]}')
 
 
-def print_aggregated_summary(result, con, field_name, query_value):
+def print_aggregated_summary(results):
     print('\n\n' + '=' * 100)
     print('SECTION 2: AGGREGATED SUMMARY')
     print('=' * 100)
 
-    summary_query = f"""
-    SELECT
-        COUNT(*) as total_subscriptions,
-        COUNT(DISTINCT subscription_id) as unique_subscriptions,
-        COUNT(DISTINCT tmuserid) as unique_users,
-        COUNT(DISTINCT msisdn) as unique_msisdns,
-        SUM(renewal_count) as total_renewals,
-        ROUND(SUM(total_revenue), 2) as total_revenue,
-        ROUND(AVG(total_revenue), 2) as avg_revenue_per_sub,
-        ROUND(MIN(total_revenue), 2) as min_revenue,
-        ROUND(MAX(total_revenue), 2) as max_revenue,
-        ROUND(SUM(total_refunded), 2) as total_refunded,
-        SUM(refund_count) as total_refunds,
-        MIN(activation_date) as first_subscription,
-        MAX(activation_date) as last_subscription,
-        SUM(CASE WHEN subscription_status = 'Active' THEN 1 ELSE 0 END) as active_subs,
-        SUM(CASE WHEN subscription_status = 'Deactivated' THEN 1 ELSE 0 END) as deactivated_subs,
-        SUM(CASE WHEN subscription_status = 'Cancelled' THEN 1 ELSE 0 END) as cancelled_subs,
-        SUM(CASE WHEN has_upgraded = TRUE THEN 1 ELSE 0 END) as upgraded_subs,
-        SUM(CASE WHEN missing_act_record = TRUE THEN 1 ELSE 0 END) as missing_act_records,
-        ROUND(AVG(lifetime_days), 0) as avg_lifetime_days,
-        COUNT(DISTINCT first_cpc) as unique_cpcs
-    FROM '{PARQUET_FILE}'
-    WHERE {field_name} = '{query_value}'
-    """
-
-    summary = con.execute(summary_query).pl()
+    result = results['subscriptions']
+    summary = results['summary']
 
     print('\n📊 OVERALL STATISTICS')
     print('-' * 100)
@@ -227,62 +188,19 @@ def print_aggregated_summary(result, con, field_name, query_value):
 
     print('\n\n📱 CPC BREAKDOWN')
     print('-' * 100)
-    cpc_query = f"""
-    SELECT
-        first_cpc,
-        COUNT(*) as subscription_count,
-        SUM(renewal_count) as total_renewals,
-        ROUND(SUM(total_revenue), 2) as total_revenue,
-        ROUND(AVG(total_revenue), 2) as avg_revenue,
-        MIN(activation_date) as first_activation,
-        MAX(activation_date) as last_activation
-    FROM '{PARQUET_FILE}'
-    WHERE {field_name} = '{query_value}'
-    GROUP BY first_cpc
-    ORDER BY subscription_count DESC
-    """
-    cpc_breakdown = con.execute(cpc_query).pl()
+    cpc_breakdown = results['cpc_breakdown']
     with pl.Config(tbl_rows=-1, tbl_cols=-1, tbl_width_chars=1000):
         print(cpc_breakdown)
 
     print('\n\n📈 STATUS BREAKDOWN')
     print('-' * 100)
-    status_query = f"""
-    SELECT
-        subscription_status,
-        COUNT(*) as count,
-        ROUND(AVG(lifetime_days), 0) as avg_lifetime_days,
-        ROUND(SUM(total_revenue), 2) as total_revenue,
-        ROUND(AVG(total_revenue), 2) as avg_revenue
-    FROM '{PARQUET_FILE}'
-    WHERE {field_name} = '{query_value}'
-    GROUP BY subscription_status
-    ORDER BY count DESC
-    """
-    status_breakdown = con.execute(status_query).pl()
+    status_breakdown = results['status_breakdown']
     with pl.Config(tbl_rows=-1, tbl_cols=-1, tbl_width_chars=1000):
         print(status_breakdown)
 
     print('\n\n📅 SUBSCRIPTION TIMELINE')
     print('-' * 100)
-    timeline_query = f"""
-    SELECT
-        subscription_id,
-        tmuserid,
-        msisdn,
-        first_cpc,
-        activation_date,
-        last_activity_date,
-        end_date,
-        subscription_status,
-        lifetime_days,
-        renewal_count,
-        ROUND(total_revenue, 2) as total_revenue
-    FROM '{PARQUET_FILE}'
-    WHERE {field_name} = '{query_value}'
-    ORDER BY activation_date
-    """
-    timeline = con.execute(timeline_query).pl()
+    timeline = results['timeline']
     with pl.Config(tbl_rows=-1, tbl_cols=-1, tbl_width_chars=1000):
         print(timeline)
 
@@ -353,29 +271,47 @@ def print_raw_output(result):
             print()
 
 
-def main():
-    while True:
-        display_menu()
-        choice = get_user_choice()
-        
-        if choice == '0':
-            print("\n👋 Goodbye!")
-            sys.exit(0)
-        
-        query_value = get_query_value(choice)
-        
-        if not query_value:
-            print("❌ Query value cannot be empty.")
-            continue
-        
-        query_subscriptions(choice, query_value)
-        
-        print("\n" + "-" * 100)
-        continue_choice = input("\nDo you want to perform another query? (y/n): ").strip().lower()
-        if continue_choice != 'y':
-            print("\n👋 Goodbye!")
-            break
+def main(db_path=None):
+    if db_path is None and not subscriptions_exist(SUBSCRIPTIONS_PATH):
+        print(f"\n❌ Error: Subscription view not found at: {SUBSCRIPTIONS_PATH}")
+        print(f"   Please ensure the file exists at the expected location.")
+        return
+
+    # One session for the whole run: the view is loaded into memory at most
+    # once and repeated lookups are answered from its cache
+    with SubscriptionQuerySession(SUBSCRIPTIONS_PATH, PARQUET_PATH, db_path=db_path) as session:
+        while True:
+            display_menu()
+            choice = get_user_choice()
+            
+            if choice == '0':
+                print("\n👋 Goodbye!")
+                break
+            
+            query_value = get_query_value(choice)
+            
+            if not query_value:
+                print("❌ Query value cannot be empty.")
+                continue
+            
+            query_subscriptions(session, choice, query_value)
+            
+            print("\n" + "-" * 100)
+            continue_choice = input("\nDo you want to perform another query? (y/n): ").strip().lower()
+            if continue_choice != 'y':
+                print("\n👋 Goodbye!")
+                break
 
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Interactive subscription query tool')
+    parser.add_argument(
+        '--db-path',
+        type=str,
+        help='Query the subscriptions table of a 04_build_subscription_view.py --db-path database'
+    )
+    args = parser.parse_args()
+
+    main(db_path=Path(args.db_path) if args.db_path else None)
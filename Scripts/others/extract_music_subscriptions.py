@@ -8,9 +8,13 @@ that contain any Music CPC in their cpc_list.
 import polars as pl
 from pathlib import Path
 from datetime import datetime
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.subscription_utils import subscriptions_exist, scan_subscriptions
 
 SCRIPT_DIR = Path(__file__).parent.parent
-PARQUET_FILE = SCRIPT_DIR / "Parquet_Data" / "aggregated" / "subscriptions.parquet"
+SUBSCRIPTIONS_PATH = SCRIPT_DIR / "Parquet_Data" / "aggregated" / "subscriptions"
 MUSIC_CPCS_FILE = SCRIPT_DIR / "Music_CPCs.txt"
 OUTPUT_FILE = SCRIPT_DIR / "music_subscriptions.csv"
 
@@ -27,8 +31,8 @@ def load_music_cpcs():
 def extract_music_subscriptions():
     """Extract subscriptions that contain any Music CPC in their cpc_list"""
     
-    if not PARQUET_FILE.exists():
-        print(f"❌ Error: Parquet file not found at: {PARQUET_FILE}")
+    if not subscriptions_exist(SUBSCRIPTIONS_PATH):
+        print(f"❌ Error: Subscription view not found at: {SUBSCRIPTIONS_PATH}")
         return
     
     if not MUSIC_CPCS_FILE.exists():
@@ -43,16 +47,17 @@ def extract_music_subscriptions():
     music_cpcs = load_music_cpcs()
     music_cpcs_set = set(music_cpcs)
     
-    print(f"\n📂 Reading parquet file: {PARQUET_FILE}")
-    df = pl.read_parquet(PARQUET_FILE)
-    print(f"✓ Loaded {len(df):,} total subscriptions")
+    print(f"\n📂 Scanning subscription view: {SUBSCRIPTIONS_PATH}")
+    lf = scan_subscriptions(SUBSCRIPTIONS_PATH)
+    total = lf.select(pl.len()).collect().item()
+    print(f"✓ {total:,} total subscriptions")
     
     print(f"\n🔍 Filtering for Music subscriptions...")
-    music_df = df.filter(
+    music_df = lf.filter(
         pl.col("cpc_list").list.eval(pl.element().is_in(music_cpcs_set)).list.any()
-    )
+    ).collect()
     
-    print(f"✓ Found {len(music_df):,} Music subscriptions ({len(music_df)/len(df)*100:.2f}% of total)")
+    print(f"✓ Found {len(music_df):,} Music subscriptions ({len(music_df)/total*100:.2f}% of total)")
     
     print(f"\n💾 Saving to: {OUTPUT_FILE}")
 
@@ -4,6 +4,17 @@ from pathlib import Path
 import sys
 import pandas as pd
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.lookup_utils import locate, transaction_source
+from utils.timeline_utils import read_keys, batch_timeline, write_timeline
+
+def print_locations(locations):
+    if locations is None:
+        print("Lookup index not built, scanning all partitions")
+    else:
+        partitions = sum(len(months) for months in locations.values())
+        print(f"Lookup index: reading {partitions} partition(s)")
+
 def query_msisdn(msisdn):
     # Add country code 34 if not present
     if not msisdn.startswith('34'):
@@ -26,14 +37,17 @@ def query_msisdn(msisdn):
     subscription_ids = set()
     tmuserids = set()
 
+    # Partitions holding this MSISDN, from the lookup index (None: not built, scan everything)
+    locations = locate(parquet_path, 'msisdn', [msisdn])
+    print_locations(locations)
+
     for trans_type in ['act', 'reno', 'dct']:
-        trans_dir = parquet_path / trans_type
-        if trans_dir.exists():
-            parquet_pattern = str(trans_dir / '**' / '*.parquet')
+        source = transaction_source(parquet_path, trans_type, locations)
+        if source is not None:
             try:
                 query = f"""
                 SELECT DISTINCT subscription_id, tmuserid
-                FROM read_parquet('{parquet_pattern}', hive_partitioning=true)
+                FROM {source}
                 WHERE msisdn = '{msisdn}'
                 """
                 result = conn.execute(query).fetchdf()
@@ -54,13 +68,14 @@ def query_msisdn(msisdn):
 
     # Step 2: Get all transactions for these subscriptions
     subscription_ids_str = ','.join(map(str, subscription_ids))
+    sub_locations = locate(parquet_path, 'subscription_id', subscription_ids)
+    print_locations(sub_locations)
 
     all_transactions = []
 
     # ACT transactions
-    act_dir = parquet_path / 'act'
-    if act_dir.exists():
-        parquet_pattern = str(act_dir / '**' / '*.parquet')
+    source = transaction_source(parquet_path, 'act', sub_locations)
+    if source is not None:
         try:
             query = f"""
             SELECT
@@ -78,7 +93,7 @@ def query_msisdn(msisdn):
                 CAST(NULL AS DOUBLE) as rfnd_amount,
                 CAST(NULL AS BIGINT) as rfnd_cnt,
                 CAST(NULL AS VARCHAR) as instant_rfnd
-            FROM read_parquet('{parquet_pattern}', hive_partitioning=true)
+            FROM {source}
             WHERE subscription_id IN ({subscription_ids_str})
             """
             result = conn.execute(query).fetchdf()
@@ -87,9 +102,8 @@ def query_msisdn(msisdn):
             print(f"Error reading ACT: {str(e)}")
 
     # RENO transactions
-    reno_dir = parquet_path / 'reno'
-    if reno_dir.exists():
-        parquet_pattern = str(reno_dir / '**' / '*.parquet')
+    source = transaction_source(parquet_path, 'reno', sub_locations)
+    if source is not None:
         try:
             query = f"""
             SELECT
@@ -107,7 +121,7 @@ def query_msisdn(msisdn):
                 CAST(NULL AS DOUBLE) as rfnd_amount,
                 CAST(NULL AS BIGINT) as rfnd_cnt,
                 CAST(NULL AS VARCHAR) as instant_rfnd
-            FROM read_parquet('{parquet_pattern}', hive_partitioning=true)
+            FROM {source}
             WHERE subscription_id IN ({subscription_ids_str})
             """
             result = conn.execute(query).fetchdf()
@@ -116,9 +130,8 @@ def query_msisdn(msisdn):
             print(f"Error reading RENO: {str(e)}")
 
     # DCT transactions
-    dct_dir = parquet_path / 'dct'
-    if dct_dir.exists():
-        parquet_pattern = str(dct_dir / '**' / '*.parquet')
+    source = transaction_source(parquet_path, 'dct', sub_locations)
+    if source is not None:
         try:
             query = f"""
             SELECT
@@ -136,7 +149,7 @@ def query_msisdn(msisdn):
                 CAST(NULL AS DOUBLE) as rfnd_amount,
                 CAST(NULL AS BIGINT) as rfnd_cnt,
                 CAST(NULL AS VARCHAR) as instant_rfnd
-            FROM read_parquet('{parquet_pattern}', hive_partitioning=true)
+            FROM {source}
             WHERE subscription_id IN ({subscription_ids_str})
             """
             result = conn.execute(query).fetchdf()
@@ -145,9 +158,8 @@ def query_msisdn(msisdn):
             print(f"Error reading DCT: {str(e)}")
 
     # CNR transactions (no trans_type_id in source, assign 99 for sorting purposes only)
-    cnr_dir = parquet_path / 'cnr'
-    if cnr_dir.exists():
-        parquet_pattern = str(cnr_dir / '**' / '*.parquet')
+    source = transaction_source(parquet_path, 'cnr', sub_locations)
+    if source is not None:
         try:
             query = f"""
             SELECT
@@ -165,7 +177,7 @@ def query_msisdn(msisdn):
                 CAST(NULL AS DOUBLE) as rfnd_amount,
                 CAST(NULL AS BIGINT) as rfnd_cnt,
                 CAST(NULL AS VARCHAR) as instant_rfnd
-            FROM read_parquet('{parquet_pattern}', hive_partitioning=true)
+            FROM {source}
             WHERE sbn_id IN ({subscription_ids_str})
             """
             result = conn.execute(query).fetchdf()
@@ -174,9 +186,8 @@ def query_msisdn(msisdn):
             print(f"Error reading CNR: {str(e)}")
 
     # RFND transactions (no trans_type_id in source, assign 100 for sorting purposes only)
-    rfnd_dir = parquet_path / 'rfnd'
-    if rfnd_dir.exists():
-        parquet_pattern = str(rfnd_dir / '**' / '*.parquet')
+    source = transaction_source(parquet_path, 'rfnd', sub_locations)
+    if source is not None:
         try:
             query = f"""
             SELECT
@@ -194,7 +205,7 @@ def query_msisdn(msisdn):
                 rfnd_amount,
                 rfnd_cnt,
                 instant_rfnd
-            FROM read_parquet('{parquet_pattern}', hive_partitioning=true)
+            FROM {source}
             WHERE sbnid IN ({subscription_ids_str})
             """
             result = conn.execute(query).fetchdf()
@@ -243,9 +254,8 @@ def query_msisdn(msisdn):
     print("ONE-TIME PURCHASES (PPD)")
     print("=" * 80)
 
-    ppd_dir = parquet_path / 'ppd'
-    if ppd_dir.exists():
-        parquet_pattern = str(ppd_dir / '**' / '*.parquet')
+    source = transaction_source(parquet_path, 'ppd', locations)
+    if source is not None:
         try:
             query = f"""
             SELECT
@@ -257,7 +267,7 @@ def query_msisdn(msisdn):
                 channel_id,
                 camp_name,
                 rev
-            FROM read_parquet('{parquet_pattern}', hive_partitioning=true)
+            FROM {source}
             WHERE msisdn = '{msisdn}'
             ORDER BY trans_date DESC
             """
@@ -273,6 +283,8 @@ def query_msisdn(msisdn):
                 print("\nNo one-time purchases found")
         except Exception as e:
             print(f"Error reading PPD: {str(e)}")
+    elif locations is not None:
+        print("\nNo one-time purchases found")
     else:
         print("\nPPD directory not found")
 
@@ -280,11 +292,43 @@ def query_msisdn(msisdn):
 
     conn.close()
 
+def query_msisdn_batch(input_file, output_file=None):
+    """
+    Timeline of every MSISDN listed in input_file, one per line, written as a
+    single CSV (or Parquet, by extension) file.
+    """
+    input_file = Path(input_file)
+    if output_file is None:
+        output_file = input_file.with_name(f"{input_file.stem}_timeline.csv")
+
+    # Add country code 34 if not present
+    msisdns = list(dict.fromkeys(m if m.startswith('34') else '34' + m for m in read_keys(input_file)))
+
+    print(f"Searching for {len(msisdns)} MSISDN(s) from: {input_file}")
+    print("=" * 80)
+
+    project_root = Path(__file__).resolve().parent.parent.parent
+    parquet_path = project_root / 'Parquet_Data' / 'transactions'
+
+    df = batch_timeline(parquet_path, 'msisdn', msisdns)
+    write_timeline(df, output_file)
+
+    found = df['msisdn'].n_unique() if len(df) > 0 else 0
+    print(f"Found transactions for {found} of {len(msisdns)} MSISDN(s)")
+    print(f"Wrote {len(df):,} row(s) to: {output_file}")
+    print("=" * 80)
+
 if __name__ == "__main__":
+    if len(sys.argv) in (3, 4) and sys.argv[1] == '--file':
+        query_msisdn_batch(sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else None)
+        sys.exit(0)
+
     if len(sys.argv) != 2:
         print("Usage: python query_msisdn_from_tx.py <MSISDN>")
+        print("       python query_msisdn_from_tx.py --file <MSISDNS_FILE> [OUTPUT.csv|OUTPUT.parquet]")
         print("Example: python query_msisdn_from_tx.py 686516147")
         print("         python query_msisdn_from_tx.py 34686516147")
+        print("         python query_msisdn_from_tx.py --file tickets.txt timeline.parquet")
         sys.exit(1)
 
     msisdn = sys.argv[1]
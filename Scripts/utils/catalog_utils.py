@@ -0,0 +1,180 @@
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from datetime import date, datetime
+import json
+import os
+import tempfile
+
+from utils.parquet_utils import HIVE_NULL_PARTITION
+from utils.schema_utils import DATE_COLS, PARTITION_COL
+
+CATALOG_DIR_NAME = '_catalog'
+
+# Key of the sidecar's Parquet metadata holding the stamp of the data files
+# its dates were read from
+SOURCE_KEY = b'source'
+
+
+def catalog_dir(parquet_path: Path, tx_type: str) -> Path:
+    """
+    Date coverage catalog of one transaction type: one sidecar per partition
+    with the distinct dates of its primary date column.
+
+    Lives next to the type datasets (transactions/_catalog/<type>), like _txn,
+    _changes and _lookup, so scans of a single type never see it.
+    """
+    return parquet_path / CATALOG_DIR_NAME / tx_type
+
+
+def _partition_dirs(dataset_path: Path) -> list[Path]:
+    if not dataset_path.exists():
+        return []
+    return sorted(p for p in dataset_path.glob(f'{PARTITION_COL}=*') if p.is_dir())
+
+
+def _partition_value(part_dir: Path) -> str | None:
+    label = part_dir.name.split('=', 1)[1]
+    return None if label == HIVE_NULL_PARTITION else label
+
+
+def _source_stamp(files: list[Path]) -> bytes:
+    """
+    Name, size and mtime of a partition's data files. Every writer replaces
+    the files of a partition it touches, so a changed stamp means a stale
+    sidecar.
+    """
+    stamp = []
+    for f in files:
+        stat = f.stat()
+        stamp.append([f.name, stat.st_size, stat.st_mtime_ns])
+    return json.dumps(stamp).encode()
+
+
+def _read_sidecar(sidecar: Path, stamp: bytes) -> list[date] | None:
+    """
+    Dates of a sidecar, or None if it is missing or was written for other files.
+    """
+    if not sidecar.exists():
+        return None
+    try:
+        table = pq.read_table(sidecar)
+    except Exception:
+        return None
+    if (table.schema.metadata or {}).get(SOURCE_KEY) != stamp:
+        return None
+    return table.column('date').to_pylist()
+
+
+def _write_sidecar(dates: list[date], sidecar: Path, stamp: bytes) -> None:
+    sidecar.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.table({'date': pa.array(dates, type=pa.date32())}).replace_schema_metadata({SOURCE_KEY: stamp})
+
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=sidecar.parent)
+    os.close(fd)
+    try:
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, sidecar)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def partition_dates(part_dir: Path, date_col: str) -> list[date]:
+    """
+    Distinct dates of one partition, read from its date column only.
+    """
+    return (
+        pl.scan_parquet(sorted(part_dir.glob('*.parquet')), hive_partitioning=False)
+        .select(pl.col(date_col).dt.date().unique().drop_nulls().sort())
+        .collect()[date_col]
+        .to_list()
+    )
+
+
+def refresh_catalog(parquet_path: Path, tx_type: str, persist: bool = True) -> dict:
+    """
+    Distinct dates per partition of one transaction type.
+
+    Sidecars still matching their partition's files are used as they are;
+    only partitions written since (or never catalogued) are read, and only
+    their date column. With persist, new or stale sidecars are rewritten and
+    sidecars of partitions that no longer exist are removed, so calling this
+    after a write keeps the catalog current.
+
+    Returns:
+        Dict of year_month (None for the Hive default partition) -> sorted dates
+    """
+    dataset_path = parquet_path / tx_type
+    sidecar_dir = catalog_dir(parquet_path, tx_type)
+    date_col = DATE_COLS[tx_type]
+
+    coverage = {}
+    live = set()
+    for part_dir in _partition_dirs(dataset_path):
+        files = sorted(part_dir.glob('*.parquet'))
+        if not files:
+            continue
+        sidecar = sidecar_dir / f"{part_dir.name}.parquet"
+        live.add(sidecar)
+
+        stamp = _source_stamp(files)
+        dates = _read_sidecar(sidecar, stamp)
+        if dates is None:
+            dates = partition_dates(part_dir, date_col)
+            if persist:
+                _write_sidecar(dates, sidecar, stamp)
+        coverage[_partition_value(part_dir)] = dates
+
+    if persist and sidecar_dir.exists():
+        for sidecar in sidecar_dir.glob('*.parquet'):
+            if sidecar not in live:
+                sidecar.unlink(missing_ok=True)
+
+    return coverage
+
+
+def covered_dates(parquet_path: Path, tx_type: str, persist: bool = True) -> set[date]:
+    """
+    Every date present in one transaction type, from the catalog.
+    """
+    dates = set()
+    for partition in refresh_catalog(parquet_path, tx_type, persist).values():
+        dates.update(partition)
+    return dates
+
+
+def _as_date(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def statistics_date_range(parquet_path: Path, tx_type: str) -> tuple[date | None, date | None]:
+    """
+    Min and max of the primary date column of one transaction type, from the
+    row group statistics in the Parquet footers (no data pages are read).
+
+    Returns (None, None) when the type has no rows with a date. Raises
+    ValueError if a row group has no min/max statistics for the column.
+    """
+    date_col = DATE_COLS[tx_type]
+    low, high = None, None
+    for part_dir in _partition_dirs(parquet_path / tx_type):
+        for f in sorted(part_dir.glob('*.parquet')):
+            metadata = pq.read_metadata(f)
+            for i in range(metadata.num_row_groups):
+                row_group = metadata.row_group(i)
+                stats = next(
+                    row_group.column(j) for j in range(row_group.num_columns)
+                    if row_group.column(j).path_in_schema == date_col
+                ).statistics
+                if stats is not None and stats.has_null_count and stats.null_count == row_group.num_rows:
+                    continue  # only null dates (Hive default partition)
+                if stats is None or not stats.has_min_max:
+                    raise ValueError(f"No statistics for {date_col} in {f}")
+                row_min = _as_date(stats.min)
+                row_max = _as_date(stats.max)
+                low = row_min if low is None else min(low, row_min)
+                high = row_max if high is None else max(high, row_max)
+    return low, high
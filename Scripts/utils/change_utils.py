@@ -0,0 +1,107 @@
+import polars as pl
+from pathlib import Path
+from datetime import datetime
+import os
+import tempfile
+
+from utils.schema_utils import ID_COLS
+
+CHANGES_DIR_NAME = '_changes'
+FULL_REBUILD_MARKER = 'FULL_REBUILD'
+
+# Transaction types that feed the subscription view
+VIEW_SOURCE_TYPES = ['act', 'reno', 'dct', 'cnr', 'rfnd']
+
+
+def changes_dir(parquet_path: Path) -> Path:
+    """
+    Journal of subscription ids touched since the last subscription view build.
+
+    Lives next to the type datasets (transactions/_changes), like _txn, so
+    scans of a single type never see it.
+    """
+    return parquet_path / CHANGES_DIR_NAME
+
+
+def record_changed_ids(parquet_path: Path, tx_type: str, df: pl.DataFrame) -> int:
+    """
+    Append the subscription ids present in df to the change journal.
+
+    Called before the rows are written, so a crash in between can only make
+    the next incremental build recompute too many subscriptions, never miss
+    one. Types that do not feed the view are ignored.
+
+    Returns:
+        Number of distinct ids recorded
+    """
+    if tx_type not in VIEW_SOURCE_TYPES or df.is_empty():
+        return 0
+
+    ids = df.select(pl.col(ID_COLS[tx_type]).alias('subscription_id')).unique()
+
+    journal = changes_dir(parquet_path)
+    journal.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
+    output_path = journal / f"{stamp}-{tx_type}.parquet"
+
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=journal)
+    os.close(fd)
+    try:
+        ids.write_parquet(tmp_path, compression='snappy')
+        os.replace(tmp_path, output_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    return len(ids)
+
+
+def mark_full_rebuild(parquet_path: Path) -> None:
+    """
+    Flag that the transaction store was rewritten wholesale, so the next
+    subscription view build has to run over the full history.
+    """
+    journal = changes_dir(parquet_path)
+    journal.mkdir(parents=True, exist_ok=True)
+    (journal / FULL_REBUILD_MARKER).touch()
+
+
+def pending_changes(parquet_path: Path) -> dict:
+    """
+    Snapshot of the change journal.
+
+    Returns:
+        Dict with 'full_rebuild' (bool) and 'files' (journal files present now).
+        Pass it to clear_changes() once the view is rebuilt, so ids recorded
+        by an ingest running in the meantime are kept for the next build.
+    """
+    journal = changes_dir(parquet_path)
+    return {
+        'full_rebuild': (journal / FULL_REBUILD_MARKER).exists(),
+        'files': sorted(journal.glob('*.parquet'))
+    }
+
+
+def load_changed_ids(changes: dict) -> pl.DataFrame:
+    """
+    Distinct subscription ids of a pending_changes() snapshot.
+
+    A null id is kept when present: null-id transactions form their own group
+    in the view and must be recomputed too.
+    """
+    if not changes['files']:
+        return pl.DataFrame(schema={'subscription_id': pl.Int64})
+
+    return pl.read_parquet(changes['files']).unique()
+
+
+def clear_changes(parquet_path: Path, changes: dict) -> None:
+    """
+    Drop the journal entries of a pending_changes() snapshot.
+    """
+    for path in changes['files']:
+        path.unlink(missing_ok=True)
+
+    if changes['full_rebuild']:
+        (changes_dir(parquet_path) / FULL_REBUILD_MARKER).unlink(missing_ok=True)
@@ -1,10 +1,16 @@
 import polars as pl
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
+import json
 import os
 import re
+import shutil
 import tempfile
 
+from utils.schema_utils import DATE_COLS
+from utils.parquet_utils import write_atomic_parquet
+from utils.catalog_utils import covered_dates
+
 
 def load_excluded_users(path: Path) -> tuple[set[str], set[str]]:
     """
@@ -41,6 +47,106 @@ def load_excluded_users(path: Path) -> tuple[set[str], set[str]]:
         return set(), set()
 
 
+# Columns the counters need besides cpc and the date column, when present
+COUNTER_SOURCE_COLS = ['rev', 'rfnd_amount', 'rfnd_cnt', 'channel_act', 'channel_dct']
+
+
+def date_bounds_predicate(date_col: str, dates: list[str]) -> pl.Expr:
+    """
+    Filter on a Datetime column for a set of days, as typed half-open bounds.
+
+    Consecutive days are merged into one [start, end + 1 day) range. Comparing
+    the raw column against datetime literals (rather than a derived date or
+    string) lets the Parquet reader skip row groups from their min/max
+    statistics.
+    """
+    days = sorted({datetime.strptime(d, '%Y-%m-%d') for d in dates})
+    ranges = []
+    for day in days:
+        if ranges and day == ranges[-1][1]:
+            ranges[-1][1] = day + timedelta(days=1)
+        else:
+            ranges.append([day, day + timedelta(days=1)])
+
+    predicate = pl.lit(False)
+    for start, end in ranges:
+        predicate = predicate | ((pl.col(date_col) >= start) & (pl.col(date_col) < end))
+    return predicate
+
+
+def _exclude(lf: pl.LazyFrame, col: str, values: set[str]) -> pl.LazyFrame:
+    """
+    Drop rows whose `col` is in `values`, as a lazy anti-join.
+
+    Rows with a null `col` are dropped too, as the original is_in filter did,
+    so counters do not shift.
+    """
+    excluded = pl.LazyFrame({col: sorted(values)}, schema={col: pl.Utf8})
+    return (
+        lf.filter(pl.col(col).is_not_null())
+        .join(excluded, left_on=pl.col(col).cast(pl.Utf8), right_on=col, how='anti')
+    )
+
+
+def scan_transactions(
+    parquet_base: Path,
+    tx_type: str,
+    dates: list[str],
+    excluded_msisdns: set[str] | None = None,
+    excluded_tmuserids: set[str] | None = None
+) -> pl.LazyFrame | None:
+    """
+    Lazily scan transactions of one type for a set of dates.
+
+    Each year_month partition covering the dates is scanned once, whatever
+    the number of days requested from it. Only the needed columns are read,
+    the date filter is pushed into the scan as typed datetime bounds and the
+    exclusion lists are applied as anti-joins.
+
+    Args:
+        parquet_base: Base path to Parquet_Data/transactions
+        tx_type: Transaction type (act, reno, dct, cnr, ppd, rfnd)
+        dates: Date strings YYYY-MM-DD
+        excluded_msisdns: Optional set of MSISDNs to exclude from results
+        excluded_tmuserids: Optional set of TMUSERIDs to exclude from results
+
+    Returns:
+        LazyFrame with cpc, the type's date column and the counter source
+        columns it has, or None if no partition exists for the dates
+    """
+    files = []
+    for year_month in sorted({d[:7] for d in dates}):
+        tx_path = parquet_base / tx_type / f"year_month={year_month}"
+        files.extend(sorted(tx_path.glob('*.parquet')))
+
+    if not files:
+        return None
+
+    date_col = DATE_COLS[tx_type]
+    lf = pl.scan_parquet(files, hive_partitioning=False)
+    columns = lf.collect_schema().names()
+
+    if date_col not in columns:
+        return None
+
+    output_cols = ['cpc', date_col] + [c for c in COUNTER_SOURCE_COLS if c in columns]
+    exclusions = [
+        (col, values)
+        for col, values in (('msisdn', excluded_msisdns), ('tmuserid', excluded_tmuserids))
+        if values and col in columns
+    ]
+
+    lf = (
+        lf.select(output_cols + [col for col, _ in exclusions])
+        .filter(date_bounds_predicate(date_col, dates))
+    )
+
+    for col, values in exclusions:
+        lf = _exclude(lf, col, values)
+
+    return lf.select(output_cols)
+
+
 def load_transactions_for_date(
     parquet_base: Path,
     target_date: str,
@@ -61,99 +167,33 @@ def load_transactions_for_date(
     Returns:
         DataFrame with transactions for that date
     """
-    year_month = target_date[:7]
-    tx_path = parquet_base / tx_type / f"year_month={year_month}"
-
-    if not tx_path.exists():
-        return pl.DataFrame()
-
-    date_col_map = {
-        'act': 'trans_date',
-        'reno': 'trans_date',
-        'dct': 'trans_date',
-        'cnr': 'cancel_date',
-        'ppd': 'trans_date',
-        'rfnd': 'refnd_date'
-    }
-
-    date_col = date_col_map[tx_type]
-
     try:
-        df = pl.scan_parquet(str(tx_path / "*.parquet")).collect()
-
-        if df.is_empty() or date_col not in df.columns:
+        lf = scan_transactions(parquet_base, tx_type, [target_date], excluded_msisdns, excluded_tmuserids)
+        if lf is None:
             return pl.DataFrame()
 
-        df = df.filter(
-            pl.col(date_col).dt.date().cast(pl.Utf8) == target_date
-        )
-
-        if excluded_msisdns and 'msisdn' in df.columns:
-            df = df.filter(~pl.col('msisdn').cast(pl.Utf8).is_in(excluded_msisdns))
-
-        if excluded_tmuserids and 'tmuserid' in df.columns:
-            df = df.filter(~pl.col('tmuserid').cast(pl.Utf8).is_in(excluded_tmuserids))
-
-        cols_to_select = ['cpc', date_col]
-        if 'rev' in df.columns:
-            cols_to_select.append('rev')
-        if 'rfnd_amount' in df.columns:
-            cols_to_select.append('rfnd_amount')
-        if 'rfnd_cnt' in df.columns:
-            cols_to_select.append('rfnd_cnt')
-        if 'channel_act' in df.columns:
-            cols_to_select.append('channel_act')
-        if 'channel_dct' in df.columns:
-            cols_to_select.append('channel_dct')
-
-        return df.select(cols_to_select)
+        return lf.collect()
     except Exception:
         return pl.DataFrame()
 
 
 def discover_all_transaction_dates(parquet_base: Path) -> list[str]:
     """
-    Scan all transaction parquet files and extract unique dates.
+    Unique dates across all transaction types, from the date catalog (only
+    partitions written since they were last catalogued are read).
 
     Returns:
         Sorted list of date strings (YYYY-MM-DD)
     """
     all_dates = set()
-    tx_types = ['act', 'reno', 'dct', 'cnr', 'ppd', 'rfnd']
-
-    date_col_map = {
-        'act': 'trans_date',
-        'reno': 'trans_date',
-        'dct': 'trans_date',
-        'cnr': 'cancel_date',
-        'ppd': 'trans_date',
-        'rfnd': 'refnd_date'
-    }
 
-    for tx_type in tx_types:
-        tx_path = parquet_base / tx_type
-        if not tx_path.exists():
+    for tx_type in DATE_COLS:
+        try:
+            all_dates.update(covered_dates(parquet_base, tx_type))
+        except Exception:
             continue
 
-        date_col = date_col_map[tx_type]
-
-        for partition_dir in tx_path.glob('year_month=*'):
-            parquet_files = list(partition_dir.glob('*.parquet'))
-            if not parquet_files:
-                continue
-
-            try:
-                df = pl.scan_parquet(str(partition_dir / "*.parquet")).select(date_col).collect()
-
-                if df.is_empty() or date_col not in df.columns:
-                    continue
-
-                dates = df[date_col].dt.date().cast(pl.Utf8).unique().to_list()
-                all_dates.update([d for d in dates if d is not None])
-            except Exception:
-                continue
-
-    return sorted([d for d in all_dates if d is not None])
+    return sorted(d.isoformat() for d in all_dates)
 
 
 def get_missing_dates(parquet_base: Path, counters_path: Path) -> list[str]:
@@ -169,11 +209,7 @@ def get_missing_dates(parquet_base: Path, counters_path: Path) -> list[str]:
         return sorted(tx_dates)
 
     try:
-        counters = pl.read_parquet(counters_path)
-        if counters.is_empty():
-            return sorted(tx_dates)
-
-        counter_dates = set(counters['date'].dt.date().cast(pl.Utf8).unique().to_list())
+        counter_dates = list_counter_dates(counters_path)
     except Exception:
         return sorted(tx_dates)
 
@@ -199,37 +235,249 @@ def load_mastercpc(path: Path) -> pl.DataFrame:
     return df.unique(subset=['cpc'])
 
 
+# Counters_CPC columns, in file order
+COUNTERS_CPC_SCHEMA = {
+    'date': pl.Date,
+    'cpc': pl.Int64,
+    'act_count': pl.Int64,
+    'act_free': pl.Int64,
+    'act_pay': pl.Int64,
+    'upg_count': pl.Int64,
+    'reno_count': pl.Int64,
+    'dct_count': pl.Int64,
+    'upg_dct_count': pl.Int64,
+    'cnr_count': pl.Int64,
+    'ppd_count': pl.Int64,
+    'rfnd_count': pl.Int64,
+    'rfnd_amount': pl.Float64,
+    'rev': pl.Float64,
+    'last_updated': pl.Datetime
+}
+
+COMPACTED_FILE_NAME = 'compacted.parquet'
+_DATE_FILE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}\.parquet$')
+
+
+def counters_month_dir(store_path: Path, year_month: str) -> Path:
+    """
+    Directory of one month of the partitioned Counters_CPC store.
+    """
+    return store_path / f"year_month={year_month}"
+
+
+def _date_files(month_dir: Path) -> dict[str, Path]:
+    """
+    Per-date files of a month directory, keyed by date string.
+
+    Temp files left by an interrupted atomic write do not match the
+    YYYY-MM-DD.parquet pattern and are ignored.
+    """
+    return {
+        f.name[:10]: f
+        for f in sorted(month_dir.glob('*.parquet'))
+        if _DATE_FILE_RE.match(f.name)
+    }
+
+
+def _read_month(month_dir: Path) -> pl.DataFrame:
+    """
+    Read one month of the store.
+
+    A per-date file replaces the rows of that date in the compacted file, so
+    a date is only ever written as a single file (crash-safe, constant cost).
+    """
+    date_files = _date_files(month_dir)
+    frames = []
+
+    compacted = month_dir / COMPACTED_FILE_NAME
+    if compacted.exists():
+        overridden = [datetime.strptime(d, '%Y-%m-%d').date() for d in date_files]
+        frames.append(pl.read_parquet(compacted).filter(~pl.col('date').is_in(overridden)))
+
+    frames.extend(pl.read_parquet(f) for f in date_files.values())
+
+    if not frames:
+        return pl.DataFrame(schema=COUNTERS_CPC_SCHEMA)
+
+    return pl.concat(frames, how='diagonal_relaxed')
+
+
 def load_counters_cpc(path: Path) -> pl.DataFrame:
     """
-    Load existing Counters_CPC.parquet if it exists.
+    Load existing CPC counters if they exist.
+
+    Args:
+        path: Partitioned store directory (Counters/Counters_CPC) or a legacy
+              single Counters_CPC.parquet file
+
+    Returns:
+        DataFrame sorted by date and cpc
     """
     if not path.exists():
-        return pl.DataFrame(schema={
-            'date': pl.Date,
-            'cpc': pl.Int64,
-            'act_count': pl.Int64,
-            'reno_count': pl.Int64,
-            'dct_count': pl.Int64,
-            'cnr_count': pl.Int64,
-            'ppd_count': pl.Int64,
-            'rfnd_count': pl.Int64,
-            'last_updated': pl.Datetime
-        })
-    
-    return pl.read_parquet(path)
+        return pl.DataFrame(schema=COUNTERS_CPC_SCHEMA)
+
+    if path.is_file():
+        return pl.read_parquet(path)
+
+    frames = [_read_month(d) for d in sorted(path.glob('year_month=*')) if d.is_dir()]
+    frames = [f for f in frames if not f.is_empty()]
+    if not frames:
+        return pl.DataFrame(schema=COUNTERS_CPC_SCHEMA)
+
+    return pl.concat(frames, how='diagonal_relaxed').sort(['date', 'cpc'])
+
+
+def list_counter_dates(path: Path) -> set[str]:
+    """
+    Dates (YYYY-MM-DD) present in the CPC counters.
+
+    Per-date files are listed by name; only the date column of compacted
+    files is read.
+    """
+    if path.is_file():
+        df = pl.read_parquet(path, columns=['date'])
+        return set(df['date'].cast(pl.Utf8).unique().to_list())
+
+    dates = set()
+    for month_dir in path.glob('year_month=*'):
+        dates.update(_date_files(month_dir))
+        compacted = month_dir / COMPACTED_FILE_NAME
+        if compacted.exists():
+            df = pl.read_parquet(compacted, columns=['date'])
+            dates.update(df['date'].cast(pl.Utf8).unique().to_list())
+    return dates
+
+
+def write_counters_dates(store_path: Path, counters: pl.DataFrame, dates: list[str]) -> None:
+    """
+    Replace the counters of the given dates in the partitioned store.
+
+    Each date with rows in `counters` is written as its own file
+    (year_month=YYYY-MM/YYYY-MM-DD.parquet), so the cost does not grow with
+    history. A date without rows is removed from the store.
+    """
+    by_date = {
+        d.strftime('%Y-%m-%d'): df
+        for (d,), df in counters.group_by('date')
+    } if not counters.is_empty() else {}
+
+    for date_str in dates:
+        month_dir = counters_month_dir(store_path, date_str[:7])
+        date_file = month_dir / f"{date_str}.parquet"
+        df = by_date.get(date_str)
+
+        if df is not None and not df.is_empty():
+            write_atomic_parquet(df.sort('cpc'), date_file)
+            continue
+
+        compacted = month_dir / COMPACTED_FILE_NAME
+        if compacted.exists():
+            date_val = datetime.strptime(date_str, '%Y-%m-%d').date()
+            df_compacted = pl.read_parquet(compacted)
+            if date_val in df_compacted['date'].to_list():
+                write_atomic_parquet(df_compacted.filter(pl.col('date') != date_val), compacted)
+        if date_file.exists():
+            date_file.unlink()
+
+
+def compact_counters(store_path: Path) -> dict:
+    """
+    Fold the per-date files of every month into its compacted file.
+
+    The compacted file is written atomically before the per-date files are
+    deleted; since per-date files take precedence, a crash in between leaves
+    the same data visible and compaction can simply be re-run.
+
+    Returns:
+        Dict with 'months' compacted and 'files' folded
+    """
+    stats = {'months': 0, 'files': 0}
+
+    for month_dir in sorted(store_path.glob('year_month=*')):
+        date_files = _date_files(month_dir)
+        if not date_files:
+            continue
+
+        df = _read_month(month_dir).sort(['date', 'cpc'])
+        write_atomic_parquet(df, month_dir / COMPACTED_FILE_NAME)
+        for f in date_files.values():
+            f.unlink()
+
+        stats['months'] += 1
+        stats['files'] += len(date_files)
 
+    return stats
 
-def write_atomic_parquet(df: pl.DataFrame, path: Path) -> None:
+
+def migrate_legacy_counters(legacy_path: Path, store_path: Path) -> bool:
     """
-    Write DataFrame to Parquet atomically (temp + rename).
+    Split a legacy single-file Counters_CPC.parquet into the partitioned store.
+
+    Runs only when the store does not exist yet. Each month becomes one
+    compacted file; the legacy file is kept, renamed to *.migrated.
+
+    Returns:
+        True if a migration was performed
+    """
+    if store_path.exists() or not legacy_path.is_file():
+        return False
+
+    df = pl.read_parquet(legacy_path)
+    for col, dtype in COUNTERS_CPC_SCHEMA.items():
+        if col not in df.columns:
+            default = datetime.now() if col == 'last_updated' else 0
+            df = df.with_columns(pl.lit(default).cast(dtype).alias(col))
+    df = df.select(list(COUNTERS_CPC_SCHEMA))
+
+    staging = store_path.with_name(store_path.name + '.tmp')
+    if staging.exists():
+        shutil.rmtree(staging)
+
+    months = df.with_columns(pl.col('date').dt.strftime('%Y-%m').alias('_year_month'))
+    for (year_month,), df_month in months.group_by('_year_month'):
+        write_atomic_parquet(
+            df_month.drop('_year_month').sort(['date', 'cpc']),
+            counters_month_dir(staging, year_month) / COMPACTED_FILE_NAME
+        )
+
+    staging.mkdir(parents=True, exist_ok=True)
+    os.replace(staging, store_path)
+    os.replace(legacy_path, legacy_path.with_name(legacy_path.name + '.migrated'))
+    return True
+
+
+CHECKPOINT_FILE_NAME = '_checkpoint.parquet'
+
+# Key of the checkpoint's Parquet metadata listing the dates it holds
+CHECKPOINT_DATES_KEY = 'dates'
+
+
+def checkpoint_path(store_path: Path) -> Path:
+    """
+    Checkpoint of a counters run in progress: the counts of the dates computed
+    so far and not yet written to the store. Lives next to the store
+    (Counters/_checkpoint.parquet) and is removed once the run's outputs are
+    written.
+    """
+    return store_path.parent / CHECKPOINT_FILE_NAME
+
+
+def write_checkpoint(path: Path, counters: pl.DataFrame, dates: list[str]) -> None:
+    """
+    Save the counters of the given dates atomically. Dates are listed in the
+    file metadata, so dates without transactions are kept too.
     """
     path.parent.mkdir(parents=True, exist_ok=True)
-    
+
     fd, tmp_path = tempfile.mkstemp(suffix='.parquet', dir=path.parent)
     os.close(fd)
-    
+
     try:
-        df.write_parquet(tmp_path, compression='snappy')
+        counters.write_parquet(
+            tmp_path,
+            compression='snappy',
+            metadata={CHECKPOINT_DATES_KEY: json.dumps(sorted(dates))}
+        )
         os.replace(tmp_path, path)
     except Exception:
         if os.path.exists(tmp_path):
@@ -237,6 +485,23 @@ def write_atomic_parquet(df: pl.DataFrame, path: Path) -> None:
         raise
 
 
+def load_checkpoint(path: Path) -> tuple[pl.DataFrame, list[str]]:
+    """
+    Counters and dates of a checkpoint; empty if there is none or it cannot
+    be read.
+    """
+    empty = pl.DataFrame(schema=COUNTERS_CPC_SCHEMA), []
+    if not path.exists():
+        return empty
+
+    try:
+        dates = json.loads(pl.read_parquet_metadata(path)[CHECKPOINT_DATES_KEY])
+        return pl.read_parquet(path), dates
+    except Exception as e:
+        print(f"  ⚠️  Ignoring unreadable checkpoint {path.name}: {e}")
+        return empty
+
+
 def write_atomic_csv(df: pl.DataFrame, path: Path) -> None:
     """
     Write DataFrame to CSV atomically (temp + rename).
@@ -0,0 +1,181 @@
+import polars as pl
+from pathlib import Path
+from datetime import date
+import os
+import tempfile
+
+from utils.schema_utils import SCHEMAS, DATE_COLS, date_columns, partition_expr
+
+MANIFEST_DIR_NAME = '_sources'
+MANIFEST_FILE_NAME = 'csv_manifest.parquet'
+
+# One row per (CSV file, date of its primary date column)
+MANIFEST_SCHEMA = {
+    'path': pl.Utf8,
+    'file_key': pl.Utf8,
+    'size': pl.Int64,
+    'mtime_ns': pl.Int64,
+    'date': pl.Date,
+    'rows': pl.Int64
+}
+
+
+def scan_historical_csv(csv_file: Path, file_key: str, ignore_errors: bool = False) -> pl.LazyFrame:
+    """
+    Lazily read one historical CSV with parsed date columns and year_month.
+
+    Filters applied to the result are pushed into the CSV reader, so rows
+    outside them are parsed but never materialized.
+    """
+    lf = pl.scan_csv(
+        csv_file,
+        schema=SCHEMAS[file_key],
+        null_values=['', 'NULL', 'null'],
+        ignore_errors=ignore_errors
+    )
+
+    # Parse date columns with flexible format handling
+    date_cols = date_columns(file_key)
+    lf = lf.with_columns([
+        # Try parsing with datetime format first, then date-only format
+        pl.when(pl.col(date_col).str.contains(' '))
+        .then(
+            pl.col(date_col).str.strptime(
+                pl.Datetime,
+                format='%Y-%m-%d %H:%M:%S',
+                strict=False
+            )
+        )
+        .otherwise(
+            pl.col(date_col).str.strptime(
+                pl.Datetime,
+                format='%Y-%m-%d',
+                strict=False
+            )
+        ).alias(date_col)
+        for date_col in date_cols
+    ])
+
+    # Add partition column (year-month of the type's primary date column)
+    return lf.with_columns(partition_expr(file_key))
+
+
+def manifest_path(parquet_path: Path) -> Path:
+    """
+    Manifest of the historical CSV sources: per file, its size and mtime and
+    the number of rows on each date of its primary date column.
+
+    Lives next to the type datasets (transactions/_sources), like _lookup and
+    _catalog, so scans of a single type never see it. Files are keyed by
+    their absolute path, so several source folders can share it.
+    """
+    return parquet_path / MANIFEST_DIR_NAME / MANIFEST_FILE_NAME
+
+
+def load_manifest(parquet_path: Path) -> pl.DataFrame:
+    path = manifest_path(parquet_path)
+    if not path.exists():
+        return pl.DataFrame(schema=MANIFEST_SCHEMA)
+    return pl.read_parquet(path)
+
+
+def _write_manifest(df: pl.DataFrame, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=path.parent)
+    os.close(fd)
+    try:
+        df.write_parquet(tmp_path, compression='snappy')
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _file_entries(csv_file: Path, file_key: str) -> pl.DataFrame:
+    """
+    Manifest entries of one CSV: rows per date (null for unparseable dates),
+    parsed exactly as the backfill parses them.
+    """
+    stat = csv_file.stat()
+    counts = (
+        scan_historical_csv(csv_file, file_key, ignore_errors=True)
+        .select(pl.col(DATE_COLS[file_key]).dt.date().alias('date'))
+        .group_by('date')
+        .agg(pl.len().cast(pl.Int64).alias('rows'))
+        .collect()
+    )
+    if counts.is_empty():
+        # Keep empty files in the manifest so they are not re-read every run
+        counts = pl.DataFrame({'date': [None], 'rows': [0]}, schema={'date': pl.Date, 'rows': pl.Int64})
+
+    return counts.with_columns(
+        pl.lit(str(csv_file.resolve())).alias('path'),
+        pl.lit(file_key).alias('file_key'),
+        pl.lit(stat.st_size).cast(pl.Int64).alias('size'),
+        pl.lit(stat.st_mtime_ns).cast(pl.Int64).alias('mtime_ns')
+    ).select(list(MANIFEST_SCHEMA))
+
+
+def update_manifest(parquet_path: Path, file_key: str, csv_files: list[Path], persist: bool = True) -> pl.DataFrame:
+    """
+    Bring the manifest up to date for the given CSVs of one type and return
+    their entries.
+
+    Only files that are new, or whose size or mtime changed, are read (their
+    date column only); entries of files that no longer exist are dropped.
+    Files that cannot be read are reported and left out, so they are retried
+    on the next run. Without persist the entries are returned but the
+    manifest file is not rewritten.
+    """
+    manifest = load_manifest(parquet_path)
+    current = {str(csv_file.resolve()): csv_file.stat() for csv_file in csv_files}
+
+    known = (
+        manifest.filter((pl.col('file_key') == file_key) & pl.col('path').is_in(list(current)))
+        .select('path', 'size', 'mtime_ns')
+        .unique()
+    )
+    up_to_date = {
+        path for path, size, mtime_ns in known.iter_rows()
+        if current[path].st_size == size and current[path].st_mtime_ns == mtime_ns
+    }
+
+    new_entries = []
+    for csv_file in csv_files:
+        if str(csv_file.resolve()) in up_to_date:
+            continue
+        try:
+            new_entries.append(_file_entries(csv_file, file_key))
+        except Exception as e:
+            print(f"  ⚠️  Error reading {csv_file.name}: {e}")
+
+    gone = [path for path in manifest['path'].unique().to_list() if not Path(path).exists()]
+    if new_entries or gone:
+        stale = [path for path in current if path not in up_to_date]
+        manifest = pl.concat([
+            manifest.filter(~pl.col('path').is_in(stale + gone)),
+            *new_entries
+        ])
+        if persist:
+            _write_manifest(manifest, manifest_path(parquet_path))
+
+    return manifest.filter((pl.col('file_key') == file_key) & pl.col('path').is_in(list(current)))
+
+
+def csv_date_range(entries: pl.DataFrame) -> tuple[date | None, date | None]:
+    """
+    Min and max date over manifest entries, ignoring unparseable dates.
+    """
+    dates = entries['date'].drop_nulls()
+    if dates.is_empty():
+        return None, None
+    return dates.min(), dates.max()
+
+
+def files_for_dates(entries: pl.DataFrame, dates) -> list[Path]:
+    """
+    CSV files of the manifest entries holding rows on any of the given dates.
+    """
+    paths = entries.filter(pl.col('date').is_in(list(dates)))['path'].unique().sort().to_list()
+    return [Path(path) for path in paths]
@@ -0,0 +1,67 @@
+import duckdb
+from pathlib import Path
+
+from utils.schema_utils import TRANSACTION_TYPES
+
+# Default location of the persistent subscription view database
+DEFAULT_DB_NAME = 'subscriptions.duckdb'
+
+
+def connect(
+    db_path: Path | None = None,
+    threads: int | None = None,
+    memory_limit: str | None = None,
+    temp_directory: Path | None = None,
+    read_only: bool = False
+) -> duckdb.DuckDBPyConnection:
+    """
+    Open an in-memory (db_path=None) or on-disk DuckDB database.
+
+    Args:
+        db_path: Database file; created if missing
+        threads: Worker threads (DuckDB default: all cores)
+        memory_limit: e.g. '8GB' (DuckDB default: 80% of RAM)
+        temp_directory: Spill directory for operators that exceed
+                        memory_limit. Defaults to '<db_path>.tmp' for a
+                        database file; needed to spill from an in-memory one.
+        read_only: Open an existing database file read-only
+    """
+    if db_path is not None:
+        db_path = Path(db_path)
+        if not read_only:
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+        con = duckdb.connect(str(db_path), read_only=read_only)
+    else:
+        con = duckdb.connect()
+
+    if threads:
+        con.execute(f"SET threads = {int(threads)}")
+    if memory_limit:
+        con.execute(f"SET memory_limit = '{memory_limit}'")
+    if temp_directory:
+        Path(temp_directory).mkdir(parents=True, exist_ok=True)
+        con.execute(f"SET temp_directory = '{temp_directory}'")
+
+    return con
+
+
+def create_transaction_views(con: duckdb.DuckDBPyConnection, parquet_path: Path) -> list[str]:
+    """
+    Create (or refresh) one transactions_<type> view per transaction type over
+    its Parquet dataset, so tools attached to a database file can query the
+    store without repeating the globs.
+
+    Returns:
+        Names of the views created (types without data are skipped)
+    """
+    created = []
+    for tx_type in TRANSACTION_TYPES:
+        if not list((parquet_path / tx_type).glob('*/*.parquet')):
+            continue
+        name = f"transactions_{tx_type}"
+        con.execute(f"""
+            CREATE OR REPLACE VIEW {name} AS
+            SELECT * FROM read_parquet('{parquet_path}/{tx_type}/**/*.parquet', hive_partitioning=true)
+        """)
+        created.append(name)
+    return created
@@ -0,0 +1,253 @@
+import polars as pl
+import pyarrow.parquet as pq
+from pathlib import Path
+from datetime import datetime
+import os
+import tempfile
+
+from utils.parquet_utils import partition_path
+from utils.schema_utils import TRANSACTION_TYPES, SCHEMAS, ID_COLS, PARTITION_COL, partition_expr
+
+LOOKUP_DIR_NAME = '_lookup'
+BASE_FILE_NAME = 'base.parquet'
+
+# Keys a single user can be looked up by. subscription_id maps to each
+# type's own id column (sbn_id for cnr, sbnid for rfnd).
+LOOKUP_KEYS = ['msisdn', 'tmuserid', 'subscription_id']
+
+# Small row groups over the key-sorted base file, so a point lookup only
+# reads the row group whose min/max range holds the key
+LOOKUP_ROW_GROUP_SIZE = 16_384
+
+# Delta files per key folded into the base file by compact_lookup()
+COMPACT_AFTER = 30
+
+
+def lookup_dir(parquet_path: Path) -> Path:
+    """
+    Lookup index of the transaction store: key value -> (type, year_month)
+    partitions holding it, one sub-directory per key.
+
+    Lives next to the type datasets (transactions/_lookup), like _txn and
+    _changes, so scans of a single type never see it.
+    """
+    return parquet_path / LOOKUP_DIR_NAME
+
+
+def lookup_exists(parquet_path: Path) -> bool:
+    """
+    Whether every key has a base file, i.e. build_lookup() has run.
+    """
+    return all((lookup_dir(parquet_path) / key / BASE_FILE_NAME).exists() for key in LOOKUP_KEYS)
+
+
+def _key_column(tx_type: str, key: str) -> str | None:
+    """
+    Column of a transaction type holding a lookup key, if the type has it.
+    """
+    if key == 'subscription_id':
+        return ID_COLS[tx_type]
+    return key if key in SCHEMAS[tx_type] else None
+
+
+def _key_dtype(key: str) -> pl.DataType:
+    return pl.Int64 if key == 'subscription_id' else pl.Utf8
+
+
+def _entries(lf: pl.LazyFrame, tx_type: str, key: str) -> pl.LazyFrame:
+    """
+    Distinct (key, tx_type, year_month) entries of one type's rows.
+    """
+    return lf.select(
+        pl.col(_key_column(tx_type, key)).cast(_key_dtype(key)).alias('key'),
+        pl.lit(tx_type).alias('tx_type'),
+        pl.col(PARTITION_COL).cast(pl.Utf8)
+    ).unique()
+
+
+def _write_atomic(df: pl.DataFrame, output_path: Path) -> None:
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=output_path.parent)
+    os.close(fd)
+    try:
+        pq.write_table(
+            df.to_arrow(),
+            tmp_path,
+            compression='snappy',
+            row_group_size=LOOKUP_ROW_GROUP_SIZE
+        )
+        os.replace(tmp_path, output_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def record_lookup_entries(parquet_path: Path, tx_type: str, df: pl.DataFrame) -> int:
+    """
+    Add the keys present in df (with its year_month column) to the lookup
+    index, as one small delta file per key.
+
+    Called before the rows are written, like record_changed_ids(): an entry
+    pointing at a partition that never got written only costs a wasted
+    directory check, a missing entry would hide rows from the query tools.
+
+    Returns:
+        Number of entries recorded
+    """
+    if df.is_empty():
+        return 0
+
+    if PARTITION_COL not in df.columns:
+        df = df.with_columns([partition_expr(tx_type)])
+
+    stamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
+    recorded = 0
+    for key in LOOKUP_KEYS:
+        if _key_column(tx_type, key) is None:
+            continue
+        entries = _entries(df.lazy(), tx_type, key).collect()
+        key_dir = lookup_dir(parquet_path) / key
+        key_dir.mkdir(parents=True, exist_ok=True)
+        _write_atomic(entries, key_dir / f"delta-{stamp}-{tx_type}.parquet")
+        recorded += len(entries)
+
+    return recorded
+
+
+def _fold(files: list[Path], output_path: Path) -> int:
+    df = (
+        pl.scan_parquet(files)
+        .unique()
+        .sort(['key', 'tx_type', PARTITION_COL], nulls_last=True)
+        .collect()
+    )
+    _write_atomic(df, output_path)
+    return len(df)
+
+
+def build_lookup(parquet_path: Path) -> dict:
+    """
+    Rebuild the lookup index from the whole transaction store, replacing
+    the base file and any delta files of every key.
+
+    Returns:
+        Dict of key -> number of entries
+    """
+    counts = {}
+    for key in LOOKUP_KEYS:
+        key_dir = lookup_dir(parquet_path) / key
+        key_dir.mkdir(parents=True, exist_ok=True)
+        deltas = sorted(key_dir.glob('delta-*.parquet'))
+
+        parts = []
+        for tx_type in TRANSACTION_TYPES:
+            if _key_column(tx_type, key) is None:
+                continue
+            if not list((parquet_path / tx_type).glob('*/*.parquet')):
+                continue
+            lf = pl.scan_parquet(
+                str(parquet_path / tx_type / '**/*.parquet'),
+                hive_partitioning=True,
+                hive_schema={PARTITION_COL: pl.Utf8}
+            )
+            parts.append(_entries(lf, tx_type, key))
+
+        if parts:
+            df = pl.concat(parts).sort(['key', 'tx_type', PARTITION_COL], nulls_last=True).collect()
+        else:
+            df = pl.DataFrame(schema={'key': _key_dtype(key), 'tx_type': pl.Utf8, PARTITION_COL: pl.Utf8})
+        _write_atomic(df, key_dir / BASE_FILE_NAME)
+        counts[key] = len(df)
+
+        for path in deltas:
+            path.unlink(missing_ok=True)
+
+    return counts
+
+
+def compact_lookup(parquet_path: Path, min_deltas: int = COMPACT_AFTER) -> list[str]:
+    """
+    Fold the delta files of each key into its base file once there are at
+    least min_deltas of them, keeping point lookups to one sorted file.
+
+    Keys without a base file are left alone: deltas alone only cover the
+    days ingested since, so they need a build_lookup() first.
+
+    Returns:
+        Keys that were compacted
+    """
+    compacted = []
+    for key in LOOKUP_KEYS:
+        key_dir = lookup_dir(parquet_path) / key
+        base = key_dir / BASE_FILE_NAME
+        deltas = sorted(key_dir.glob('delta-*.parquet'))
+        if not base.exists() or not deltas or len(deltas) < min_deltas:
+            continue
+
+        _fold([base] + deltas, base)
+        for path in deltas:
+            path.unlink(missing_ok=True)
+        compacted.append(key)
+
+    return compacted
+
+
+def locate(parquet_path: Path, key: str, values) -> dict | None:
+    """
+    Partitions holding any of the given key values.
+
+    Returns:
+        Dict of tx_type -> sorted year_month values (None for the Hive default
+        partition), or None when the index has not been built, in which case
+        callers fall back to scanning whole types.
+    """
+    key_dir = lookup_dir(parquet_path) / key
+    if not (key_dir / BASE_FILE_NAME).exists():
+        return None
+
+    files = [key_dir / BASE_FILE_NAME] + sorted(key_dir.glob('delta-*.parquet'))
+    values = pl.Series('key', list(values), strict=False).cast(_key_dtype(key), strict=False)
+    df = (
+        pl.scan_parquet(files)
+        .filter(pl.col('key').is_in(values.implode()))
+        .select('tx_type', PARTITION_COL)
+        .unique()
+        .collect()
+    )
+
+    locations = {}
+    for (tx_type,), group in df.group_by('tx_type'):
+        locations[tx_type] = group[PARTITION_COL].sort(nulls_last=True).to_list()
+    return locations
+
+
+def partition_files(dataset_path: Path, months) -> list[str]:
+    """
+    Data files of the given year_month partitions of a dataset (None is the
+    Hive default partition); partitions that do not exist are skipped.
+    """
+    files = []
+    for year_month in months:
+        files.extend(str(f) for f in sorted(partition_path(dataset_path, PARTITION_COL, year_month).glob('*.parquet')))
+    return files
+
+
+def transaction_source(parquet_path: Path, tx_type: str, locations: dict | None = None) -> str | None:
+    """
+    DuckDB read_parquet() expression over one transaction type, for use in FROM.
+
+    With locations from locate() only the partitions holding the user are
+    read; without (no index) the whole type is. Returns None when there is
+    nothing to read.
+    """
+    dataset_path = parquet_path / tx_type
+    if locations is None:
+        if not dataset_path.exists():
+            return None
+        return f"read_parquet('{dataset_path / '**' / '*.parquet'}', hive_partitioning=true)"
+
+    files = partition_files(dataset_path, locations.get(tx_type, []))
+    if not files:
+        return None
+    file_list = ', '.join(f"'{f}'" for f in files)
+    return f"read_parquet([{file_list}], hive_partitioning=true)"
@@ -0,0 +1,361 @@
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+import json
+import os
+import shutil
+import tempfile
+
+HIVE_NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+PARTITION_FILE_NAME = 'part-0.parquet'
+TXN_DIR_NAME = '_txn'
+COMMIT_MARKER = 'COMMIT'
+
+# Physical layout of partition files. Row groups match DuckDB's own row group
+# size, so each one is a single scan unit there, and are small enough that
+# min/max statistics on the sort columns prune most of a month for day- or
+# id-bounded reads. The page index adds per-page statistics on top.
+ROW_GROUP_SIZE = 122_880
+WRITE_PAGE_INDEX = True
+
+
+def partition_path(dataset_path: Path, partition_col: str, value) -> Path:
+    """
+    Directory of a single Hive partition.
+
+    Null partition values map to the Hive default partition, matching what
+    pq.write_to_dataset produces for rows with a null partition key.
+    """
+    label = HIVE_NULL_PARTITION if value is None else str(value)
+    return dataset_path / f"{partition_col}={label}"
+
+
+def read_partition(part_dir: Path) -> pl.DataFrame:
+    """
+    Read every Parquet file of one partition directory.
+
+    The partition column itself is not stored inside the files, so it is not
+    part of the returned frame.
+    """
+    files = sorted(part_dir.glob('*.parquet'))
+    if not files:
+        return pl.DataFrame()
+
+    return pl.read_parquet(files, hive_partitioning=False)
+
+
+def dataset_row_count(dataset_path: Path) -> int:
+    """
+    Total row count of a dataset, read from the Parquet footers only.
+    """
+    return sum(pq.read_metadata(f).num_rows for f in dataset_path.rglob('*.parquet'))
+
+
+def write_atomic_parquet(df: pl.DataFrame, path: Path) -> None:
+    """
+    Write DataFrame to Parquet atomically (temp + rename).
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    
+    fd, tmp_path = tempfile.mkstemp(suffix='.parquet', dir=path.parent)
+    os.close(fd)
+    
+    try:
+        df.write_parquet(tmp_path, compression='snappy')
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def write_partition_file(
+    df: pl.DataFrame,
+    part_dir: Path,
+    schema: pa.Schema | None = None,
+    sort_by: list[str] | None = None
+) -> None:
+    """
+    Write df as the single data file of a (new, empty) partition directory.
+
+    If schema is given (see schema_utils.arrow_schema) the table is cast to it,
+    so every file of a dataset carries the same physical types. If sort_by is
+    given (see schema_utils.sort_columns) rows are sorted on it, nulls last,
+    and the order is recorded in the file's sorting_columns metadata.
+    """
+    part_dir.mkdir(parents=True, exist_ok=True)
+    if sort_by:
+        df = df.sort(sort_by, nulls_last=True, maintain_order=True)
+
+    table = df.to_arrow()
+    if schema is not None:
+        table = table.select(schema.names).cast(schema)
+
+    sorting_columns = None
+    if sort_by:
+        sorting_columns = [
+            pq.SortingColumn(table.schema.get_field_index(col), nulls_first=False)
+            for col in sort_by
+        ]
+
+    pq.write_table(
+        table,
+        str(part_dir / PARTITION_FILE_NAME),
+        compression='snappy',
+        row_group_size=ROW_GROUP_SIZE,
+        write_page_index=WRITE_PAGE_INDEX,
+        sorting_columns=sorting_columns
+    )
+
+
+def journal_root(dataset_path: Path) -> Path:
+    """
+    Directory holding in-flight transactions for a dataset.
+
+    It lives next to the dataset (e.g. transactions/_txn/act) rather than
+    inside it, so '**/*.parquet' scans of the dataset never see staged files.
+    """
+    return dataset_path.parent / TXN_DIR_NAME / dataset_path.name
+
+
+class PartitionTransaction:
+    """
+    Staged-write-then-rename commit of one or more partitions of a dataset.
+
+    Protocol:
+        1. stage(): every new partition is fully written under
+           _txn/<dataset>/<txn>/staged/, the live dataset is not touched.
+        2. commit(): the staged files and directories are fsynced, then a
+           COMMIT marker listing the partitions is written atomically
+           (temp + fsync + os.replace, then fsync of the transaction
+           directory). This is the commit point.
+        3. Each live partition directory is renamed into the transaction's
+           backup/ folder and the staged directory renamed into its place.
+        4. The transaction directory (staging + backups) is deleted.
+
+    A crash before the marker exists leaves the live dataset untouched and
+    recover_pending_commits() discards the staging area (rollback). A crash
+    after it is rolled forward by replaying step 3, which is idempotent.
+    Because the staged data is on disk before the marker, this holds for OS
+    crashes and power loss too, not only for a crashed process.
+
+    Usage:
+        with PartitionTransaction(dataset_path) as txn:
+            txn.stage('2025-11', df)
+    """
+
+    def __init__(
+        self,
+        dataset_path: Path,
+        partition_col: str = 'year_month',
+        replace_all: bool = False,
+        schema: pa.Schema | None = None,
+        sort_by: list[str] | None = None
+    ):
+        """
+        Args:
+            dataset_path: Root of the Hive-partitioned dataset
+            partition_col: Hive partition column
+            replace_all: Also drop live partitions that were not staged
+                         (full rewrite of the dataset)
+            schema: Arrow schema every staged file is cast to
+            sort_by: Columns every staged file is sorted on
+        """
+        self.dataset_path = dataset_path
+        self.partition_col = partition_col
+        self.replace_all = replace_all
+        self.schema = schema
+        self.sort_by = sort_by
+        self.staged = []
+
+        root = journal_root(dataset_path)
+        root.mkdir(parents=True, exist_ok=True)
+        self.txn_dir = Path(tempfile.mkdtemp(prefix='txn-', dir=root))
+
+    def stage(self, value, df: pl.DataFrame) -> None:
+        """
+        Write the complete new contents of one partition to the staging area.
+        """
+        name = partition_path(self.dataset_path, self.partition_col, value).name
+        write_partition_file(df, self.txn_dir / 'staged' / name, self.schema, self.sort_by)
+        self.staged.append(name)
+
+    def commit(self) -> None:
+        """
+        Publish all staged partitions.
+        """
+        removed = []
+        if self.replace_all and self.dataset_path.exists():
+            removed = sorted(
+                d.name for d in self.dataset_path.glob(f'{self.partition_col}=*')
+                if d.is_dir() and d.name not in self.staged
+            )
+
+        manifest = {
+            'dataset': str(self.dataset_path),
+            'swap': self.staged,
+            'remove': removed
+        }
+
+        # The marker must never reach the disk before the data it publishes
+        staged_dir = self.txn_dir / 'staged'
+        for name in self.staged:
+            for f in (staged_dir / name).iterdir():
+                _fsync(f)
+            _fsync(staged_dir / name)
+        if self.staged:
+            _fsync(staged_dir)
+
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.txn_dir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.txn_dir / COMMIT_MARKER)
+        _fsync(self.txn_dir)
+
+        _apply_commit(self.txn_dir, self.dataset_path, manifest)
+        shutil.rmtree(self.txn_dir)
+
+    def abort(self) -> None:
+        """
+        Discard all staged partitions.
+        """
+        shutil.rmtree(self.txn_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+
+def _fsync(path: Path) -> None:
+    """
+    Flush a file, or the entries of a directory, to disk.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _apply_commit(txn_dir: Path, dataset_path: Path, manifest: dict) -> None:
+    """
+    Swap staged partitions into the live dataset. Safe to re-run after a crash.
+    """
+    backup_dir = txn_dir / 'backup'
+    backup_dir.mkdir(exist_ok=True)
+    dataset_path.mkdir(parents=True, exist_ok=True)
+
+    for name in manifest['swap']:
+        live = dataset_path / name
+        staged = txn_dir / 'staged' / name
+
+        if not staged.exists():
+            continue
+
+        if live.exists():
+            os.replace(live, backup_dir / name)
+        os.replace(staged, live)
+
+    for name in manifest['remove']:
+        live = dataset_path / name
+        if live.exists():
+            os.replace(live, backup_dir / name)
+
+
+def recover_pending_commits(dataset_path: Path) -> list[tuple[str, str]]:
+    """
+    Complete or roll back transactions left behind by a crashed writer.
+
+    Should be called before reading or writing the dataset.
+
+    Returns:
+        List of (transaction name, 'rolled forward' | 'rolled back')
+    """
+    root = journal_root(dataset_path)
+    if not root.exists():
+        return []
+
+    recovered = []
+    for txn_dir in sorted(d for d in root.iterdir() if d.is_dir()):
+        marker = txn_dir / COMMIT_MARKER
+        if marker.exists():
+            manifest = json.loads(marker.read_text())
+            _apply_commit(txn_dir, dataset_path, manifest)
+            recovered.append((txn_dir.name, 'rolled forward'))
+        else:
+            recovered.append((txn_dir.name, 'rolled back'))
+        shutil.rmtree(txn_dir)
+
+    return recovered
+
+
+def upsert_partitions(
+    df_new: pl.DataFrame,
+    dataset_path: Path,
+    unique_cols: list[str],
+    partition_col: str = 'year_month',
+    schema: pa.Schema | None = None,
+    sort_by: list[str] | None = None
+) -> dict:
+    """
+    Merge new rows into only the partitions they touch.
+
+    Each touched partition is read, combined with its share of df_new,
+    deduplicated on unique_cols (new rows win) and rewritten. Partitions not
+    hit by df_new are left untouched. Because the partition value is derived
+    from the date column that is part of the dedup key, a key can only live in
+    one partition, so this is equivalent to deduplicating the whole dataset.
+
+    All touched partitions are published together in one PartitionTransaction.
+
+    Args:
+        df_new: New rows, including the partition column
+        dataset_path: Root of the Hive-partitioned dataset (e.g. transactions/act)
+        unique_cols: Deduplication key
+        partition_col: Hive partition column
+        schema: Arrow schema the rewritten partitions are cast to
+        sort_by: Columns the rewritten partitions are sorted on
+
+    Returns:
+        Dict with 'partitions' (list of touched partition values),
+        'existing_rows', 'new_rows', 'duplicates' and 'written_rows'
+    """
+    stats = {
+        'partitions': [],
+        'existing_rows': 0,
+        'new_rows': len(df_new),
+        'duplicates': 0,
+        'written_rows': 0
+    }
+
+    with PartitionTransaction(dataset_path, partition_col, schema=schema, sort_by=sort_by) as txn:
+        for (value,), df_part in df_new.group_by(partition_col, maintain_order=True):
+            part_dir = partition_path(dataset_path, partition_col, value)
+            df_part = df_part.drop(partition_col)
+
+            df_existing = read_partition(part_dir)
+            if not df_existing.is_empty():
+                df_existing = df_existing.select(df_part.columns).cast(df_part.schema)
+                stats['existing_rows'] += len(df_existing)
+                df_combined = pl.concat([df_existing, df_part], how='vertical_relaxed')
+            else:
+                df_combined = df_part
+
+            original_count = len(df_combined)
+            df_combined = df_combined.unique(subset=unique_cols, keep='last', maintain_order=True)
+            stats['duplicates'] += original_count - len(df_combined)
+            stats['written_rows'] += len(df_combined)
+
+            txn.stage(value, df_combined)
+            stats['partitions'].append(value)
+
+    return stats
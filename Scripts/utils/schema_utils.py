@@ -0,0 +1,212 @@
+import polars as pl
+import pyarrow as pa
+
+# Hive partition column of every transaction dataset
+PARTITION_COL = 'year_month'
+
+# Store-wide switch for the compact on-disk encoding (dictionary-encoded
+# low-cardinality strings, Int32 cpc). Files written with and without it
+# differ in physical types, so flip it together with a full rebuild
+# (00_convert_historical.py) rather than mid-history.
+COMPACT_STORAGE = False
+
+# Low-cardinality string columns stored dictionary-encoded in compact mode
+DICTIONARY_COLS = [
+    'channel_act',
+    'channel_dct',
+    'camp_name',
+    'campana_medium',
+    'mode',
+    'instant_rfnd'
+]
+
+# Integer columns narrowed in compact mode
+COMPACT_INT_COLS = {
+    'cpc': pl.Int32
+}
+
+_SUBSCRIPTION_KEY = ['subscription_id', 'trans_date', 'trans_type_id']
+
+_SUBSCRIPTION_SCHEMA = {
+    'tmuserid': pl.Utf8,
+    'msisdn': pl.Utf8,
+    'cpc': pl.Int64,
+    'trans_type_id': pl.Int64,
+    'channel_id': pl.Int64,
+    'channel_act': pl.Utf8,
+    'trans_date': pl.Utf8,
+    'act_date': pl.Utf8,
+    'reno_date': pl.Utf8,
+    'camp_name': pl.Utf8,
+    'tef_prov': pl.Int64,
+    'campana_medium': pl.Utf8,
+    'campana_id': pl.Utf8,
+    'subscription_id': pl.Int64,
+    'rev': pl.Float64
+}
+
+# Transaction type registry: source file pattern, CSV schema (dates as raw
+# strings), primary date column (drives year_month), subscription id column
+# and deduplication key
+TRANSACTION_TYPES = {
+    'act': {
+        'file_pattern': 'act_atlas',
+        'schema': dict(_SUBSCRIPTION_SCHEMA),
+        'date_col': 'trans_date',
+        'id_col': 'subscription_id',
+        'unique_cols': _SUBSCRIPTION_KEY
+    },
+    'reno': {
+        'file_pattern': 'reno_atlas',
+        'schema': dict(_SUBSCRIPTION_SCHEMA),
+        'date_col': 'trans_date',
+        'id_col': 'subscription_id',
+        'unique_cols': _SUBSCRIPTION_KEY
+    },
+    'dct': {
+        'file_pattern': 'dct_atlas',
+        'schema': {
+            'tmuserid': pl.Utf8,
+            'msisdn': pl.Utf8,
+            'cpc': pl.Int64,
+            'trans_type_id': pl.Int64,
+            'channel_dct': pl.Utf8,
+            'trans_date': pl.Utf8,
+            'act_date': pl.Utf8,
+            'reno_date': pl.Utf8,
+            'camp_name': pl.Utf8,
+            'tef_prov': pl.Int64,
+            'campana_medium': pl.Utf8,
+            'campana_id': pl.Utf8,
+            'subscription_id': pl.Int64
+        },
+        'date_col': 'trans_date',
+        'id_col': 'subscription_id',
+        'unique_cols': _SUBSCRIPTION_KEY
+    },
+    'cnr': {
+        'file_pattern': 'cnr_atlas',
+        'schema': {
+            'cancel_date': pl.Utf8,
+            'sbn_id': pl.Int64,
+            'tmuserid': pl.Utf8,
+            'cpc': pl.Int64,
+            'mode': pl.Utf8
+        },
+        'date_col': 'cancel_date',
+        'id_col': 'sbn_id',
+        'unique_cols': ['sbn_id', 'cancel_date']
+    },
+    'rfnd': {
+        'file_pattern': 'rfnd_atlas',
+        'schema': {
+            'tmuserid': pl.Utf8,
+            'cpc': pl.Int64,
+            'refnd_date': pl.Utf8,
+            'rfnd_amount': pl.Float64,
+            'rfnd_cnt': pl.Int64,
+            'sbnid': pl.Int64,
+            'instant_rfnd': pl.Utf8
+        },
+        'date_col': 'refnd_date',
+        'id_col': 'sbnid',
+        'unique_cols': ['sbnid', 'refnd_date']
+    },
+    'ppd': {
+        'file_pattern': 'ppd_atlas',
+        'schema': {
+            'tmuserid': pl.Utf8,
+            'msisdn': pl.Utf8,
+            'cpc': pl.Int64,
+            'trans_type_id': pl.Int64,
+            'channel_id': pl.Int64,
+            'trans_date': pl.Utf8,
+            'act_date': pl.Utf8,
+            'reno_date': pl.Utf8,
+            'camp_name': pl.Utf8,
+            'tef_prov': pl.Int64,
+            'campana_medium': pl.Utf8,
+            'campana_id': pl.Utf8,
+            'subscription_id': pl.Int64,
+            'rev': pl.Float64
+        },
+        'date_col': 'trans_date',
+        'id_col': 'subscription_id',
+        'unique_cols': _SUBSCRIPTION_KEY
+    }
+}
+
+# Convenience views used by the pipeline scripts
+FILE_TYPES = {key: spec['file_pattern'] for key, spec in TRANSACTION_TYPES.items()}
+SCHEMAS = {key: spec['schema'] for key, spec in TRANSACTION_TYPES.items()}
+DATE_COLS = {key: spec['date_col'] for key, spec in TRANSACTION_TYPES.items()}
+UNIQUE_COLS = {key: spec['unique_cols'] for key, spec in TRANSACTION_TYPES.items()}
+ID_COLS = {key: spec['id_col'] for key, spec in TRANSACTION_TYPES.items()}
+
+_ARROW_TYPES = {
+    pl.Utf8: pa.string(),
+    pl.Int64: pa.int64(),
+    pl.Int32: pa.int32(),
+    pl.Float64: pa.float64()
+}
+
+
+def date_columns(tx_type: str) -> list[str]:
+    """
+    Columns of a transaction type that are parsed from string to Datetime.
+    """
+    return [col for col in SCHEMAS[tx_type] if 'date' in col.lower()]
+
+
+def storage_schema(tx_type: str, compact: bool = COMPACT_STORAGE) -> dict:
+    """
+    Polars schema of a transaction type as stored in Parquet (dates parsed,
+    without the partition column).
+    """
+    schema = {}
+    for col, dtype in SCHEMAS[tx_type].items():
+        if 'date' in col.lower():
+            dtype = pl.Datetime('us')
+        elif compact and col in DICTIONARY_COLS:
+            dtype = pl.Categorical
+        elif compact and col in COMPACT_INT_COLS:
+            dtype = COMPACT_INT_COLS[col]
+        schema[col] = dtype
+    return schema
+
+
+def arrow_schema(tx_type: str, compact: bool = COMPACT_STORAGE) -> pa.Schema:
+    """
+    Arrow schema written to the Parquet files of a transaction type.
+
+    In compact mode low-cardinality strings are dictionary-encoded and cpc is
+    narrowed to Int32; otherwise the types match what Polars produces from the
+    CSV schema.
+    """
+    fields = []
+    for col, dtype in storage_schema(tx_type, compact).items():
+        if dtype == pl.Categorical:
+            arrow_type = pa.dictionary(pa.int32(), pa.string())
+        elif isinstance(dtype, pl.Datetime):
+            arrow_type = pa.timestamp('us')
+        else:
+            arrow_type = _ARROW_TYPES[dtype]
+        fields.append(pa.field(col, arrow_type))
+    return pa.schema(fields)
+
+
+def partition_expr(tx_type: str) -> pl.Expr:
+    """
+    year_month partition value derived from the primary date column.
+    """
+    return pl.col(DATE_COLS[tx_type]).dt.strftime('%Y-%m').alias(PARTITION_COL)
+
+
+def sort_columns(tx_type: str) -> list[str]:
+    """
+    Row order of a transaction type inside each partition file: primary date
+    first, then the rest of the deduplication key (subscription_id, sbn_id,
+    sbnid), so row group min/max statistics are tight on both.
+    """
+    date_col = DATE_COLS[tx_type]
+    return [date_col] + [col for col in UNIQUE_COLS[tx_type] if col != date_col]
@@ -0,0 +1,296 @@
+import duckdb
+import polars as pl
+from pathlib import Path
+from collections import OrderedDict
+
+from utils.parquet_utils import HIVE_NULL_PARTITION, partition_path
+from utils.lookup_utils import locate
+
+# Subscription view output: Parquet_Data/aggregated/subscriptions/
+#   activation_month=YYYY-MM/part-0.parquet, rows sorted by subscription_id
+SUBSCRIPTIONS_DIR_NAME = 'subscriptions'
+LEGACY_FILE_NAME = 'subscriptions.parquet'
+VIEW_PARTITION_COL = 'activation_month'
+
+
+def subscriptions_path(project_root: Path) -> Path:
+    """
+    Location of the partitioned subscription view dataset.
+    """
+    return project_root / 'Parquet_Data' / 'aggregated' / SUBSCRIPTIONS_DIR_NAME
+
+
+def _resolve(path: Path) -> Path | None:
+    """
+    The dataset directory, or the single-file output written before the view
+    was partitioned, whichever exists.
+    """
+    if path.is_dir() and any(path.glob('*/*.parquet')):
+        return path
+    legacy = path.parent / LEGACY_FILE_NAME
+    if legacy.exists():
+        return legacy
+    return None
+
+
+def subscriptions_exist(path: Path) -> bool:
+    return _resolve(path) is not None
+
+
+def scan_subscriptions(path: Path) -> pl.LazyFrame:
+    """
+    Lazy scan of the subscription view. Filters on activation_month only read
+    the matching partitions.
+    """
+    source = _resolve(path)
+    if source is None:
+        raise FileNotFoundError(f"Subscription view not found at: {path}")
+    if source.is_file():
+        return pl.scan_parquet(source)
+
+    return pl.scan_parquet(
+        str(source / '**/*.parquet'),
+        hive_partitioning=True,
+        hive_schema={VIEW_PARTITION_COL: pl.Utf8}
+    )
+
+
+def duckdb_source(path: Path, months=None) -> str:
+    """
+    DuckDB table expression for the subscription view, for use in FROM.
+
+    Polars reads the Hive default partition back as null, DuckDB as its
+    literal name, so it is mapped to NULL here.
+
+    If months is given, only those activation_month partitions (None for
+    the default one) are read; the legacy single file is always read whole.
+    """
+    source = _resolve(path)
+    if source is None:
+        raise FileNotFoundError(f"Subscription view not found at: {path}")
+    if source.is_file():
+        return f"read_parquet('{source}')"
+
+    files = f"'{source}/**/*.parquet'"
+    if months is not None:
+        selected = [
+            f"'{f}'"
+            for month in months
+            for f in sorted(partition_path(source, VIEW_PARTITION_COL, month).glob('*.parquet'))
+        ]
+        if not selected:
+            return f"(SELECT * FROM {duckdb_source(path)} LIMIT 0)"
+        files = f"[{', '.join(selected)}]"
+
+    return (
+        f"(SELECT * REPLACE (NULLIF({VIEW_PARTITION_COL}, '{HIVE_NULL_PARTITION}') AS {VIEW_PARTITION_COL}) "
+        f"FROM read_parquet({files}, hive_partitioning=true, "
+        f"hive_types={{'{VIEW_PARTITION_COL}': VARCHAR}}))"
+    )
+
+
+def subscriptions_size_mb(path: Path) -> float:
+    """
+    On-disk size of the subscription view.
+    """
+    source = _resolve(path)
+    if source is None:
+        return 0.0
+    files = [source] if source.is_file() else source.rglob('*.parquet')
+    return sum(f.stat().st_size for f in files) / (1024 * 1024)
+
+
+# Keys the subscription view can be queried by
+QUERY_FIELDS = ('subscription_id', 'tmuserid', 'msisdn')
+
+# Statements run for every lookup; {field} is one of QUERY_FIELDS and the key
+# value is bound as a parameter
+_LOOKUP_QUERIES = {
+    'subscriptions': """
+        SELECT *
+        FROM subscriptions
+        WHERE {field} = $value
+        ORDER BY activation_date DESC
+    """,
+    'summary': """
+        SELECT
+            COUNT(*) as total_subscriptions,
+            COUNT(DISTINCT subscription_id) as unique_subscriptions,
+            COUNT(DISTINCT tmuserid) as unique_users,
+            COUNT(DISTINCT msisdn) as unique_msisdns,
+            SUM(renewal_count) as total_renewals,
+            ROUND(SUM(total_revenue), 2) as total_revenue,
+            ROUND(AVG(total_revenue), 2) as avg_revenue_per_sub,
+            ROUND(MIN(total_revenue), 2) as min_revenue,
+            ROUND(MAX(total_revenue), 2) as max_revenue,
+            ROUND(SUM(total_refunded), 2) as total_refunded,
+            SUM(refund_count) as total_refunds,
+            MIN(activation_date) as first_subscription,
+            MAX(activation_date) as last_subscription,
+            SUM(CASE WHEN subscription_status = 'Active' THEN 1 ELSE 0 END) as active_subs,
+            SUM(CASE WHEN subscription_status = 'Deactivated' THEN 1 ELSE 0 END) as deactivated_subs,
+            SUM(CASE WHEN subscription_status = 'Cancelled' THEN 1 ELSE 0 END) as cancelled_subs,
+            SUM(CASE WHEN has_upgraded = TRUE THEN 1 ELSE 0 END) as upgraded_subs,
+            SUM(CASE WHEN missing_act_record = TRUE THEN 1 ELSE 0 END) as missing_act_records,
+            ROUND(AVG(lifetime_days), 0) as avg_lifetime_days,
+            COUNT(DISTINCT first_cpc) as unique_cpcs
+        FROM subscriptions
+        WHERE {field} = $value
+    """,
+    'cpc_breakdown': """
+        SELECT
+            first_cpc,
+            COUNT(*) as subscription_count,
+            SUM(renewal_count) as total_renewals,
+            ROUND(SUM(total_revenue), 2) as total_revenue,
+            ROUND(AVG(total_revenue), 2) as avg_revenue,
+            MIN(activation_date) as first_activation,
+            MAX(activation_date) as last_activation
+        FROM subscriptions
+        WHERE {field} = $value
+        GROUP BY first_cpc
+        ORDER BY subscription_count DESC
+    """,
+    'status_breakdown': """
+        SELECT
+            subscription_status,
+            COUNT(*) as count,
+            ROUND(AVG(lifetime_days), 0) as avg_lifetime_days,
+            ROUND(SUM(total_revenue), 2) as total_revenue,
+            ROUND(AVG(total_revenue), 2) as avg_revenue
+        FROM subscriptions
+        WHERE {field} = $value
+        GROUP BY subscription_status
+        ORDER BY count DESC
+    """,
+    'timeline': """
+        SELECT
+            subscription_id,
+            tmuserid,
+            msisdn,
+            first_cpc,
+            activation_date,
+            last_activity_date,
+            end_date,
+            subscription_status,
+            lifetime_days,
+            renewal_count,
+            ROUND(total_revenue, 2) as total_revenue
+        FROM subscriptions
+        WHERE {field} = $value
+        ORDER BY activation_date
+    """
+}
+
+
+class SubscriptionQuerySession:
+    """
+    Long-lived DuckDB session for key lookups on the subscription view
+    (check_users.py), also usable on its own:
+
+        with SubscriptionQuerySession(view_path, parquet_path) as session:
+            results = session.query('msisdn', '34600000000')
+            results['subscriptions'], results['summary'], ...
+
+    The view is pulled into an in-memory table once, a partition at a time:
+    with the transaction lookup index (parquet_path given) a lookup only
+    loads the activation_month partitions its key can be in and has not
+    loaded yet; without it the whole view is loaded on the first lookup.
+    With db_path the subscriptions table of a 04_build_subscription_view.py
+    --db-path database is queried in place, read-only.
+
+    Lookups run the same parameterized statements, and the results of the
+    last cache_size keys are kept.
+    """
+
+    def __init__(
+        self,
+        view_path: Path,
+        parquet_path: Path | None = None,
+        db_path: Path | None = None,
+        cache_size: int = 64
+    ):
+        self.view_path = view_path
+        self.parquet_path = parquet_path
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._loaded_months = set()
+
+        if db_path is not None:
+            self.con = duckdb.connect(str(db_path), read_only=True)
+            self._all_loaded = True
+        else:
+            self.con = duckdb.connect()
+            self.con.execute(f"CREATE TABLE subscriptions AS SELECT * FROM {duckdb_source(view_path)} LIMIT 0")
+            self._all_loaded = False
+
+    def _load(self, field: str, value) -> None:
+        """
+        Make sure every view row that can match field = value is in memory.
+        """
+        if self._all_loaded:
+            return
+
+        locations = None
+        if self.parquet_path is not None and not _resolve(self.view_path).is_file():
+            locations = locate(self.parquet_path, field, [value])
+
+        if locations is None:
+            self.con.execute("DELETE FROM subscriptions")
+            self.con.execute(f"INSERT INTO subscriptions BY NAME SELECT * FROM {duckdb_source(self.view_path)}")
+            self._all_loaded = True
+            return
+
+        # activation_month is the year_month of a subscription's first
+        # ACT/RENO row, so it is one of the ACT/RENO partitions of the key
+        months = (set(locations.get('act', [])) | set(locations.get('reno', []))) - self._loaded_months
+        if months:
+            self.con.execute(
+                f"INSERT INTO subscriptions BY NAME SELECT * FROM {duckdb_source(self.view_path, months=months)}"
+            )
+            self._loaded_months |= months
+
+    def query(self, field: str, value) -> dict:
+        """
+        Subscriptions matching field = value and their summaries.
+
+        Returns:
+            Dict of Polars frames: 'subscriptions', 'summary', 'cpc_breakdown',
+            'status_breakdown' and 'timeline'
+
+        Raises:
+            ValueError: for an unknown field or a non-numeric subscription_id
+        """
+        if field not in QUERY_FIELDS:
+            raise ValueError(f"Unknown query field: {field}")
+        value = int(value) if field == 'subscription_id' else str(value)
+
+        key = (field, value)
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        self.misses += 1
+        self._load(field, value)
+        results = {
+            name: self.con.execute(sql.format(field=field), {'value': value}).pl()
+            for name, sql in _LOOKUP_QUERIES.items()
+        }
+
+        self._cache[key] = results
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return results
+
+    def close(self) -> None:
+        self.con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
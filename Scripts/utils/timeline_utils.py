@@ -0,0 +1,203 @@
+import duckdb
+import polars as pl
+from pathlib import Path
+
+from utils.lookup_utils import locate, transaction_source
+from utils.schema_utils import ID_COLS
+
+# Per-type projection onto the combined timeline columns, as used by
+# query_msisdn_from_tx.py / query_tmuserid_from_tx.py. CNR and RFND have no
+# trans_type_id; 99 and 100 only sort them after the subscription types.
+TIMELINE_COLUMNS = {
+    'act': """
+        'ACT' as transaction_type,
+        trans_type_id,
+        subscription_id,
+        trans_date,
+        act_date,
+        reno_date,
+        cpc,
+        channel_act as channel,
+        camp_name,
+        rev,
+        CAST(NULL AS VARCHAR) as mode,
+        CAST(NULL AS DOUBLE) as rfnd_amount,
+        CAST(NULL AS BIGINT) as rfnd_cnt,
+        CAST(NULL AS VARCHAR) as instant_rfnd
+    """,
+    'reno': """
+        'RENO' as transaction_type,
+        trans_type_id,
+        subscription_id,
+        trans_date,
+        act_date,
+        reno_date,
+        cpc,
+        channel_act as channel,
+        camp_name,
+        rev,
+        CAST(NULL AS VARCHAR) as mode,
+        CAST(NULL AS DOUBLE) as rfnd_amount,
+        CAST(NULL AS BIGINT) as rfnd_cnt,
+        CAST(NULL AS VARCHAR) as instant_rfnd
+    """,
+    'dct': """
+        'DCT' as transaction_type,
+        trans_type_id,
+        subscription_id,
+        trans_date,
+        act_date,
+        reno_date,
+        cpc,
+        channel_dct as channel,
+        camp_name,
+        CAST(NULL AS DOUBLE) as rev,
+        CAST(NULL AS VARCHAR) as mode,
+        CAST(NULL AS DOUBLE) as rfnd_amount,
+        CAST(NULL AS BIGINT) as rfnd_cnt,
+        CAST(NULL AS VARCHAR) as instant_rfnd
+    """,
+    'cnr': """
+        'CNR' as transaction_type,
+        99 as trans_type_id,
+        sbn_id as subscription_id,
+        cancel_date as trans_date,
+        CAST(NULL AS TIMESTAMP) as act_date,
+        CAST(NULL AS TIMESTAMP) as reno_date,
+        cpc,
+        mode as channel,
+        CAST(NULL AS VARCHAR) as camp_name,
+        CAST(NULL AS DOUBLE) as rev,
+        mode,
+        CAST(NULL AS DOUBLE) as rfnd_amount,
+        CAST(NULL AS BIGINT) as rfnd_cnt,
+        CAST(NULL AS VARCHAR) as instant_rfnd
+    """,
+    'rfnd': """
+        'RFND' as transaction_type,
+        100 as trans_type_id,
+        sbnid as subscription_id,
+        refnd_date as trans_date,
+        CAST(NULL AS TIMESTAMP) as act_date,
+        CAST(NULL AS TIMESTAMP) as reno_date,
+        cpc,
+        CAST(NULL AS VARCHAR) as channel,
+        CAST(NULL AS VARCHAR) as camp_name,
+        CAST(NULL AS DOUBLE) as rev,
+        CAST(NULL AS VARCHAR) as mode,
+        rfnd_amount,
+        rfnd_cnt,
+        instant_rfnd
+    """,
+    'ppd': """
+        'PPD' as transaction_type,
+        trans_type_id,
+        subscription_id,
+        trans_date,
+        act_date,
+        reno_date,
+        cpc,
+        CAST(channel_id AS VARCHAR) as channel,
+        camp_name,
+        rev,
+        CAST(NULL AS VARCHAR) as mode,
+        CAST(NULL AS DOUBLE) as rfnd_amount,
+        CAST(NULL AS BIGINT) as rfnd_cnt,
+        CAST(NULL AS VARCHAR) as instant_rfnd
+    """
+}
+
+# Types whose rows tie a user key to a subscription
+SUBSCRIPTION_TYPES = ['act', 'reno', 'dct']
+
+
+def read_keys(input_file: Path) -> list[str]:
+    """
+    One identifier per line; blank lines, '#' comments and repeats are dropped.
+    """
+    values = (line.split('#', 1)[0].strip() for line in Path(input_file).read_text().splitlines())
+    return list(dict.fromkeys(value for value in values if value))
+
+
+def batch_timeline(parquet_path: Path, key: str, values: list[str]) -> pl.DataFrame:
+    """
+    Combined transaction timeline of many users, keyed by msisdn or tmuserid.
+
+    The input set is loaded once as a table and joined against each
+    transaction type, so every type is read once for the whole batch
+    (restricted to the partitions the lookup index lists, when it exists)
+    instead of once per user:
+        1. ACT/RENO/DCT rows matching a key give its subscription ids
+        2. every type is joined on those ids (PPD directly on the key)
+
+    Returns:
+        One row per (key, transaction), with the key in a column named after
+        it, sorted by key, subscription_id, trans_date, trans_type_id
+    """
+    con = duckdb.connect()
+    try:
+        con.execute("CREATE TEMP TABLE batch_keys (lookup_key VARCHAR)")
+        con.executemany("INSERT INTO batch_keys VALUES (?)", [[value] for value in values])
+
+        # Step 1: key -> subscription ids
+        locations = locate(parquet_path, key, values)
+        mappings = []
+        for tx_type in SUBSCRIPTION_TYPES:
+            source = transaction_source(parquet_path, tx_type, locations)
+            if source is not None:
+                mappings.append(f"""
+                    SELECT DISTINCT k.lookup_key, t.subscription_id as lookup_subscription_id
+                    FROM {source} t
+                    JOIN batch_keys k ON t.{key} = k.lookup_key
+                """)
+
+        if mappings:
+            con.execute(f"CREATE TEMP TABLE batch_subscriptions AS {' UNION '.join(mappings)}")
+        else:
+            con.execute("CREATE TEMP TABLE batch_subscriptions (lookup_key VARCHAR, lookup_subscription_id BIGINT)")
+
+        # Step 2: one join per type
+        subscription_ids = [
+            row[0] for row in con.execute("SELECT DISTINCT lookup_subscription_id FROM batch_subscriptions").fetchall()
+        ]
+        sub_locations = locate(parquet_path, 'subscription_id', subscription_ids)
+
+        parts = []
+        for tx_type in ['act', 'reno', 'dct', 'cnr', 'rfnd']:
+            source = transaction_source(parquet_path, tx_type, sub_locations)
+            if source is not None and subscription_ids:
+                parts.append(f"""
+                    SELECT m.lookup_key as {key}, {TIMELINE_COLUMNS[tx_type]}
+                    FROM {source} t
+                    JOIN batch_subscriptions m ON t.{ID_COLS[tx_type]} = m.lookup_subscription_id
+                """)
+
+        source = transaction_source(parquet_path, 'ppd', locations)
+        if source is not None:
+            parts.append(f"""
+                SELECT k.lookup_key as {key}, {TIMELINE_COLUMNS['ppd']}
+                FROM {source} t
+                JOIN batch_keys k ON t.{key} = k.lookup_key
+            """)
+
+        if not parts:
+            return pl.DataFrame(schema={key: pl.Utf8})
+
+        return con.execute(f"""
+            {' UNION ALL BY NAME '.join(parts)}
+            ORDER BY {key}, subscription_id, trans_date, trans_type_id
+        """).pl()
+    finally:
+        con.close()
+
+
+def write_timeline(df: pl.DataFrame, output_file: Path) -> None:
+    """
+    Write a batch timeline as Parquet (.parquet) or CSV (anything else).
+    """
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    if output_file.suffix == '.parquet':
+        df.write_parquet(output_file, compression='snappy')
+    else:
+        df.write_csv(output_file)
@@ -0,0 +1,70 @@
+import polars as pl
+from pathlib import Path
+
+from utils.parquet_utils import PartitionTransaction
+
+# User base outputs: User_Base/<name>/year_month=YYYY-MM/part-0.parquet,
+# one dataset per aggregation, rows sorted by its keys. The pipe CSVs of the
+# same name are an export of these for the consumers that still read text.
+USER_BASE_KEYS = {
+    'user_base_by_service': ['date', 'service_name', 'tme_category'],
+    'user_base_by_category': ['date', 'tme_category'],
+    'user_base_by_cpc': ['date', 'cpc'],
+}
+USER_BASE_PARTITION_COL = 'year_month'
+
+
+def user_base_path(user_base_dir: Path, name: str) -> Path:
+    """
+    Dataset directory of one user base output (a USER_BASE_KEYS name).
+    """
+    return user_base_dir / name
+
+
+def user_base_exists(dataset_path: Path) -> bool:
+    return dataset_path.is_dir() and any(dataset_path.glob('*/*.parquet'))
+
+
+def write_user_base(df: pl.DataFrame, dataset_path: Path) -> list[str]:
+    """
+    Replace a user base dataset with df, one partition per month of its date
+    column.
+
+    All months are published by one PartitionTransaction (replacing the whole
+    dataset); callers run recover_pending_commits() on the dataset first, so
+    an interrupted write is completed or rolled back.
+
+    Returns:
+        Months written
+    """
+    parts = (
+        df.with_columns(pl.col('date').dt.strftime('%Y-%m').alias(USER_BASE_PARTITION_COL))
+        .partition_by(USER_BASE_PARTITION_COL, as_dict=True, include_key=False)
+    )
+    with PartitionTransaction(dataset_path, USER_BASE_PARTITION_COL, replace_all=True) as txn:
+        for (year_month,), part in parts.items():
+            txn.stage(year_month, part)
+
+    return sorted(year_month for (year_month,) in parts)
+
+
+def scan_user_base(dataset_path: Path) -> pl.LazyFrame:
+    """
+    Lazy scan of a user base dataset. Filters on year_month only read the
+    matching partitions; date filters are pruned by row group statistics.
+    """
+    if not user_base_exists(dataset_path):
+        raise FileNotFoundError(f"User base output not found at: {dataset_path}")
+
+    return pl.scan_parquet(
+        str(dataset_path / '**/*.parquet'),
+        hive_partitioning=True,
+        hive_schema={USER_BASE_PARTITION_COL: pl.Utf8}
+    )
+
+
+def user_base_size_mb(dataset_path: Path) -> float:
+    """
+    On-disk size of a user base dataset.
+    """
+    return sum(f.stat().st_size for f in dataset_path.rglob('*.parquet')) / (1024 * 1024)
@@ -1,10 +1,20 @@
 #!/usr/bin/env python3
 import pandas as pd
+import polars as pl
 import sys
+from pathlib import Path
+from datetime import date
+
+from utils.user_base_utils import scan_user_base, USER_BASE_PARTITION_COL
 
 MASTERCPC_FILE = "MASTERCPC.csv"
-SERVICE_FILE = "User_Base/user_base_by_service.csv"
-CPC_FILE = "User_Base/user_base_by_cpc.csv"
+SERVICE_DATASET = Path("User_Base/user_base_by_service")
+CPC_DATASET = Path("User_Base/user_base_by_cpc")
+
+def daily_totals(lf, dates):
+    """User_Base summed per date over the given dates (0 where a date has no rows)."""
+    totals = lf.group_by('date').agg(pl.col('User_Base').sum()).collect()
+    return dict.fromkeys(dates, 0) | dict(totals.iter_rows())
 
 def validate_service(service_name, sample_date=None):
     print(f"{'='*60}")
@@ -17,31 +27,36 @@ def validate_service(service_name, sample_date=None):
     print(f"Found {len(service_cpcs)} CPCs for '{service_name}':")
     print(f"  CPCs: {service_cpcs}\n")
     
-    service_df = pd.read_csv(SERVICE_FILE, sep='|')
-    service_df = service_df[service_df['service_name'] == service_name]
-    
-    cpc_df = pd.read_csv(CPC_FILE, sep='|')
-    cpc_df = cpc_df[cpc_df['cpc'].isin(service_cpcs)]
+    service_lf = scan_user_base(SERVICE_DATASET).filter(pl.col('service_name') == service_name)
+    cpc_lf = scan_user_base(CPC_DATASET).filter(pl.col('cpc').is_in(service_cpcs))
     
     if sample_date:
-        service_df = service_df[service_df['date'] == sample_date]
-        cpc_df = cpc_df[cpc_df['date'] == sample_date]
-        dates_to_check = [sample_date]
+        dates_to_check = [date.fromisoformat(sample_date)]
+        # year_month prunes the scans to the one partition holding the date
+        month_filter = pl.col(USER_BASE_PARTITION_COL) == sample_date[:7]
+        service_lf = service_lf.filter(month_filter)
+        cpc_lf = cpc_lf.filter(month_filter)
     else:
-        dates_to_check = service_df['date'].unique()[:10]
+        dates_to_check = service_lf.select(pl.col('date').unique().sort().head(10)).collect()['date'].to_list()
+    
+    date_filter = pl.col('date').is_in(dates_to_check)
+    service_lf = service_lf.filter(date_filter)
+    cpc_lf = cpc_lf.filter(date_filter)
+    service_totals = daily_totals(service_lf, dates_to_check)
+    cpc_totals = daily_totals(cpc_lf, dates_to_check)
     
     print(f"Validating {len(dates_to_check)} dates...\n")
     
     mismatches = []
     matches = 0
     
-    for date in dates_to_check:
-        service_count = service_df[service_df['date'] == date]['User_Base'].sum()
-        cpc_count = cpc_df[cpc_df['date'] == date]['User_Base'].sum()
+    for day in dates_to_check:
+        service_count = service_totals[day]
+        cpc_count = cpc_totals[day]
         
         if service_count != cpc_count:
             mismatches.append({
-                'date': date,
+                'date': str(day),
                 'service_total': service_count,
                 'cpc_sum': cpc_count,
                 'difference': service_count - cpc_count
@@ -68,13 +83,13 @@ def validate_service(service_name, sample_date=None):
     else:
         print(f"✓ ALL DATES MATCH! Service totals equal sum of CPC user bases.")
         
-        sample = service_df.head(3)
+        sample = service_lf.sort('date').head(3).collect()
         print(f"\nSample validation for first 3 dates:")
-        for _, row in sample.iterrows():
-            date = row['date']
+        for row in sample.iter_rows(named=True):
+            day = row['date']
             service_total = row['User_Base']
-            cpc_sum = cpc_df[cpc_df['date'] == date]['User_Base'].sum()
-            print(f"  {date}: Service={service_total}, CPC Sum={cpc_sum} ✓")
+            cpc_sum = cpc_totals[day]
+            print(f"  {day}: Service={service_total}, CPC Sum={cpc_sum} ✓")
         
         return True
 
@@ -6,6 +6,10 @@
 --   - Missing activation records (subscriptions that start with RENO)
 --   - CPC upgrades (when a subscription changes service)
 --   - Multiple CPCs per subscription (tracked as a list)
+--
+-- Reads the views act_source, reno_source, dct_source, cnr_source and
+-- rfnd_source, created by 04_build_subscription_view.py over the Parquet
+-- store (full build) or over the changed subscriptions only (incremental).
 -- ============================================================================
 
 CREATE OR REPLACE TABLE subscriptions AS
@@ -26,7 +30,7 @@ all_transactions AS (
         rev,
         year_month,
         'ACT' as transaction_type
-    FROM read_parquet('{parquet_path}/act/**/*.parquet', hive_partitioning=true)
+    FROM act_source
     
     UNION ALL
     
@@ -44,7 +48,7 @@ all_transactions AS (
         rev,
         year_month,
         'RENO' as transaction_type
-    FROM read_parquet('{parquet_path}/reno/**/*.parquet', hive_partitioning=true)
+    FROM reno_source
 ),
 
 -- Get list of all CPCs per subscription (ordered by first appearance)
@@ -135,7 +139,7 @@ deactivations AS (
         subscription_id,
         trans_date as deactivation_date,
         channel_dct as deactivation_mode
-    FROM read_parquet('{parquet_path}/dct/**/*.parquet', hive_partitioning=true)
+    FROM dct_source
     WHERE channel_dct != 'UPGRADE'  -- Exclude upgrade-related DCT
     QUALIFY ROW_NUMBER() OVER (PARTITION BY subscription_id ORDER BY trans_date DESC) = 1
 ),
@@ -146,7 +150,7 @@ cancellations AS (
         sbn_id as subscription_id,
         cancel_date as cancellation_date,
         mode as cancellation_mode
-    FROM read_parquet('{parquet_path}/cnr/**/*.parquet', hive_partitioning=true)
+    FROM cnr_source
     QUALIFY ROW_NUMBER() OVER (PARTITION BY sbn_id ORDER BY cancel_date DESC) = 1
 ),
 
@@ -157,7 +161,7 @@ refunds AS (
         COUNT(*) as refund_count,
         SUM(rfnd_amount) as total_refunded,
         MAX(refnd_date) as last_refund_date
-    FROM read_parquet('{parquet_path}/rfnd/**/*.parquet', hive_partitioning=true)
+    FROM rfnd_source
     GROUP BY sbnid
 )
 
@@ -0,0 +1,220 @@
+-- ============================================================================
+-- Subscription View Builder (single pass)
+-- ============================================================================
+-- Same output as build_subscription_view.sql, but every ACT/RENO derived
+-- field comes from one GROUP BY subscription_id instead of five
+-- ROW_NUMBER() window sorts, two GROUP BYs and their joins:
+--   - "first/last row by trans_date" -> arg_min / arg_max over a STRUCT, so
+--     all fields come from the same row and NULL fields are kept
+--   - per-type subsets                -> FILTER (WHERE ...)
+--   - CPC list by first appearance    -> ordered list(), first occurrences
+--
+-- ROW_NUMBER() sorts NULL dates last in both directions, while arg_min /
+-- arg_max skip NULL keys, so the keys are coalesced to +/-infinity.
+--
+-- Known difference: the row of a NULL subscription_id gets its real
+-- aggregates here; in build_subscription_view.sql its LEFT JOINs cannot
+-- match a NULL key and leave them empty.
+--
+-- Reads the same act_source, reno_source, dct_source, cnr_source and
+-- rfnd_source views, created by 04_build_subscription_view.py.
+-- ============================================================================
+
+CREATE OR REPLACE TABLE subscriptions AS
+WITH
+all_transactions AS (
+    SELECT
+        subscription_id,
+        tmuserid,
+        msisdn,
+        cpc,
+        trans_type_id,
+        trans_date,
+        COALESCE(trans_date, 'infinity'::TIMESTAMP) as first_key,
+        COALESCE(trans_date, '-infinity'::TIMESTAMP) as last_key,
+        act_date,
+        camp_name,
+        channel_act as channel,
+        rev,
+        year_month,
+        'ACT' as transaction_type
+    FROM act_source
+
+    UNION ALL
+
+    SELECT
+        subscription_id,
+        tmuserid,
+        msisdn,
+        cpc,
+        trans_type_id,
+        trans_date,
+        COALESCE(trans_date, 'infinity'::TIMESTAMP) as first_key,
+        COALESCE(trans_date, '-infinity'::TIMESTAMP) as last_key,
+        act_date,
+        camp_name,
+        channel_act as channel,
+        rev,
+        year_month,
+        'RENO' as transaction_type
+    FROM reno_source
+),
+
+-- One pass over ACT + RENO
+subscription_agg AS (
+    SELECT
+        subscription_id,
+
+        -- First transaction (activation proxy)
+        arg_min({
+            'tmuserid': tmuserid,
+            'msisdn': msisdn,
+            'cpc': cpc,
+            'act_date': act_date,
+            'trans_date': trans_date,
+            'camp_name': camp_name,
+            'channel': channel,
+            'year_month': year_month
+        }, first_key) as ft,
+
+        -- CPCs ordered by first appearance
+        list({'cpc': cpc} ORDER BY trans_date) as cpc_seq,
+        COUNT(DISTINCT cpc) as cpc_count,
+
+        -- Current CPC (last transaction)
+        arg_max({'cpc': cpc}, last_key).cpc as current_cpc,
+
+        -- First actual ACT record
+        COUNT(*) FILTER (WHERE transaction_type = 'ACT') as act_records,
+        arg_min({
+            'trans_date': trans_date,
+            'rev': rev
+        }, first_key) FILTER (WHERE transaction_type = 'ACT') as aa,
+
+        -- Last upgrade
+        arg_max({
+            'cpc': cpc,
+            'trans_date': trans_date,
+            'rev': rev
+        }, last_key) FILTER (WHERE transaction_type = 'ACT' AND trans_type_id = 1) as upg,
+
+        -- Renewals
+        COUNT(*) FILTER (WHERE transaction_type = 'RENO') as total_renewals,
+        SUM(rev) FILTER (WHERE transaction_type = 'RENO') as total_renewal_revenue,
+        MAX(trans_date) FILTER (WHERE transaction_type = 'RENO') as last_renewal_date,
+        MIN(trans_date) FILTER (WHERE transaction_type = 'RENO') as first_renewal_date
+    FROM all_transactions
+    GROUP BY subscription_id
+),
+
+-- Get deactivations (excluding UPGRADE deactivations)
+deactivations AS (
+    SELECT
+        subscription_id,
+        arg_max({
+            'trans_date': trans_date,
+            'channel_dct': channel_dct
+        }, COALESCE(trans_date, '-infinity'::TIMESTAMP)) as d
+    FROM dct_source
+    WHERE channel_dct != 'UPGRADE'  -- Exclude upgrade-related DCT
+    GROUP BY subscription_id
+),
+
+-- Get cancellations
+cancellations AS (
+    SELECT
+        sbn_id as subscription_id,
+        arg_max({
+            'cancel_date': cancel_date,
+            'mode': mode
+        }, COALESCE(cancel_date, '-infinity'::TIMESTAMP)) as c
+    FROM cnr_source
+    GROUP BY sbn_id
+),
+
+-- Get refunds
+refunds AS (
+    SELECT
+        sbnid as subscription_id,
+        COUNT(*) as refund_count,
+        SUM(rfnd_amount) as total_refunded,
+        MAX(refnd_date) as last_refund_date
+    FROM rfnd_source
+    GROUP BY sbnid
+)
+
+-- Final aggregation
+SELECT
+    s.subscription_id,
+    s.ft.tmuserid,
+    s.ft.msisdn,
+
+    -- CPC tracking (as list)
+    list_transform(
+        list_filter(s.cpc_seq, (x, i) -> list_position(s.cpc_seq, x) = i),
+        x -> x.cpc
+    ) as cpc_list,
+    s.cpc_count,
+    s.ft.cpc as first_cpc,
+    s.current_cpc,
+    CASE WHEN s.cpc_count > 1 THEN TRUE ELSE FALSE END as has_upgraded,
+    s.upg.trans_date as upgrade_date,
+    s.upg.cpc as upgraded_to_cpc,
+
+    -- Activation info
+    s.ft.act_date as activation_date,
+    COALESCE(s.aa.trans_date, s.ft.trans_date) as activation_trans_date,
+    CASE WHEN s.act_records = 0 THEN TRUE ELSE FALSE END as missing_act_record,
+    s.ft.camp_name as activation_campaign,
+    s.ft.channel as activation_channel,
+    COALESCE(s.aa.rev, 0) as activation_revenue,
+    s.ft.year_month as activation_month,
+
+    -- Renewal info
+    s.total_renewals as renewal_count,
+    COALESCE(s.total_renewal_revenue, 0) as renewal_revenue,
+    s.last_renewal_date,
+    s.first_renewal_date,
+    COALESCE(s.last_renewal_date, s.ft.act_date) as last_activity_date,
+
+    -- Deactivation info
+    d.d.trans_date as deactivation_date,
+    d.d.channel_dct as deactivation_mode,
+
+    -- Cancellation info
+    c.c.cancel_date as cancellation_date,
+    c.c.mode as cancellation_mode,
+
+    -- Refund info
+    COALESCE(rf.refund_count, 0) as refund_count,
+    COALESCE(rf.total_refunded, 0) as total_refunded,
+    rf.last_refund_date,
+
+    -- Calculated fields
+    COALESCE(s.aa.rev, 0) + COALESCE(s.total_renewal_revenue, 0) as total_revenue,
+    COALESCE(s.aa.rev, 0) + COALESCE(s.total_renewal_revenue, 0) + COALESCE(s.upg.rev, 0) as total_revenue_with_upgrade,
+
+    -- Status determination
+    CASE
+        WHEN c.c.cancel_date IS NOT NULL THEN 'Cancelled'
+        WHEN d.d.trans_date IS NOT NULL THEN 'Deactivated'
+        ELSE 'Active'
+    END as subscription_status,
+
+    -- Lifetime calculation (days)
+    CASE
+        WHEN c.c.cancel_date IS NOT NULL THEN
+            DATE_DIFF('day', s.ft.act_date, c.c.cancel_date)
+        WHEN d.d.trans_date IS NOT NULL THEN
+            DATE_DIFF('day', s.ft.act_date, d.d.trans_date)
+        ELSE
+            DATE_DIFF('day', s.ft.act_date, CURRENT_DATE)
+    END as lifetime_days,
+
+    -- End date (for easier filtering)
+    COALESCE(c.c.cancel_date, d.d.trans_date) as end_date
+
+FROM subscription_agg s
+LEFT JOIN deactivations d ON s.subscription_id = d.subscription_id
+LEFT JOIN cancellations c ON s.subscription_id = c.subscription_id
+LEFT JOIN refunds rf ON s.subscription_id = rf.subscription_id
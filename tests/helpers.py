@@ -0,0 +1,48 @@
+"""
+Helpers for tests that build small transaction stores
+"""
+
+import polars as pl
+
+# act/reno columns written by subscription_rows, in file order
+SUBSCRIPTION_SCHEMA = {
+    'trans_date': pl.Datetime('us'),
+    'subscription_id': pl.Int64,
+    'tmuserid': pl.Utf8,
+    'msisdn': pl.Utf8,
+    'cpc': pl.Int64,
+    'trans_type_id': pl.Int64,
+    'channel_act': pl.Utf8,
+    'rev': pl.Float64,
+    'act_date': pl.Datetime('us'),
+    'reno_date': pl.Datetime('us'),
+    'camp_name': pl.Utf8,
+}
+
+
+def write_partition(parquet_path, tx_type, year_month, df):
+    part_dir = parquet_path / tx_type / f'year_month={year_month}'
+    part_dir.mkdir(parents=True, exist_ok=True)
+    df.write_parquet(part_dir / 'part-0.parquet')
+
+
+def subscription_rows(columns, rows):
+    """
+    act/reno rows from tuples of the given columns. Columns not given are
+    derived from subscription_id and cpc (tmuserid u<id>, msisdn 34<id>,
+    camp_name camp<cpc>, act_date = trans_date) or take fixed defaults.
+    """
+    records = []
+    for row in rows:
+        record = dict(zip(columns, row))
+        record.setdefault('tmuserid', f"u{record['subscription_id']}")
+        record.setdefault('msisdn', f"34{record['subscription_id']}")
+        record.setdefault('cpc', 100)
+        record.setdefault('trans_type_id', 2)
+        record.setdefault('channel_act', 'WEB')
+        record.setdefault('rev', 1.0)
+        record.setdefault('act_date', record['trans_date'])
+        record.setdefault('reno_date', None)
+        record.setdefault('camp_name', f"camp{record['cpc']}")
+        records.append(record)
+    return pl.DataFrame(records, schema=SUBSCRIPTION_SCHEMA)
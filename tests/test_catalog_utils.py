@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the transaction date catalog
+"""
+
+import pytest
+import polars as pl
+from pathlib import Path
+from datetime import date, datetime
+import shutil
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts'))
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts' / 'utils'))
+sys.path.insert(0, str(PROJECT_ROOT / 'tests'))
+
+from catalog_utils import catalog_dir, refresh_catalog, covered_dates, statistics_date_range
+from helpers import write_partition
+
+
+def date_rows(dates):
+    return pl.DataFrame(
+        {'trans_date': dates, 'subscription_id': list(range(len(dates)))},
+        schema={'trans_date': pl.Datetime('us'), 'subscription_id': pl.Int64}
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    write_partition(tmp_path, 'act', '2024-01', date_rows([datetime(2024, 1, 3, 10), datetime(2024, 1, 3, 11), datetime(2024, 1, 9)]))
+    write_partition(tmp_path, 'act', '2024-02', date_rows([datetime(2024, 2, 1)]))
+    write_partition(tmp_path, 'act', '__HIVE_DEFAULT_PARTITION__', date_rows([None]))
+    return tmp_path
+
+
+class TestDateCatalog:
+    def test_coverage_and_statistics_range(self, store):
+        assert refresh_catalog(store, 'act') == {
+            '2024-01': [date(2024, 1, 3), date(2024, 1, 9)],
+            '2024-02': [date(2024, 2, 1)],
+            None: [],
+        }
+        assert len(list(catalog_dir(store, 'act').glob('*.parquet'))) == 3
+        assert statistics_date_range(store, 'act') == (date(2024, 1, 3), date(2024, 2, 1))
+        assert statistics_date_range(store, 'reno') == (None, None)
+
+    def test_rewritten_and_removed_partitions_are_recatalogued(self, store):
+        refresh_catalog(store, 'act')
+
+        write_partition(store, 'act', '2024-02', date_rows([datetime(2024, 2, 1), datetime(2024, 2, 7)]))
+        shutil.rmtree(store / 'act' / 'year_month=2024-01')
+
+        assert covered_dates(store, 'act') == {date(2024, 2, 1), date(2024, 2, 7)}
+        assert not (catalog_dir(store, 'act') / 'year_month=2024-01.parquet').exists()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the changed-subscription journal
+"""
+
+import pytest
+import polars as pl
+from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts'))
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts' / 'utils'))
+
+from change_utils import (
+    record_changed_ids,
+    mark_full_rebuild,
+    pending_changes,
+    load_changed_ids,
+    clear_changes,
+)
+
+
+class TestChangeJournal:
+    def test_ids_are_collected_across_types(self, tmp_path):
+        record_changed_ids(tmp_path, 'act', pl.DataFrame({'subscription_id': [1, 2, 2]}))
+        record_changed_ids(tmp_path, 'cnr', pl.DataFrame({'sbn_id': [2, None]}, schema={'sbn_id': pl.Int64}))
+        record_changed_ids(tmp_path, 'ppd', pl.DataFrame({'subscription_id': [9]}))
+
+        ids = load_changed_ids(pending_changes(tmp_path))
+
+        # ppd does not feed the subscription view; the null id is kept
+        assert sorted(ids['subscription_id'].to_list(), key=lambda v: (v is None, v)) == [1, 2, None]
+
+    def test_clear_keeps_entries_recorded_after_snapshot(self, tmp_path):
+        mark_full_rebuild(tmp_path)
+        record_changed_ids(tmp_path, 'act', pl.DataFrame({'subscription_id': [1]}))
+        changes = pending_changes(tmp_path)
+        assert changes['full_rebuild']
+
+        record_changed_ids(tmp_path, 'reno', pl.DataFrame({'subscription_id': [5]}))
+        clear_changes(tmp_path, changes)
+
+        remaining = pending_changes(tmp_path)
+        assert not remaining['full_rebuild']
+        assert load_changed_ids(remaining)['subscription_id'].to_list() == [5]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
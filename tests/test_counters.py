@@ -20,6 +20,12 @@ from counter_utils import (
     load_counters_cpc,
     write_atomic_parquet,
     write_atomic_csv,
+    write_counters_dates,
+    compact_counters,
+    list_counter_dates,
+    migrate_legacy_counters,
+    scan_transactions,
+    COUNTERS_CPC_SCHEMA,
 )
 
 
@@ -198,6 +204,124 @@ class TestAggregateByService:
         assert unknown_row['act_count'][0] == 5
 
 
+class TestComputeDailyCpcCounts:
+    def write_partition(self, base, tx_type, df):
+        part_dir = base / tx_type / 'year_month=2024-01'
+        part_dir.mkdir(parents=True)
+        df.write_parquet(part_dir / 'part-0.parquet')
+
+    def test_upgrades_and_revenue(self, tmp_path):
+        sys.path.insert(0, str(PROJECT_ROOT / 'Scripts'))
+        from importlib import import_module
+        build_counters = import_module('05_build_counters')
+        compute_daily_cpc_counts = build_counters.compute_daily_cpc_counts
+
+        self.write_partition(tmp_path, 'act', pl.DataFrame({
+            'cpc': [100, 100, 100, 200, 300],
+            'trans_date': [datetime(2024, 1, 1, 9)] * 4 + [datetime(2024, 1, 2, 9)],
+            'rev': [0.0, 3.605, 2.5, 1.0, 9.0],
+            'channel_act': ['WEB', 'SMS', 'UPGRADE', 'UPGRADE', 'WEB'],
+        }))
+        self.write_partition(tmp_path, 'dct', pl.DataFrame({
+            'cpc': [100, 400],
+            'trans_date': [datetime(2024, 1, 1, 10)] * 2,
+            'channel_dct': ['WEB', 'UPGRADE'],
+        }))
+        self.write_partition(tmp_path, 'rfnd', pl.DataFrame({
+            'cpc': [100, 100],
+            'refnd_date': [datetime(2024, 1, 1, 11)] * 2,
+            'rfnd_amount': [1.0, 0.5],
+            'rfnd_cnt': [1, 2],
+        }))
+
+        result = compute_daily_cpc_counts(tmp_path, '2024-01-01')
+
+        # CPC 400 only has an upgrade deactivation, so it is not listed
+        assert result['cpc'].to_list() == [100, 200]
+        cpc_100 = result.row(0, named=True)
+        assert cpc_100['act_count'] == 2
+        assert cpc_100['act_free'] == 1
+        assert cpc_100['act_pay'] == 1
+        assert cpc_100['upg_count'] == 1
+        assert cpc_100['dct_count'] == 1
+        assert cpc_100['rfnd_count'] == 3
+        assert cpc_100['rfnd_amount'] == 1.5
+        assert cpc_100['rev'] == 6.11
+        assert result.row(1, named=True)['upg_count'] == 1
+
+    def test_range_matches_daily_runs(self, tmp_path):
+        sys.path.insert(0, str(PROJECT_ROOT / 'Scripts'))
+        from importlib import import_module
+        build_counters = import_module('05_build_counters')
+
+        self.write_partition(tmp_path, 'reno', pl.DataFrame({
+            'cpc': [100, 200, 100, 100],
+            'trans_date': [datetime(2024, 1, d, 9) for d in (1, 1, 2, 3)],
+            'rev': [1.0, 2.0, 3.0, 4.0],
+            'channel_act': ['WEB'] * 4,
+        }))
+        dates = ['2024-01-01', '2024-01-02', '2024-01-03']
+
+        range_result = build_counters.compute_cpc_counts(tmp_path, dates)
+        daily_results = pl.concat([
+            build_counters.compute_daily_cpc_counts(tmp_path, d) for d in dates
+        ])
+
+        assert range_result.equals(daily_results)
+
+    def test_no_transactions_returns_empty_schema(self, tmp_path):
+        sys.path.insert(0, str(PROJECT_ROOT / 'Scripts'))
+        from importlib import import_module
+        build_counters = import_module('05_build_counters')
+
+        result = build_counters.compute_daily_cpc_counts(tmp_path, '2024-01-01')
+
+        assert result.is_empty()
+        assert 'upg_dct_count' in result.columns
+
+
+class TestRoundCents:
+    def test_matches_builtin_round(self):
+        from importlib import import_module
+        build_counters = import_module('05_build_counters')
+
+        values = [3.605 + 2.5, 2.675, 1.005, 0.125, -0.125, 16242.387, 89884.537, 0.0, None]
+        result = pl.DataFrame({'v': values}, schema={'v': pl.Float64}).select(
+            build_counters._round_cents(pl.col('v'))
+        )['v'].to_list()
+
+        assert result[0] == 6.11
+        assert result == [None if v is None else round(v, 2) for v in values]
+
+
+class TestScanTransactions:
+    def test_selects_dates_and_applies_exclusions(self, tmp_path):
+        part_dir = tmp_path / 'act' / 'year_month=2024-01'
+        part_dir.mkdir(parents=True)
+        pl.DataFrame({
+            'cpc': [100, 100, 100, 100, 100],
+            'trans_date': [datetime(2024, 1, d, 23, 59) for d in (1, 2, 3, 5, 5)],
+            'rev': [1.0, 2.0, 3.0, 4.0, 5.0],
+            'channel_act': ['WEB'] * 5,
+            'msisdn': ['m1', 'm2', 'm3', 'm4', None],
+            'tmuserid': ['t1', 't2', 't3', 't4', 't5'],
+        }).write_parquet(part_dir / 'part-0.parquet')
+
+        lf = scan_transactions(
+            tmp_path, 'act', ['2024-01-01', '2024-01-02', '2024-01-05'],
+            excluded_msisdns={'m1'}
+        )
+        df = lf.collect()
+
+        # m1 is excluded, 2024-01-03 is outside the requested dates and the
+        # null msisdn row is dropped whenever msisdn exclusions apply
+        assert df['rev'].to_list() == [2.0, 4.0]
+        assert 'msisdn' not in df.columns
+
+    def test_missing_type_returns_none(self, tmp_path):
+        assert scan_transactions(tmp_path, 'act', ['2024-01-01']) is None
+
+
 class TestLoadCountersCPC:
     def test_returns_empty_schema_when_file_missing(self, tmp_path):
         missing_path = tmp_path / "nonexistent.parquet"
@@ -210,5 +334,120 @@ class TestLoadCountersCPC:
         assert 'act_count' in df.columns
 
 
+
+def make_counters(rows):
+    """Counters_CPC rows from (date, cpc, act_count) tuples."""
+    return pl.DataFrame([
+        {**{col: 0 for col in COUNTERS_CPC_SCHEMA}, 'date': d, 'cpc': cpc, 'act_count': n,
+         'rfnd_amount': 0.0, 'rev': 0.0, 'last_updated': datetime(2024, 1, 1)}
+        for d, cpc, n in rows
+    ], schema=COUNTERS_CPC_SCHEMA)
+
+
+class TestCountersStore:
+    def test_per_date_write_replaces_only_that_date(self, tmp_path):
+        store = tmp_path / 'Counters_CPC'
+        write_counters_dates(store, make_counters([
+            (date(2024, 1, 1), 100, 1),
+            (date(2024, 1, 2), 100, 2),
+        ]), ['2024-01-01', '2024-01-02'])
+
+        write_counters_dates(store, make_counters([(date(2024, 1, 2), 100, 9)]), ['2024-01-02'])
+
+        df = load_counters_cpc(store)
+        assert df['act_count'].to_list() == [1, 9]
+        assert list_counter_dates(store) == {'2024-01-01', '2024-01-02'}
+
+    def test_date_file_overrides_compacted_month(self, tmp_path):
+        store = tmp_path / 'Counters_CPC'
+        write_counters_dates(store, make_counters([
+            (date(2024, 1, 1), 100, 1),
+            (date(2024, 1, 2), 100, 2),
+        ]), ['2024-01-01', '2024-01-02'])
+        assert compact_counters(store) == {'months': 1, 'files': 2}
+
+        write_counters_dates(store, make_counters([(date(2024, 1, 1), 200, 5)]), ['2024-01-01'])
+        write_counters_dates(store, make_counters([]), ['2024-01-02'])
+
+        df = load_counters_cpc(store)
+        assert df.select('date', 'cpc', 'act_count').rows() == [(date(2024, 1, 1), 200, 5)]
+
+        compact_counters(store)
+        assert [f.name for f in (store / 'year_month=2024-01').iterdir()] == ['compacted.parquet']
+        assert load_counters_cpc(store).equals(df)
+
+    def test_legacy_file_is_migrated(self, tmp_path):
+        legacy = tmp_path / 'Counters_CPC.parquet'
+        make_counters([(date(2024, 1, 1), 100, 1), (date(2024, 2, 1), 100, 2)]).write_parquet(legacy)
+        store = tmp_path / 'Counters_CPC'
+
+        assert migrate_legacy_counters(legacy, store)
+        assert not legacy.exists()
+        assert load_counters_cpc(store)['act_count'].to_list() == [1, 2]
+        assert not migrate_legacy_counters(legacy, store)
+
+
+
+class TestCounterRun:
+    def test_inputs_loaded_and_outputs_written_once(self, tmp_path, monkeypatch):
+        from importlib import import_module
+        build_counters = import_module('05_build_counters')
+
+        part_dir = tmp_path / 'Parquet_Data' / 'transactions' / 'reno' / 'year_month=2024-01'
+        part_dir.mkdir(parents=True)
+        pl.DataFrame({
+            'cpc': [100, 200, 100],
+            'trans_date': [datetime(2024, 1, d, 9) for d in (1, 1, 2)],
+            'rev': [1.0, 2.0, 3.0],
+            'channel_act': ['WEB'] * 3,
+        }).write_parquet(part_dir / 'part-0.parquet')
+        (tmp_path / 'MASTERCPC.csv').write_text(
+            'cpc,service_name,tme_category,cpc_period,cpc_price\n100,Svc A,Games,7,1.5\n'
+        )
+
+        calls = []
+        for name in ('load_mastercpc', 'load_counters_cpc', 'write_atomic_csv'):
+            original = getattr(build_counters, name)
+            monkeypatch.setattr(build_counters, name, lambda *a, f=original, n=name: calls.append(n) or f(*a))
+        # Importing the module binds the legacy aggregate_by_service defined after main()
+        monkeypatch.setattr(build_counters, 'aggregate_by_service',
+                            lambda counters, cpc_map: calls.append('aggregate_by_service') or (counters, []))
+
+        run = build_counters.CounterRun(tmp_path)
+        for d in ('2024-01-01', '2024-01-02'):
+            build_counters.process_date(d, run)
+        assert not run.counters_service_path.exists()
+
+        assert run.write() == []
+        assert sorted(calls) == ['aggregate_by_service', 'load_counters_cpc', 'load_mastercpc', 'write_atomic_csv']
+        assert list_counter_dates(run.counters_cpc_path) == {'2024-01-01', '2024-01-02'}
+        assert load_counters_cpc(run.counters_cpc_path)['reno_count'].to_list() == [1, 1, 1]
+
+    def test_interrupted_run_resumes_from_checkpoint(self, tmp_path):
+        from importlib import import_module
+        build_counters = import_module('05_build_counters')
+
+        part_dir = tmp_path / 'Parquet_Data' / 'transactions' / 'reno' / 'year_month=2024-01'
+        part_dir.mkdir(parents=True)
+        pl.DataFrame({
+            'cpc': [100, 200],
+            'trans_date': [datetime(2024, 1, 1, 9), datetime(2024, 1, 3, 9)],
+            'rev': [1.0, 2.0],
+            'channel_act': ['WEB'] * 2,
+        }).write_parquet(part_dir / 'part-0.parquet')
+        dates = ['2024-01-01', '2024-01-02', '2024-01-03']
+
+        crashed = build_counters.CounterRun(tmp_path)
+        build_counters.process_date_range(dates[:2], crashed)
+        crashed.checkpoint()
+
+        run = build_counters.CounterRun(tmp_path)
+        assert run.resume(dates) == ['2024-01-03']
+        assert run.new_dates == ['2024-01-01', '2024-01-02']
+        assert run.counters.select('date', 'cpc').rows() == [(date(2024, 1, 1), 100)]
+
+        assert build_counters.CounterRun(tmp_path).resume(['2024-01-03']) == ['2024-01-03']
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
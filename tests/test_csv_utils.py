@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the historical CSV scans and source manifest
+"""
+
+import pytest
+import polars as pl
+from pathlib import Path
+from datetime import date
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts'))
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts' / 'utils'))
+
+import csv_utils
+from csv_utils import update_manifest, csv_date_range, files_for_dates
+
+HEADER = 'cancel_date,sbn_id,tmuserid,cpc,mode\n'
+
+
+@pytest.fixture
+def historical(tmp_path):
+    historical = tmp_path / 'Historical_Data'
+    historical.mkdir()
+    (historical / 'cnr_atlas_0.csv').write_text(
+        HEADER + '2024-01-05 10:00:00,1,u1,100,SMS\n2024-01-05,2,u2,100,SMS\n2024-01-07,3,u3,100,WEB\n'
+    )
+    (historical / 'cnr_atlas_1.csv').write_text(
+        HEADER + '2024-03-01,4,u4,100,SMS\nnot a date,5,u5,100,SMS\n'
+    )
+    return historical
+
+
+class TestCsvManifest:
+    def test_entries_range_and_file_selection(self, historical, tmp_path):
+        csv_files = sorted(historical.glob('cnr_atlas*.csv'))
+        entries = update_manifest(tmp_path / 'transactions', 'cnr', csv_files)
+
+        assert entries.filter(pl.col('date') == date(2024, 1, 5))['rows'].to_list() == [2]
+        assert entries.filter(pl.col('date').is_null())['rows'].to_list() == [1]
+        assert csv_date_range(entries) == (date(2024, 1, 5), date(2024, 3, 1))
+        assert [f.name for f in files_for_dates(entries, [date(2024, 3, 1), date(2024, 3, 2)])] == ['cnr_atlas_1.csv']
+
+    def test_only_new_or_changed_files_are_read(self, historical, tmp_path, monkeypatch):
+        parquet_path = tmp_path / 'transactions'
+        update_manifest(parquet_path, 'cnr', sorted(historical.glob('cnr_atlas*.csv')))
+
+        read = []
+        file_entries = csv_utils._file_entries
+        monkeypatch.setattr(csv_utils, '_file_entries', lambda f, key: read.append(f.name) or file_entries(f, key))
+
+        (historical / 'cnr_atlas_1.csv').write_text(HEADER + '2024-04-02,4,u4,100,SMS\n2024-04-02,6,u6,100,SMS\n')
+        (historical / 'cnr_atlas_0.csv').unlink()
+        entries = update_manifest(parquet_path, 'cnr', sorted(historical.glob('cnr_atlas*.csv')))
+
+        assert read == ['cnr_atlas_1.csv']
+        assert entries.select('date', 'rows').rows() == [(date(2024, 4, 2), 2)]
+        assert len(csv_utils.load_manifest(parquet_path)) == 1
+
+    def test_entries_without_persist_leave_no_manifest(self, historical, tmp_path):
+        parquet_path = tmp_path / 'transactions'
+        entries = update_manifest(parquet_path, 'cnr', sorted(historical.glob('cnr_atlas*.csv')), persist=False)
+
+        assert csv_date_range(entries) == (date(2024, 1, 5), date(2024, 3, 1))
+        assert not csv_utils.manifest_path(parquet_path).exists()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the DuckDB catalog helpers
+"""
+
+import pytest
+import polars as pl
+from pathlib import Path
+from datetime import datetime
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts'))
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts' / 'utils'))
+
+from duckdb_utils import connect, create_transaction_views
+
+
+class TestCatalog:
+    def test_views_persist_in_database_file(self, tmp_path):
+        part_dir = tmp_path / 'transactions' / 'cnr' / 'year_month=2024-03'
+        part_dir.mkdir(parents=True)
+        pl.DataFrame({
+            'cancel_date': [datetime(2024, 3, 1)],
+            'sbn_id': [7],
+        }).write_parquet(part_dir / 'part-0.parquet')
+        db_path = tmp_path / 'catalog.duckdb'
+
+        con = connect(db_path, threads=1, memory_limit='256MB', temp_directory=tmp_path / 'spill')
+        assert create_transaction_views(con, tmp_path / 'transactions') == ['transactions_cnr']
+        con.close()
+
+        con = connect(db_path, read_only=True)
+        row = con.execute("SELECT sbn_id, year_month FROM transactions_cnr").fetchone()
+        con.close()
+
+        assert row == (7, '2024-03')
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
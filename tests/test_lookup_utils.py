@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the user lookup index
+"""
+
+import pytest
+import polars as pl
+from pathlib import Path
+from datetime import datetime
+import warnings
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts'))
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts' / 'utils'))
+sys.path.insert(0, str(PROJECT_ROOT / 'tests'))
+
+from lookup_utils import (
+    record_lookup_entries,
+    build_lookup,
+    compact_lookup,
+    locate,
+    transaction_source,
+)
+from helpers import write_partition
+
+
+@pytest.fixture
+def store(tmp_path):
+    write_partition(tmp_path, 'act', '2024-01', pl.DataFrame({
+        'trans_date': [datetime(2024, 1, 5)],
+        'subscription_id': [1],
+        'tmuserid': ['u1'],
+        'msisdn': ['34600000001'],
+    }))
+    write_partition(tmp_path, 'reno', '2024-03', pl.DataFrame({
+        'trans_date': [datetime(2024, 3, 5), datetime(2024, 3, 6)],
+        'subscription_id': [1, 2],
+        'tmuserid': ['u1', 'u2'],
+        'msisdn': ['34600000001', '34600000002'],
+    }))
+    write_partition(tmp_path, 'cnr', '2024-04', pl.DataFrame({
+        'cancel_date': [datetime(2024, 4, 1)],
+        'sbn_id': [1],
+        'tmuserid': ['u1'],
+    }))
+    return tmp_path
+
+
+class TestLookupIndex:
+    def test_locate_by_each_key(self, store):
+        assert locate(store, 'msisdn', ['34600000001']) is None
+
+        build_lookup(store)
+
+        assert locate(store, 'msisdn', ['34600000001']) == {'act': ['2024-01'], 'reno': ['2024-03']}
+        assert locate(store, 'tmuserid', ['u1'])['cnr'] == ['2024-04']
+        # cnr is indexed under its own id column, sbn_id
+        assert locate(store, 'subscription_id', ['1'])['cnr'] == ['2024-04']
+        assert locate(store, 'subscription_id', [2]) == {'reno': ['2024-03']}
+        assert locate(store, 'msisdn', ['34699999999']) == {}
+
+    def test_locate_raises_no_deprecation_warning(self, store):
+        # Polars reports warnings raised during collect() on stderr instead of
+        # propagating them, so -W error::DeprecationWarning alone cannot fail here
+        build_lookup(store)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always', DeprecationWarning)
+            locate(store, 'tmuserid', ['u1', 'u2'])
+
+        assert not [w for w in caught if issubclass(w.category, DeprecationWarning)]
+
+    def test_deltas_are_visible_and_compacted(self, store):
+        build_lookup(store)
+        record_lookup_entries(store, 'reno', pl.DataFrame({
+            'trans_date': [datetime(2024, 5, 5)],
+            'subscription_id': [2],
+            'tmuserid': ['u2'],
+            'msisdn': ['34600000002'],
+        }))
+
+        assert locate(store, 'tmuserid', ['u2']) == {'reno': ['2024-03', '2024-05']}
+
+        assert compact_lookup(store, min_deltas=1) == ['msisdn', 'tmuserid', 'subscription_id']
+        assert not list((store / '_lookup' / 'tmuserid').glob('delta-*.parquet'))
+        assert locate(store, 'tmuserid', ['u2']) == {'reno': ['2024-03', '2024-05']}
+
+    def test_source_reads_only_located_partitions(self, store):
+        build_lookup(store)
+        locations = locate(store, 'tmuserid', ['u2'])
+
+        source = transaction_source(store, 'reno', locations)
+        assert 'year_month=2024-03' in source
+        assert transaction_source(store, 'act', locations) is None
+        assert '**' in transaction_source(store, 'act')
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the partitioned transaction store helpers
+"""
+
+import pytest
+import polars as pl
+import pyarrow.parquet as pq
+from pathlib import Path
+from datetime import datetime
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts'))
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts' / 'utils'))
+
+from parquet_utils import (
+    PartitionTransaction,
+    journal_root,
+    partition_path,
+    read_partition,
+    recover_pending_commits,
+    upsert_partitions,
+    write_partition_file,
+    _apply_commit,
+    PARTITION_FILE_NAME,
+)
+
+UNIQUE_COLS = ['subscription_id', 'trans_date', 'trans_type_id']
+
+
+def make_tx(rows):
+    df = pl.DataFrame(
+        rows,
+        schema={
+            'subscription_id': pl.Int64,
+            'trans_date': pl.Datetime('us'),
+            'trans_type_id': pl.Int64,
+            'rev': pl.Float64,
+        },
+        orient='row',
+    )
+    return df.with_columns(pl.col('trans_date').dt.strftime('%Y-%m').alias('year_month'))
+
+
+class TestUpsertPartitions:
+    def test_only_touched_partitions_are_rewritten(self, tmp_path):
+        upsert_partitions(make_tx([
+            (1, datetime(2024, 1, 5), 1, 1.0),
+            (2, datetime(2024, 2, 5), 1, 2.0),
+        ]), tmp_path, UNIQUE_COLS)
+
+        feb_file = next(partition_path(tmp_path, 'year_month', '2024-02').glob('*.parquet'))
+        feb_mtime = feb_file.stat().st_mtime_ns
+
+        stats = upsert_partitions(make_tx([
+            (3, datetime(2024, 1, 6), 1, 3.0),
+        ]), tmp_path, UNIQUE_COLS)
+
+        assert stats['partitions'] == ['2024-01']
+        assert stats['existing_rows'] == 1
+        assert feb_file.stat().st_mtime_ns == feb_mtime
+        assert len(read_partition(partition_path(tmp_path, 'year_month', '2024-01'))) == 2
+
+    def test_new_rows_win_on_duplicate_key(self, tmp_path):
+        upsert_partitions(make_tx([(1, datetime(2024, 1, 5), 1, 1.0)]), tmp_path, UNIQUE_COLS)
+        stats = upsert_partitions(make_tx([(1, datetime(2024, 1, 5), 1, 9.0)]), tmp_path, UNIQUE_COLS)
+
+        assert stats['duplicates'] == 1
+        df = read_partition(partition_path(tmp_path, 'year_month', '2024-01'))
+        assert df['rev'].to_list() == [9.0]
+
+    def test_dataset_is_readable_with_hive_partitioning(self, tmp_path):
+        upsert_partitions(make_tx([
+            (1, datetime(2024, 1, 5), 1, 1.0),
+            (2, datetime(2024, 2, 5), 1, 2.0),
+        ]), tmp_path, UNIQUE_COLS)
+
+        df = pl.scan_parquet(str(tmp_path / '**/*.parquet'), hive_partitioning=True).collect()
+
+        assert sorted(df['year_month'].to_list()) == ['2024-01', '2024-02']
+
+
+class TestPartitionLayout:
+    def test_rows_sorted_and_order_recorded(self, tmp_path):
+        df = make_tx([
+            (3, datetime(2024, 1, 6), 1, 3.0),
+            (2, datetime(2024, 1, 5), 1, 2.0),
+            (1, datetime(2024, 1, 6), 1, 1.0),
+        ]).drop('year_month')
+
+        write_partition_file(df, tmp_path, sort_by=['trans_date', 'subscription_id'])
+
+        stored = pl.read_parquet(tmp_path / PARTITION_FILE_NAME)
+        assert stored['subscription_id'].to_list() == [2, 1, 3]
+
+        row_group = pq.ParquetFile(tmp_path / PARTITION_FILE_NAME).metadata.row_group(0)
+        assert [c.column_index for c in row_group.sorting_columns] == [1, 0]
+        assert row_group.column(0).statistics.min == 1
+
+
+class TestPartitionTransaction:
+    def seed(self, dataset):
+        upsert_partitions(make_tx([
+            (1, datetime(2024, 1, 5), 1, 1.0),
+            (2, datetime(2024, 2, 5), 1, 2.0),
+        ]), dataset, UNIQUE_COLS)
+
+    def test_failed_write_leaves_dataset_untouched(self, tmp_path):
+        dataset = tmp_path / 'act'
+        self.seed(dataset)
+
+        with pytest.raises(RuntimeError):
+            with PartitionTransaction(dataset) as txn:
+                txn.stage('2024-01', make_tx([(9, datetime(2024, 1, 9), 1, 9.0)]).drop('year_month'))
+                raise RuntimeError('simulated crash')
+
+        df = read_partition(partition_path(dataset, 'year_month', '2024-01'))
+        assert df['subscription_id'].to_list() == [1]
+        assert not any(journal_root(dataset).iterdir())
+
+    def test_recovery_rolls_back_uncommitted_staging(self, tmp_path):
+        dataset = tmp_path / 'act'
+        self.seed(dataset)
+
+        txn = PartitionTransaction(dataset)
+        txn.stage('2024-01', make_tx([(9, datetime(2024, 1, 9), 1, 9.0)]).drop('year_month'))
+
+        recovered = recover_pending_commits(dataset)
+
+        assert [action for _, action in recovered] == ['rolled back']
+        df = read_partition(partition_path(dataset, 'year_month', '2024-01'))
+        assert df['subscription_id'].to_list() == [1]
+
+    def test_recovery_rolls_forward_half_applied_commit(self, tmp_path, monkeypatch):
+        dataset = tmp_path / 'act'
+        self.seed(dataset)
+
+        import parquet_utils
+
+        def crash_after_backup(txn_dir, dataset_path, manifest):
+            # Move the live partition away, then "crash" before the staged one is renamed in
+            name = manifest['swap'][0]
+            (txn_dir / 'backup').mkdir(exist_ok=True)
+            (dataset_path / name).rename(txn_dir / 'backup' / name)
+            raise RuntimeError('simulated crash')
+
+        monkeypatch.setattr(parquet_utils, '_apply_commit', crash_after_backup)
+        txn = PartitionTransaction(dataset)
+        txn.stage('2024-01', make_tx([(9, datetime(2024, 1, 9), 1, 9.0)]).drop('year_month'))
+        with pytest.raises(RuntimeError):
+            txn.commit()
+        monkeypatch.setattr(parquet_utils, '_apply_commit', _apply_commit)
+
+        assert not partition_path(dataset, 'year_month', '2024-01').exists()
+
+        recovered = recover_pending_commits(dataset)
+
+        assert [action for _, action in recovered] == ['rolled forward']
+        df = read_partition(partition_path(dataset, 'year_month', '2024-01'))
+        assert df['subscription_id'].to_list() == [9]
+        assert len(read_partition(partition_path(dataset, 'year_month', '2024-02'))) == 1
+
+    def test_staged_data_is_synced_before_marker(self, tmp_path, monkeypatch):
+        import parquet_utils
+
+        synced = []
+        marker_written = []
+        original_replace = parquet_utils.os.replace
+
+        def replace(src, dst):
+            if Path(dst).name == parquet_utils.COMMIT_MARKER:
+                marker_written.append(list(synced))
+            return original_replace(src, dst)
+
+        monkeypatch.setattr(parquet_utils, '_fsync', lambda path: synced.append(Path(path).name))
+        monkeypatch.setattr(parquet_utils.os, 'replace', replace)
+
+        with PartitionTransaction(tmp_path / 'act') as txn:
+            txn.stage('2024-01', make_tx([(9, datetime(2024, 1, 9), 1, 9.0)]).drop('year_month'))
+
+        assert marker_written == [[PARTITION_FILE_NAME, 'year_month=2024-01', 'staged']]
+
+    def test_replace_all_drops_unstaged_partitions(self, tmp_path):
+        dataset = tmp_path / 'act'
+        self.seed(dataset)
+
+        with PartitionTransaction(dataset, replace_all=True) as txn:
+            txn.stage('2024-02', make_tx([(2, datetime(2024, 2, 5), 1, 2.0)]).drop('year_month'))
+
+        assert [d.name for d in dataset.iterdir()] == ['year_month=2024-02']
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the transaction type registry
+"""
+
+import pytest
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from datetime import datetime
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts'))
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts' / 'utils'))
+
+from schema_utils import (
+    TRANSACTION_TYPES,
+    SCHEMAS,
+    DATE_COLS,
+    UNIQUE_COLS,
+    arrow_schema,
+    partition_expr,
+)
+from parquet_utils import write_partition_file, PARTITION_FILE_NAME
+
+
+def make_cnr():
+    return pl.DataFrame({
+        'cancel_date': [datetime(2024, 3, 1, 10, 0)],
+        'sbn_id': [7],
+        'tmuserid': ['u7'],
+        'cpc': [100],
+        'mode': ['SMS'],
+    })
+
+
+class TestRegistry:
+    def test_date_and_key_columns_exist_in_schema(self):
+        for tx_type in TRANSACTION_TYPES:
+            assert DATE_COLS[tx_type] in SCHEMAS[tx_type]
+            assert set(UNIQUE_COLS[tx_type]) <= set(SCHEMAS[tx_type])
+            assert DATE_COLS[tx_type] in UNIQUE_COLS[tx_type]
+
+    def test_partition_expr_uses_primary_date(self):
+        df = make_cnr().with_columns(partition_expr('cnr'))
+        assert df['year_month'].to_list() == ['2024-03']
+
+
+class TestArrowSchema:
+    def test_default_schema_matches_parsed_csv_types(self):
+        schema = arrow_schema('cnr', compact=False)
+
+        assert schema.field('cancel_date').type == pa.timestamp('us')
+        assert schema.field('cpc').type == pa.int64()
+        assert schema.field('mode').type == pa.string()
+
+    def test_compact_schema_round_trip(self, tmp_path):
+        schema = arrow_schema('cnr', compact=True)
+        write_partition_file(make_cnr(), tmp_path, schema)
+
+        stored = pq.read_schema(tmp_path / PARTITION_FILE_NAME)
+        assert stored.field('cpc').type == pa.int32()
+        assert pa.types.is_dictionary(stored.field('mode').type)
+
+        df = pl.read_parquet(tmp_path / PARTITION_FILE_NAME)
+        assert df['mode'].cast(pl.Utf8).to_list() == ['SMS']
+        assert df['cpc'].to_list() == [100]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Parity tests for the subscription view queries
+"""
+
+import pytest
+import duckdb
+import polars as pl
+from pathlib import Path
+from datetime import datetime
+from importlib import import_module
+import shutil
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts'))
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts' / 'utils'))
+sys.path.insert(0, str(PROJECT_ROOT / 'tests'))
+
+build_view = import_module('04_build_subscription_view')
+from subscription_utils import scan_subscriptions, duckdb_source, SubscriptionQuerySession
+from lookup_utils import build_lookup
+from helpers import write_partition, subscription_rows
+
+
+def write_type(base, tx_type, df):
+    for (year_month,), part in df.group_by(
+        pl.col(df.columns[0]).dt.strftime('%Y-%m').alias('ym'), maintain_order=True
+    ):
+        write_partition(base, tx_type, year_month, part)
+
+
+VIEW_COLUMNS = ['trans_date', 'subscription_id', 'cpc', 'trans_type_id', 'channel_act', 'rev']
+
+
+@pytest.fixture
+def store(tmp_path):
+    write_type(tmp_path, 'act', subscription_rows(VIEW_COLUMNS, [
+        (datetime(2024, 1, 1, 9), 1, 100, 2, 'WEB', 2.0),
+        (datetime(2024, 2, 1, 9), 1, 200, 1, 'UPGRADE', 0.5),     # upgrade
+        (datetime(2024, 1, 3, 9), 2, 300, 2, 'SMS', 0.0),
+        (datetime(2024, 1, 4, 9), 5, None, 2, 'WEB', 1.0),        # null cpc
+    ]))
+    write_type(tmp_path, 'reno', subscription_rows(VIEW_COLUMNS, [
+        (datetime(2024, 1, 8, 9), 1, 100, 3, 'WEB', 2.0),
+        (datetime(2024, 2, 8, 9), 1, 200, 3, 'WEB', 3.0),
+        (datetime(2024, 1, 10, 9), 3, 400, 3, 'WEB', 1.25),       # missing ACT
+        (datetime(2024, 2, 10, 9), 3, 400, 3, 'WEB', 1.25),
+        (datetime(2024, 1, 11, 9), 5, 500, 3, 'WEB', 1.0),
+        (datetime(2024, 1, 12, 9), 5, None, 3, 'WEB', 1.0),
+    ]))
+    write_type(tmp_path, 'dct', pl.DataFrame({
+        'trans_date': [datetime(2024, 2, 1, 8), datetime(2024, 3, 1, 9), datetime(2024, 1, 20, 9)],
+        'subscription_id': [1, 1, 2],
+        'channel_dct': ['UPGRADE', 'WEB', 'SMS'],
+    }))
+    write_type(tmp_path, 'cnr', pl.DataFrame({
+        'cancel_date': [datetime(2024, 1, 25, 9), datetime(2024, 2, 25, 9)],
+        'sbn_id': [2, 3],
+        'mode': ['A', 'B'],
+    }))
+    write_type(tmp_path, 'rfnd', pl.DataFrame({
+        'refnd_date': [datetime(2024, 2, 2, 9), datetime(2024, 2, 3, 9)],
+        'sbnid': [1, 1],
+        'rfnd_amount': [1.5, 0.5],
+    }))
+    return tmp_path
+
+
+def run_query(parquet_path, sql_name):
+    con = duckdb.connect()
+    build_view.create_source_views(con, parquet_path)
+    con.execute((PROJECT_ROOT / 'sql' / sql_name).read_text())
+    df = con.execute("SELECT * FROM subscriptions ORDER BY subscription_id").pl()
+    con.close()
+    return df
+
+
+class TestSinglePassParity:
+    def test_single_pass_matches_window_query(self, store):
+        expected = run_query(store, build_view.SQL_FILES[False])
+        result = run_query(store, build_view.SQL_FILES[True])
+
+        assert result.schema == expected.schema
+        assert result.equals(expected)
+
+    def test_edge_cases(self, store):
+        result = run_query(store, build_view.SQL_FILES[True])
+        rows = {row['subscription_id']: row for row in result.iter_rows(named=True)}
+
+        assert rows[1]['cpc_list'] == [100, 200]
+        assert rows[1]['upgraded_to_cpc'] == 200
+        assert rows[1]['subscription_status'] == 'Deactivated'
+        assert rows[1]['total_revenue_with_upgrade'] == 7.5
+        assert rows[2]['subscription_status'] == 'Cancelled'
+        assert rows[3]['missing_act_record']
+        assert rows[5]['cpc_list'] == [None, 500]
+
+
+class TestExport:
+    def test_partitioned_export_round_trip(self, store, tmp_path):
+        con = duckdb.connect()
+        build_view.create_source_views(con, store)
+        con.execute((PROJECT_ROOT / 'sql' / build_view.SQL_FILES[False]).read_text())
+        expected = con.execute("SELECT * FROM subscriptions ORDER BY subscription_id").pl()
+
+        view_path = tmp_path / 'aggregated' / 'subscriptions'
+        assert build_view.export_subscriptions(con, view_path) == 1
+
+        result = scan_subscriptions(view_path).collect().select(expected.columns)
+        assert result.equals(expected)
+
+        january = con.execute(
+            f"SELECT COUNT(*) FROM {duckdb_source(view_path)} WHERE activation_month = '2024-01'"
+        ).fetchone()[0]
+        con.close()
+        assert january == len(expected)
+
+    def test_incremental_merge_keeps_null_month_subscriptions(self, store, tmp_path):
+        # Subscriptions 7 and 8 have no activation date: Hive default partition
+        write_partition(store, 'act', '__HIVE_DEFAULT_PARTITION__', subscription_rows(VIEW_COLUMNS, [
+            (None, 7, 100, 2, 'WEB', 1.0),
+            (None, 8, 100, 2, 'WEB', 1.0),
+        ]))
+        view_path = tmp_path / 'aggregated' / 'subscriptions'
+        sql = (PROJECT_ROOT / 'sql' / build_view.SQL_FILES[False]).read_text()
+
+        con = duckdb.connect()
+        build_view.create_source_views(con, store)
+        con.execute(sql)
+        build_view.export_subscriptions(con, view_path)
+        con.close()
+
+        con = duckdb.connect()
+        con.execute("CREATE TEMP TABLE changed_ids AS SELECT 7::BIGINT AS subscription_id")
+        build_view.create_source_views(con, store, changed_only=True)
+        con.execute(sql)
+        build_view.merge_changed_subscriptions(con, view_path)
+        build_view.export_subscriptions(con, view_path)
+        con.close()
+
+        result = scan_subscriptions(view_path).collect()
+        assert result['subscription_id'].sort().to_list() == [1, 2, 3, 5, 7, 8]
+        assert result.filter(pl.col('subscription_id') >= 7)['activation_month'].to_list() == [None, None]
+
+
+class TestQuerySession:
+    def test_lookups_match_view_and_are_cached(self, store, tmp_path):
+        con = duckdb.connect()
+        build_view.create_source_views(con, store)
+        con.execute((PROJECT_ROOT / 'sql' / build_view.SQL_FILES[False]).read_text())
+        view_path = tmp_path / 'aggregated' / 'subscriptions'
+        build_view.export_subscriptions(con, view_path)
+        con.close()
+        # The view partitions are chosen from the ACT/RENO index entries
+        index_store = tmp_path / 'index_store'
+        for tx_type in ['act', 'reno']:
+            shutil.copytree(store / tx_type, index_store / tx_type)
+        build_lookup(index_store)
+
+        with SubscriptionQuerySession(view_path, index_store, cache_size=1) as session:
+            results = session.query('msisdn', '341')
+            assert results['subscriptions']['subscription_id'].to_list() == [1]
+            assert results['summary']['total_renewals'][0] == 2
+            assert session.query('subscription_id', '3')['subscriptions']['msisdn'].to_list() == ['343']
+            assert session.query('tmuserid', 'nobody')['subscriptions'].is_empty()
+
+            # Only the activation months of the keys looked up were loaded
+            assert session._loaded_months == {'2024-01', '2024-02'}
+            assert not session._all_loaded
+
+            session.query('tmuserid', 'nobody')
+            session.query('msisdn', '341')
+            assert (session.hits, session.misses) == (1, 4)
+
+            with pytest.raises(ValueError):
+                session.query('camp_name', 'x')
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the batch transaction timeline
+"""
+
+import pytest
+import polars as pl
+from pathlib import Path
+from datetime import datetime
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts'))
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts' / 'utils'))
+sys.path.insert(0, str(PROJECT_ROOT / 'tests'))
+
+from lookup_utils import build_lookup
+from timeline_utils import read_keys, batch_timeline
+from helpers import write_partition, subscription_rows
+
+
+TIMELINE_COLUMNS = ['trans_date', 'subscription_id', 'msisdn']
+
+
+@pytest.fixture
+def store(tmp_path):
+    write_partition(tmp_path, 'act', '2024-01', subscription_rows(TIMELINE_COLUMNS, [
+        (datetime(2024, 1, 1), 1, '341'),
+        (datetime(2024, 1, 2), 2, '342'),
+        (datetime(2024, 1, 3), 3, '343'),
+    ]))
+    # Subscription 1 renews under a new msisdn
+    write_partition(tmp_path, 'reno', '2024-02', subscription_rows(TIMELINE_COLUMNS, [
+        (datetime(2024, 2, 1), 1, '349'),
+        (datetime(2024, 2, 2), 3, '343'),
+    ]))
+    write_partition(tmp_path, 'cnr', '2024-03', pl.DataFrame({
+        'cancel_date': [datetime(2024, 3, 1)],
+        'sbn_id': [1],
+        'tmuserid': ['u1'],
+        'cpc': [100],
+        'mode': ['SMS'],
+    }))
+    return tmp_path
+
+
+class TestBatchTimeline:
+    def test_read_keys(self, tmp_path):
+        input_file = tmp_path / 'keys.txt'
+        input_file.write_text('341\n\n# ticket 12\n342  # dup below\n341\n')
+
+        assert read_keys(input_file) == ['341', '342']
+
+    def test_timeline_with_and_without_index(self, store):
+        without_index = batch_timeline(store, 'msisdn', ['341', '349', '340'])
+        build_lookup(store)
+        with_index = batch_timeline(store, 'msisdn', ['341', '349', '340'])
+
+        assert with_index.equals(without_index)
+        rows = with_index.select('msisdn', 'transaction_type', 'subscription_id').rows()
+        # Both msisdns resolve to subscription 1 and get its whole history
+        assert rows == [
+            ('341', 'ACT', 1), ('341', 'RENO', 1), ('341', 'CNR', 1),
+            ('349', 'ACT', 1), ('349', 'RENO', 1), ('349', 'CNR', 1),
+        ]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
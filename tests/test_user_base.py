@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the NBS user base aggregation
+"""
+
+import pytest
+import polars as pl
+from pathlib import Path
+from datetime import date
+from importlib import import_module
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts'))
+sys.path.insert(0, str(PROJECT_ROOT / 'Scripts' / 'utils'))
+
+user_base = import_module('01_aggregate_user_base')
+
+from user_base_utils import scan_user_base, write_user_base
+from parquet_utils import journal_root
+
+
+@pytest.fixture
+def nbs_dir(tmp_path):
+    nbs_dir = tmp_path / 'NBS_BASE'
+    nbs_dir.mkdir()
+    (nbs_dir / '20240101_NBS_Base.csv').write_text(
+        'service_name,tme_category,count,cpc\n'
+        ' Music Plus ,Education,10.0,1\n'
+        'Music Plus,images,5,1\n'
+        'Nubico Premium,News,100,2\n'
+        '"Kids, Fun",Kids ,2.9,3\n',
+        encoding='utf-8'
+    )
+    # Not valid UTF-8: re-read with the encoding fallback
+    (nbs_dir / '20240102_NBS_Base.csv').write_bytes(
+        'service_name,tme_category,count,cpc\n'
+        'Café Radio,SPORTS,7,4\n'.encode('latin-1')
+    )
+    return nbs_dir
+
+
+class TestUserBaseAggregation:
+    def test_rows_are_parsed_filtered_and_mapped(self, nbs_dir):
+        rows = user_base.process_files(nbs_dir).sort('date', 'service_name')
+
+        assert rows.rows() == [
+            (date(2024, 1, 1), 'Kids, Fun', 'Kids', 2, 3),
+            (date(2024, 1, 1), 'Music Plus', 'Edu_Ima', 10, 1),
+            (date(2024, 1, 1), 'Music Plus', 'Edu_Ima', 5, 1),
+            (date(2024, 1, 2), 'Café Radio', 'News_Sport', 7, 4),
+        ]
+
+    def test_outputs(self, nbs_dir, tmp_path):
+        rows = user_base.process_files(nbs_dir)
+        user_base.write_service_output(rows, tmp_path / 'service', tmp_path / 'service.csv')
+        user_base.write_cpc_output(rows, tmp_path / 'cpc', tmp_path / 'cpc.csv')
+        user_base.write_category_output(rows, tmp_path / 'category')
+
+        assert (tmp_path / 'service.csv').read_text(encoding='utf-8').splitlines() == [
+            'date|service_name|tme_category|User_Base',
+            '2024-01-01|Kids, Fun|Kids|2',
+            '2024-01-01|Music Plus|Edu_Ima|15',
+            '2024-01-02|Café Radio|News_Sport|7',
+        ]
+        assert (tmp_path / 'cpc.csv').read_text().splitlines()[1:] == [
+            '2024-01-01|1|15',
+            '2024-01-01|3|2',
+            '2024-01-02|4|7',
+        ]
+
+        assert sorted(p.name for p in (tmp_path / 'cpc').iterdir()) == ['year_month=2024-01']
+        assert not (tmp_path / 'category.csv').exists()
+        category = scan_user_base(tmp_path / 'category').collect()
+        assert category.rows() == [
+            (date(2024, 1, 1), 'Edu_Ima', 15, '2024-01'),
+            (date(2024, 1, 1), 'Kids', 2, '2024-01'),
+            (date(2024, 1, 2), 'News_Sport', 7, '2024-01'),
+        ]
+
+    def test_cache_parses_only_new_or_changed_files(self, nbs_dir, tmp_path, monkeypatch):
+        cache_dir = tmp_path / 'cache'
+        expected = user_base.process_files(nbs_dir).sort('date', 'service_name', 'count')
+
+        first = user_base.load_cached_rows(nbs_dir, cache_dir)
+        assert first.sort('date', 'service_name', 'count').equals(expected)
+
+        parsed = []
+        load_snapshots = user_base.load_snapshots
+        monkeypatch.setattr(user_base, 'load_snapshots', lambda files: parsed.append(files) or load_snapshots(files))
+
+        user_base.load_cached_rows(nbs_dir, cache_dir)
+        assert parsed == []
+
+        (nbs_dir / '20240102_NBS_Base.csv').write_text('service_name,tme_category,count,cpc\nRadio,Music,3,4\n')
+        (nbs_dir / '20240101_NBS_Base.csv').unlink()
+        rows = user_base.load_cached_rows(nbs_dir, cache_dir)
+
+        assert [[f.name for f in files] for files in parsed] == [['20240102_NBS_Base.csv']]
+        assert rows.rows() == [(date(2024, 1, 2), 'Radio', 'Music', 3, 4)]
+        assert len(list(cache_dir.glob('*/*.parquet'))) == 1
+
+    def test_rewrite_replaces_every_month(self, tmp_path):
+        dataset = tmp_path / 'user_base_by_category'
+        rows = pl.DataFrame({
+            'date': [date(2024, 1, 1), date(2024, 2, 1)],
+            'tme_category': ['Kids', 'Kids'],
+            'count': [1, 2],
+        })
+        assert write_user_base(rows, dataset) == ['2024-01', '2024-02']
+
+        assert write_user_base(rows.tail(1), dataset) == ['2024-02']
+        assert [d.name for d in dataset.iterdir()] == ['year_month=2024-02']
+        assert scan_user_base(dataset).collect()['count'].to_list() == [2]
+        assert not any(journal_root(dataset).iterdir())
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])